@@ -0,0 +1,80 @@
+"""Seed synthetic data and benchmark the REST API against a throwaway SQLite database.
+
+    python -m benchmarks --scales 1000,10000 --iterations 20
+
+Exits with status 1 when an endpoint goes over its budget in budgets.json.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BUDGETS = Path(__file__).with_name('budgets.json')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default='1000,10000', help='Comma separated location counts.')
+    parser.add_argument('--iterations', type=int, default=20, help='Timed requests per endpoint.')
+    parser.add_argument('--only', default='', help='Comma separated scenario names to run.')
+    parser.add_argument('--budgets', default=str(BUDGETS))
+    parser.add_argument('--no-latency', action='store_true', help='Only enforce query budgets.')
+    parser.add_argument('--report', help='Write the raw results as JSON to this path.')
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='byteme-bench-')
+    try:
+        return benchmark(args, directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def benchmark(args, directory):
+    # Must be in place before settings load so .env can't point us at a real database.
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(directory, "bench.sqlite3")}'
+    os.environ['TILE_CACHE_DIR'] = os.path.join(directory, 'tiles')
+    os.environ.pop('REDIS_URL', None)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'byteme.settings')
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+
+    from .runner import check_budgets, format_table, run
+    from .seed import reset, seed
+
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+    budgets = json.loads(Path(args.budgets).read_text())
+    names = {name for name in args.only.split(',') if name}
+
+    report, failures = {}, []
+    for scale in [int(value) for value in args.scales.split(',')]:
+        reset()
+        start = time.perf_counter()
+        users = seed(scale)
+        print(f'\n== {scale} locations (seeded in {time.perf_counter() - start:.1f}s)')
+        results = run(scale, users[0], args.iterations, names)
+        print(format_table(results))
+        report[scale] = results
+        failures.extend(f'[{scale}] {failure}' for failure in check_budgets(
+            results, budgets, scale, check_latency=not args.no_latency,
+        ))
+
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+    if failures:
+        print('\nBudget regressions:', *failures, sep='\n  ')
+        return 1
+    print('\nAll endpoints within budget.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import json
+import math
+import time
+
+from django.core.cache import caches
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from locations.levels import level_for_score
+from locations.models import AccessibilityFeature, Location, Review
+
+from .scenarios import SCENARIOS
+
+
+# Locations the feature link scenarios cycle through.
+LINKED_LOCATIONS = 50
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def stable_location_ids(limit):
+    """Locations whose level stays put when one more feature is linked.
+
+    Toggling a feature on them never triggers a level recompute, so the
+    write scenarios cost the same number of queries on every request.
+    """
+    scores = Location.objects.annotate(
+        score=Count('accessibility_features', distinct=True) + Count('categories', distinct=True),
+    ).order_by('pk').values_list('pk', 'score')
+    stable = []
+    for pk, score in scores.iterator():
+        if level_for_score(score) == level_for_score(score + 1):
+            stable.append(pk)
+            if len(stable) == limit:
+                break
+    return stable
+
+
+def make_context(user):
+    return {
+        'location_id': Location.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'location_ids': stable_location_ids(LINKED_LOCATIONS),
+        'review_id': Review.objects.order_by('pk').values_list('pk', flat=True).first(),
+        # Linked and unlinked by the write scenarios; the seed never uses it, so every add is a real insert.
+        'feature_id': AccessibilityFeature.objects.get_or_create(name='Benchmark feature')[0].pk,
+        'auth': f'Bearer {RefreshToken.for_user(user).access_token}',
+        'counter': 0,
+        'linked': 0,
+        'unlinked': 0,
+    }
+
+
+def run_scenario(client, scenario, context, iterations, warmup=1):
+    """Time ``iterations`` requests with a cold response cache and collect their stats.
+
+    Warmup requests are not recorded; they let in-process indexes (facets,
+    snapshot, level ids) build the way they would on a long-running worker.
+    """
+    timings, queries, sql_times, sizes, statuses = [], [], [], [], set()
+    for i in range(warmup + iterations):
+        path, data = scenario.build(context)
+        headers = {'HTTP_AUTHORIZATION': context['auth']} if scenario.auth else {}
+        caches['default'].clear()
+        # The query log is a bounded deque; once full, CaptureQueriesContext would count nothing.
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            if scenario.method == 'get':
+                response = client.get(path, **headers)
+            else:
+                response = client.generic(
+                    scenario.method.upper(), path, json.dumps(data), content_type='application/json', **headers,
+                )
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            elapsed = time.perf_counter() - start
+        if i < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        queries.append(len(captured.captured_queries))
+        sql_times.append(sum(float(query['time']) for query in captured.captured_queries) * 1000)
+        sizes.append(len(content))
+        statuses.add(response.status_code)
+    return {
+        'requests': iterations,
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'max_ms': round(max(timings), 2),
+        'sql_ms': round(percentile(sql_times, 0.5), 2),
+        'queries': max(queries),
+        'bytes': max(sizes),
+        'statuses': sorted(statuses),
+    }
+
+
+def run(scale, user, iterations, names=None):
+    client = Client()
+    context = make_context(user)
+    results = {}
+    for scenario in SCENARIOS:
+        if names and scenario.name not in names:
+            continue
+        if scenario.max_scale is not None and scale > scenario.max_scale:
+            continue
+        results[scenario.name] = run_scenario(client, scenario, context, iterations)
+    return results
+
+
+def latency_budget(budget, scale):
+    """The latency budget for the largest budgeted scale not above ``scale``."""
+    limits = {int(key): value for key, value in budget.get('p95_ms', {}).items()}
+    eligible = [key for key in limits if key <= scale]
+    return limits[max(eligible)] if eligible else None
+
+
+def check_budgets(results, budgets, scale, check_latency=True):
+    """Human readable budget violations; an empty list means the run passed."""
+    failures = []
+    for name, stats in results.items():
+        if any(code >= 400 for code in stats['statuses']):
+            failures.append(f'{name}: unexpected status {stats["statuses"]}')
+        budget = budgets.get(name)
+        if budget is None:
+            failures.append(f'{name}: no budget defined')
+            continue
+        if stats['queries'] > budget['queries']:
+            failures.append(f'{name}: {stats["queries"]} queries, budget {budget["queries"]}')
+        limit = latency_budget(budget, scale)
+        if check_latency and limit is not None and stats['p95_ms'] > limit:
+            failures.append(f'{name}: p95 {stats["p95_ms"]}ms, budget {limit}ms at {scale}')
+    return failures
+
+
+def format_table(results):
+    columns = ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'sql_ms', 'queries', 'bytes')
+    width = max([len('endpoint')] + [len(name) for name in results])
+    lines = [f'{"endpoint":<{width}}  ' + '  '.join(f'{column:>9}' for column in columns)]
+    for name, stats in results.items():
+        lines.append(f'{name:<{width}}  ' + '  '.join(f'{stats[column]:>9}' for column in columns))
+    return '\n'.join(lines)
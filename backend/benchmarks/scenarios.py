@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from locations.clusters import mercator_x, mercator_y
+from locations.sync import make_token
+
+from .seed import CENTER, PASSWORD
+
+# west,south,east,north; roughly 1 x 1 km around the centre of the seeded area.
+SMALL_BBOX = f'{CENTER[1] - 0.007},{CENTER[0] - 0.0045},{CENTER[1] + 0.007},{CENTER[0] + 0.0045}'
+CITY_BBOX = f'{CENTER[1] - 0.1},{CENTER[0] - 0.1},{CENTER[1] + 0.1},{CENTER[0] + 0.1}'
+BULK_ITEMS = 20
+TILE = f'14/{int(mercator_x(CENTER[1], 14))}/{int(mercator_y(CENTER[0], 14))}'
+
+
+class Scenario:
+    """One request type; ``path`` and ``data`` may be callables taking the run context."""
+
+    def __init__(self, name, path, method='get', data=None, auth=False, max_scale=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.auth = auth
+        self.max_scale = max_scale
+
+    def build(self, context):
+        path = self.path(context) if callable(self.path) else self.path
+        data = self.data(context) if callable(self.data) else self.data
+        return path, data
+
+
+def _recent_token():
+    # Skip the overlap window so the rows just seeded don't count as changes.
+    return make_token(timezone.now() + timedelta(seconds=settings.SYNC_OVERLAP_SECONDS))
+
+
+def _new_user(context):
+    context['counter'] += 1
+    return {'username': f'bench-new-{context["counter"]}', 'password': PASSWORD}
+
+
+def _new_review(context):
+    return {'location': context['location_id'], 'rating': 4, 'comment': 'quiet and spacious'}
+
+
+def _feature_link_path(step):
+    """Link or unlink the benchmark feature, moving to the next location each time."""
+    def path(context):
+        context[step] += 1
+        location_ids = context['location_ids']
+        location_id = location_ids[context[step] % len(location_ids)]
+        action = 'add-feature' if step == 'linked' else 'remove-feature'
+        return f'/api/locations/{location_id}/{action}/{context["feature_id"]}/'
+    return path
+
+
+def _bulk_links(context):
+    # Alternate so every other request adds the links the previous one removed.
+    context['counter'] += 1
+    items = [{'location': pk, 'feature': context['feature_id']} for pk in context['location_ids'][:BULK_ITEMS]]
+    return {'add': items, 'remove': []} if context['counter'] % 2 else {'add': [], 'remove': items}
+
+
+def _bulk_reviews(context):
+    return [
+        {'location': pk, 'rating': 1 + index % 5, 'comment': 'quiet and spacious'}
+        for index, pk in enumerate(context['location_ids'][:BULK_ITEMS])
+    ]
+
+
+def _bulk_propositions(context):
+    return [{'location': pk, 'text': 'Add a ramp'} for pk in context['location_ids'][:BULK_ITEMS]]
+
+
+# Reads first: the writes at the end invalidate caches and in-process indexes.
+SCENARIOS = [
+    # The unpaginated list serializes every row, which stops being useful past 10k.
+    Scenario('locations-list', '/api/locations/', max_scale=10000),
+    Scenario('locations-page', '/api/locations/?page_size=100'),
+    Scenario('locations-columnar', '/api/locations/?format=columnar', max_scale=10000),
+    Scenario('locations-columnar-bbox', f'/api/locations/?bbox={SMALL_BBOX}&format=columnar'),
+    Scenario('locations-bbox', f'/api/locations/?bbox={SMALL_BBOX}'),
+    Scenario('locations-near', f'/api/locations/?near={CENTER[0]},{CENTER[1]}&radius_m=300'),
+    Scenario('locations-filter', '/api/locations/?categories=Cafe&accessibility_features=Ramp&page_size=100'),
+    Scenario('locations-search', f'/api/locations/?q=quiet+cafe&bbox={CITY_BBOX}'),
+    Scenario('locations-facets', '/api/locations/facets/?categories=Cafe'),
+    Scenario('locations-suggest', '/api/locations/suggest/?q=spac'),
+    Scenario('locations-nearest', f'/api/locations/nearest/?lat={CENTER[0]}&lng={CENTER[1]}&k=10'),
+    Scenario('locations-clusters', f'/api/locations/clusters/?bbox={CITY_BBOX}&zoom=12'),
+    Scenario('locations-tile', f'/api/tiles/{TILE}.mvt'),
+    Scenario('analytics-coverage', f'/api/analytics/coverage/?bbox={CITY_BBOX}&resolution=0.01'),
+    Scenario('sync-delta', lambda context: f'/api/sync/?since={_recent_token()}'),
+    Scenario('location-detail', lambda context: f'/api/locations/{context["location_id"]}/'),
+    Scenario('location-reviews', lambda context: f'/api/locations/{context["location_id"]}/reviews/'),
+    Scenario('features-list', '/api/features/'),
+    Scenario('categories-list', '/api/categories/'),
+    Scenario('levels-list', '/api/accessibility_levels/'),
+    Scenario('reviews-page', '/api/reviews/?page_size=100'),
+    Scenario('review-detail', lambda context: f'/api/reviews/{context["review_id"]}/'),
+    Scenario('propositions-page', '/api/propositions/?page_size=100'),
+    Scenario('async-locations-bbox', f'/api/async/locations/?bbox={SMALL_BBOX}'),
+    Scenario('async-location-detail', lambda context: f'/api/async/locations/{context["location_id"]}/'),
+    Scenario('async-location-reviews', lambda context: f'/api/async/locations/{context["location_id"]}/reviews/'),
+    Scenario('async-categories-list', '/api/async/categories/'),
+    Scenario('users-profile', '/api/users/profile/', auth=True),
+    Scenario('users-register', '/api/users/register/', method='post', data=_new_user),
+    Scenario('reviews-create', '/api/reviews/', method='post', data=_new_review, auth=True),
+    Scenario('location-feature-add', _feature_link_path('linked'), method='post', auth=True),
+    Scenario('location-feature-remove', _feature_link_path('unlinked'), method='delete', auth=True),
+    Scenario('locations-features-bulk', '/api/locations/features/bulk/', method='post', data=_bulk_links, auth=True),
+    Scenario('reviews-bulk', '/api/reviews/bulk/', method='post', data=_bulk_reviews, auth=True),
+    Scenario('propositions-bulk', '/api/propositions/bulk/', method='post', data=_bulk_propositions, auth=True),
+]
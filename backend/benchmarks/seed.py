@@ -0,0 +1,99 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from locations.cache import LOCATION_COORDINATES, bump_version
+from locations.levels import CategoryLink, FeatureLink, bulk_recompute_levels
+from locations.models import (
+    AccessibilityFeature, AccessibilityLevel, Category, Location, Proposition, Review, SearchTerm,
+)
+from locations.ratings import rebuild_ratings
+from locations.review_stats import rebuild_review_stats
+from locations.search import rebuild_search_index
+from locations.spatial import encode_geohash
+
+CATEGORY_NAMES = ['Cafe', 'Restaurant', 'Museum', 'Park', 'Library', 'Shop', 'Hospital', 'Pharmacy', 'Bank', 'Theatre']
+FEATURE_NAMES = [
+    'Ramp', 'Elevator', 'Accessible toilet', 'Wide doors', 'Braille signs', 'Audio guide',
+    'Tactile paving', 'Parking', 'Step-free entrance', 'Hearing loop', 'Seating', 'Service animals welcome',
+]
+WORDS = 'quiet bright spacious friendly central modern historic cozy green busy helpful staff entrance'.split()
+
+# Lviv city centre; the synthetic points are spread over roughly 20 x 20 km.
+CENTER = (49.8397, 24.0297)
+SPREAD = 0.1
+BATCH_SIZE = 5000
+USERS = 50
+PASSWORD = 'benchmark-password'
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed(locations, reviews_per_location=3, propositions_per_location=1, seed=0):
+    """Create a synthetic dataset with ``locations`` rows and their reviews, propositions and links."""
+    rng = random.Random(seed)
+    User = get_user_model()
+    # Hash once: the real hasher is deliberately slow and every user shares the password.
+    password = make_password(PASSWORD)
+    users = User.objects.bulk_create([User(username=f'bench{i}', password=password) for i in range(USERS)])
+    categories = Category.objects.bulk_create([Category(name=name) for name in CATEGORY_NAMES])
+    features = AccessibilityFeature.objects.bulk_create([AccessibilityFeature(name=name) for name in FEATURE_NAMES])
+
+    for start in range(0, locations, BATCH_SIZE):
+        count = min(BATCH_SIZE, locations - start)
+        with transaction.atomic():
+            rows = []
+            for i in range(start, start + count):
+                lat = CENTER[0] + rng.uniform(-SPREAD, SPREAD)
+                lng = CENTER[1] + rng.uniform(-SPREAD, SPREAD)
+                rows.append(Location(
+                    name=f'{rng.choice(CATEGORY_NAMES)} {i}', address=f'{rng.choice(WORDS).title()} street {i % 200}',
+                    description=_text(rng, 8), latitude=lat, longitude=lng, geohash=encode_geohash(lat, lng),
+                ))
+            created = Location.objects.bulk_create(rows)
+            CategoryLink.objects.bulk_create([
+                CategoryLink(location_id=location.id, category_id=category.id)
+                for location in created for category in rng.sample(categories, rng.randint(1, 2))
+            ])
+            FeatureLink.objects.bulk_create([
+                FeatureLink(location_id=location.id, accessibilityfeature_id=feature.id)
+                for location in created for feature in rng.sample(features, rng.randint(0, len(features)))
+            ])
+            Review.objects.bulk_create([
+                Review(location_id=location.id, user=rng.choice(users), rating=rng.randint(1, 5), comment=_text(rng, 12))
+                for location in created for _ in range(reviews_per_location)
+            ])
+            Proposition.objects.bulk_create([
+                Proposition(location_id=location.id, user=rng.choice(users), text=_text(rng, 10))
+                for location in created for _ in range(propositions_per_location)
+            ])
+
+    bulk_recompute_levels(Location.objects.all())
+    rebuild_ratings()
+    rebuild_review_stats()
+    rebuild_search_index()
+    bump_version(
+        Location, Review, Proposition, Category, AccessibilityFeature, AccessibilityLevel, LOCATION_COORDINATES,
+    )
+    return users
+
+
+def reset():
+    """Delete everything ``seed`` created, leaving the seeded accessibility levels in place."""
+    with transaction.atomic():
+        SearchTerm.objects.all().delete()
+        for model in (Review, Proposition):
+            model.objects.all().delete()
+        for link in (CategoryLink, FeatureLink, Location.accessibility_levels.through):
+            link.objects.all().delete()
+        Location.objects.all().delete()
+        Category.objects.all().delete()
+        AccessibilityFeature.objects.all().delete()
+        get_user_model().objects.all().delete()
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
@@ -0,0 +1,8 @@
+"""OpenAPI schema and docs views, imported by ``byteme.urls`` on the first docs request."""
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView  # noqa: F401
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    # Extensions match exact classes; documents the same bearer token scheme.
+    target_class = 'users.authentication.CachedJWTAuthentication'
@@ -2,7 +2,9 @@ import os
 from pathlib import Path
 import dj_database_url
 from dotenv import load_dotenv
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
+from importlib.util import find_spec
+from django.core.exceptions import ImproperlyConfigured
 
 load_dotenv()
 
@@ -39,7 +41,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware'
+    'byteme.middleware.AsyncWhiteNoiseMiddleware'
 ]
 
 ROOT_URLCONF = 'byteme.urls'
@@ -62,13 +64,6 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'byteme.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
-
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -100,7 +95,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -110,14 +105,28 @@ CORS_ALLOW_CREDENTIALS = True
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
-
-
 DATABASES = {
     'default': dj_database_url.config(
-        default=os.environ.get('DATABASE_URL')
+        # DATABASE_URL, falling back to a local SQLite file.
+        default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
+        # Persistent connections; health checks drop ones the server closed while idle.
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        conn_health_checks=True,
     )
 }
 
+if os.environ.get('DB_POOL') == 'True':
+    # Django's built-in PostgreSQL pool; needs psycopg 3 with the pool extra
+    # (psycopg[pool]) and replaces persistent connections.
+    if DATABASES['default'].get('ENGINE') != 'django.db.backends.postgresql' or not find_spec('psycopg_pool'):
+        raise ImproperlyConfigured('DB_POOL requires PostgreSQL and psycopg[pool].')
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
@@ -127,10 +136,87 @@ CLOUDINARY_STORAGE = {
     'API_SECRET': os.environ.get('CLOUDINARY_API_SECRET'),
 }
 
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+IMAGE_STORAGE = os.environ.get(
+    'IMAGE_STORAGE', 'cloudinary' if os.environ.get('CLOUDINARY_CLOUD_NAME') else 'local'
+)
+IMAGE_STAGING_DIR = os.environ.get('IMAGE_STAGING_DIR', os.path.join(MEDIA_ROOT, 'staging'))
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+IMAGE_WORKER_ASYNC = os.environ.get('IMAGE_WORKER_ASYNC', 'True') == 'True'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'byteme-default',
+    }
+}
+
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
+PROFILING = os.environ.get('PROFILING', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SLOW_MS = float(os.environ.get('PROFILING_SLOW_MS', 500))
+PROFILING_DUPLICATE_THRESHOLD = int(os.environ.get('PROFILING_DUPLICATE_THRESHOLD', 3))
+PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+# Delta sync: tokens older than the tombstone retention get a full resync.
+SYNC_OVERLAP_SECONDS = float(os.environ.get('SYNC_OVERLAP_SECONDS', 10))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', 30))
+
+# Rendered vector tiles, one directory per Location version. Empty tiles and
+# zooms past TILE_CACHE_MAX_ZOOM are rendered on every request instead.
+TILE_CACHE_DIR = os.environ.get('TILE_CACHE_DIR', os.path.join(BASE_DIR, 'tile_cache'))
+TILE_CACHE_MAX_ZOOM = int(os.environ.get('TILE_CACHE_MAX_ZOOM', 16))
+
+# Background jobs. Off: handlers run inline in the request. On: they are queued
+# in the database and need `manage.py run_worker` running next to the web processes.
+JOBS_ASYNC = os.environ.get('JOBS_ASYNC', 'False') == 'True'
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+# Retries wait JOB_RETRY_DELAY * 2 ** (attempt - 1) seconds, at most JOB_RETRY_MAX_DELAY.
+JOB_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY', 2))
+JOB_RETRY_MAX_DELAY = float(os.environ.get('JOB_RETRY_MAX_DELAY', 600))
+# A job running longer than this is assumed lost with its worker and queued again.
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 600))
+JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE', 100))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+JOB_RETENTION_HOURS = int(os.environ.get('JOB_RETENTION_HOURS', 24))
+
+if PROFILING:
+    MIDDLEWARE.insert(0, 'locations.profiling.ProfilingMiddleware')
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
+    # Tokens carry a hash of the password, so changing it revokes them.
+    "CHECK_REVOKE_TOKEN": True,
 }
 
+# Tokens issued before CHECK_REVOKE_TOKEN was turned on have no password hash.
+# Until this moment (ISO 8601, UTC unless an offset is given) they are still
+# accepted; set it to the deploy time plus REFRESH_TOKEN_LIFETIME so they run
+# out on their own. Left unset, they get a 401 and every user who logged in
+# before the deploy has to log in again.
+JWT_LEGACY_TOKENS_UNTIL = None
+if os.environ.get('JWT_LEGACY_TOKENS_UNTIL'):
+    JWT_LEGACY_TOKENS_UNTIL = datetime.fromisoformat(os.environ['JWT_LEGACY_TOKENS_UNTIL'])
+    if JWT_LEGACY_TOKENS_UNTIL.tzinfo is None:
+        JWT_LEGACY_TOKENS_UNTIL = JWT_LEGACY_TOKENS_UNTIL.replace(tzinfo=dt_timezone.utc)
+
+# Authenticated users are served from an in-process cache for this many seconds.
+# Saves in the same process evict the entry at once; a user deactivated or
+# given other permissions by another process (admin, worker) keeps the cached
+# row there for up to this long.
+AUTH_USER_CACHE_TTL = float(os.environ.get('AUTH_USER_CACHE_TTL', 60))
+AUTH_USER_CACHE_SIZE = int(os.environ.get('AUTH_USER_CACHE_SIZE', 10000))
+
 # CSRF_COOKIE_HTTPONLY = False
 # CSRF_TRUSTED_ORIGINS = ["http://localhost:8080"]
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""Lean settings for processes that only serve the JSON API.
+
+Use with ``DJANGO_SETTINGS_MODULE=byteme.settings_api`` (web workers) or for
+``run_worker``. Admin, messages, the OpenAPI docs and the Cloudinary apps are
+left out, and ``byteme.urls`` only mounts the admin and docs when their apps
+are installed. Image uploads still work: ``locations.images`` imports the
+Cloudinary SDK on first use. Compare the startup cost of both profiles with
+``manage.py import_times --profile byteme.settings_api``.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK, TEMPLATES
+
+API_ONLY_EXCLUDED_APPS = {
+    'django.contrib.admin',
+    'django.contrib.messages',
+    'drf_spectacular',
+    'drf_spectacular_sidecar',
+    'cloudinary',
+    'cloudinary_storage',
+}
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_ONLY_EXCLUDED_APPS]
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware != 'django.contrib.messages.middleware.MessageMiddleware'
+]
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'context_processors': [
+            processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+            if processor != 'django.contrib.messages.context_processors.messages'
+        ],
+    },
+}]
+# DRF's own schema class; drf_spectacular's would import the whole package.
+REST_FRAMEWORK = {**REST_FRAMEWORK, 'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.openapi.AutoSchema'}
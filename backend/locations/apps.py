@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class LocationsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'locations'
+
+    def ready(self):
+        from django.core import checks
+
+        from . import signals  # noqa: F401
+        from .images import check_image_storage
+
+        checks.register(check_image_storage)
@@ -0,0 +1,160 @@
+"""Native async read endpoints for ASGI deployments.
+
+Queries go through the async ORM and rows are streamed with ``aiterator``, so
+a request waiting on the database never holds up the event loop. The ORM
+still runs each query in the request's thread-sensitive ``sync_to_async``
+thread, so the ``asyncio.gather`` calls below issue them one after another,
+not in parallel; the win is the other requests served meanwhile. Responses
+match their DRF counterparts and share the versioned response cache.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from rest_framework.exceptions import ValidationError
+
+from .cache import SEARCH_INDEX, acached_response
+from .filters import filter_locations
+from .images import ORIGINAL
+from .levels import CategoryLink, FeatureLink, LevelLink
+from .models import AccessibilityFeature, AccessibilityLevel, Category, Location, Proposition, Review
+from .pagination import LocationCursorPagination, cap_ranked
+from .serializers import CategorySerializer, LocationSerializer, ReviewSerializer
+
+LOCATION_DEPENDENCIES = (Location, Review, Proposition, Category, AccessibilityFeature, AccessibilityLevel, SEARCH_INDEX)
+ROW_CHUNK_SIZE = 2000
+DEFAULT_REVIEW_LIMIT = 50
+MAX_REVIEW_LIMIT = 200
+
+
+async def collect(queryset):
+    return [item async for item in queryset.aiterator(chunk_size=ROW_CHUNK_SIZE)]
+
+
+async def links_by_location(link, column, location_ids):
+    # values() rather than values_list(): the latter's iterator runs its query
+    # as soon as it is created, which aiterator() does on the event loop.
+    links = {}
+    async for row in link.objects.filter(location_id__in=location_ids).values(
+        'location_id', column
+    ).aiterator(chunk_size=ROW_CHUNK_SIZE):
+        links.setdefault(row['location_id'], []).append(row[column])
+    return links
+
+
+def bad_request(exc):
+    return JsonResponse(exc.detail, status=400, safe=False)
+
+
+def not_found(model):
+    return JsonResponse({'detail': f'No {model.__name__} matches the given query.'}, status=404)
+
+
+def parse_limit(params, name, default, maximum):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: 'Expected an integer.'})
+    if not 0 <= value <= maximum:
+        raise ValidationError({name: f'Must be between 0 and {maximum}.'})
+    return value
+
+
+async def location_list(request):
+    """Same items as the unpaginated ``/api/locations/`` list, filters included."""
+    try:
+        queryset = await sync_to_async(filter_locations)(Location.objects.all(), request.GET)
+    except ValidationError as exc:
+        return bad_request(exc)
+    # There is no paged variant, so searches and radius queries always get the unpaged cap.
+    queryset = cap_ranked(queryset, request.GET, LocationCursorPagination.max_page_size)
+
+    async def produce():
+        location_ids = queryset.values('pk')
+        rows, categories, features, level_links, levels = await asyncio.gather(
+            collect(queryset.values(
+                'id', 'name', 'latitude', 'longitude', 'rating_sum', 'rating_count', 'thumbnails',
+            )),
+            links_by_location(CategoryLink, 'category_id', location_ids),
+            links_by_location(FeatureLink, 'accessibilityfeature_id', location_ids),
+            links_by_location(LevelLink, 'accessibilitylevel_id', location_ids),
+            collect(AccessibilityLevel.objects.values('pk', 'name', 'color')),
+        )
+        levels = {level['pk']: (level['name'], level['color']) for level in levels}
+        data = []
+        for row in rows:
+            pk = row['id']
+            level_ids = level_links.get(pk)
+            level_name, level_color = levels.get(level_ids[0], (None, None)) if level_ids else (None, None)
+            data.append({
+                'id': pk,
+                'name': row['name'],
+                'latitude': row['latitude'],
+                'longitude': row['longitude'],
+                'level': level_name,
+                'level_color': level_color,
+                'categories': categories.get(pk, []),
+                'accessibility_features': features.get(pk, []),
+                'review_count': row['rating_count'],
+                'review_average': row['rating_sum'] / row['rating_count'] if row['rating_count'] else None,
+                'thumbnails': {size: url for size, url in row['thumbnails'].items() if size != ORIGINAL},
+            })
+        return data
+
+    return await acached_response(request, ['async', 'location_list'], LOCATION_DEPENDENCIES, produce)
+
+
+async def location_detail(request, pk):
+    async def produce():
+        location, categories, features, levels, propositions = await asyncio.gather(
+            Location.objects.filter(pk=pk).select_related('review_stats').afirst(),
+            collect(Category.objects.filter(locations=pk)),
+            collect(AccessibilityFeature.objects.filter(locations=pk)),
+            collect(AccessibilityLevel.objects.filter(locations=pk)),
+            collect(Proposition.objects.filter(location_id=pk).select_related('user')),
+        )
+        if location is None:
+            raise Http404
+        # Fill the same caches prefetch_related would, so serializing runs no queries.
+        location._prefetched_objects_cache = {
+            'categories': categories, 'accessibility_features': features, 'accessibility_levels': levels,
+            'propositions': propositions,
+        }
+        return LocationSerializer(location).data
+
+    try:
+        return await acached_response(request, ['async', 'location_detail', str(pk)], LOCATION_DEPENDENCIES, produce)
+    except Http404:
+        return not_found(Location)
+
+
+async def location_reviews(request, pk):
+    """Newest first, paged with ``limit``/``offset``."""
+    try:
+        limit = parse_limit(request.GET, 'limit', DEFAULT_REVIEW_LIMIT, MAX_REVIEW_LIMIT)
+        offset = parse_limit(request.GET, 'offset', 0, 10 ** 9)
+    except ValidationError as exc:
+        return bad_request(exc)
+
+    async def produce():
+        reviews = Review.objects.filter(location_id=pk)
+        exists, count, page = await asyncio.gather(
+            Location.objects.filter(pk=pk).aexists(),
+            reviews.acount(),
+            collect(reviews.select_related('user').order_by('-created_at', '-id')[offset:offset + limit]),
+        )
+        if not exists:
+            raise Http404
+        return {'count': count, 'results': ReviewSerializer(page, many=True).data}
+
+    try:
+        return await acached_response(request, ['async', 'location_reviews', str(pk)], (Location, Review), produce)
+    except Http404:
+        return not_found(Location)
+
+
+async def category_list(request):
+    async def produce():
+        return CategorySerializer(await collect(Category.objects.all()), many=True).data
+
+    return await acached_response(request, ['async', 'category_list'], (Category,), produce)
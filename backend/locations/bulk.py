@@ -0,0 +1,165 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from .cache import bump_version
+from .facets import facet_index
+from .levels import FeatureLink
+from .models import MAX_RATING, MIN_RATING, AccessibilityFeature, Location, Proposition, Review
+from .ratings import apply_rating_delta
+from .review_stats import apply_stats_delta
+from .sync import touch_locations
+from .tasks import RECOMPUTE_LEVELS_JOB, REINDEX_JOB, enqueue_for_locations
+
+MAX_BULK_ITEMS = 1000
+
+
+class FeatureLinkItemSerializer(serializers.Serializer):
+    location = serializers.IntegerField()
+    feature = serializers.IntegerField()
+
+
+class ReviewItemSerializer(serializers.Serializer):
+    # Plain integers: ids are checked together in one query, not one per item.
+    location = serializers.IntegerField()
+    rating = serializers.IntegerField(min_value=MIN_RATING, max_value=MAX_RATING)
+    comment = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class PropositionItemSerializer(serializers.Serializer):
+    location = serializers.IntegerField()
+    text = serializers.CharField()
+
+
+def validate_items(items, serializer_class):
+    """(index, validated data) for valid items plus a result entry for each invalid one."""
+    if not isinstance(items, list):
+        raise serializers.ValidationError('Expected a list of items.')
+    if len(items) > MAX_BULK_ITEMS:
+        raise serializers.ValidationError(f'At most {MAX_BULK_ITEMS} items per request.')
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        serializer = serializer_class(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'status': 'error', 'errors': serializer.errors})
+    return valid, errors
+
+
+def existing_ids(model, ids):
+    return set(model.objects.filter(pk__in=set(ids)).values_list('pk', flat=True))
+
+
+def apply_feature_links(add, remove):
+    """Add and remove (location, feature) links with one INSERT and one DELETE.
+
+    ``add``/``remove`` are lists of ``{'location': id, 'feature': id}``; the
+    result has one entry per item, in order, with the ``add`` items first.
+    """
+    items = [('add', item) for item in add] + [('remove', item) for item in remove]
+    if len(items) > MAX_BULK_ITEMS:
+        raise serializers.ValidationError(f'At most {MAX_BULK_ITEMS} items per request.')
+    valid, errors = validate_items([item for _, item in items], FeatureLinkItemSerializer)
+    results = {entry['index']: entry for entry in errors}
+
+    pairs = {(data['location'], data['feature']) for _, data in valid}
+    locations = existing_ids(Location, [location for location, _ in pairs])
+    features = existing_ids(AccessibilityFeature, [feature for _, feature in pairs])
+    linked = set(FeatureLink.objects.filter(
+        location_id__in=locations, accessibilityfeature_id__in=features,
+    ).values_list('location_id', 'accessibilityfeature_id'))
+
+    to_add, to_remove = set(), set()
+    for index, data in valid:
+        action = items[index][0]
+        pair = (data['location'], data['feature'])
+        result = {'index': index, 'action': action, 'location': pair[0], 'feature': pair[1]}
+        if pair[0] not in locations:
+            result.update(status='error', errors={'location': 'Location not found.'})
+        elif pair[1] not in features:
+            result.update(status='error', errors={'feature': 'Feature not found.'})
+        elif action == 'add':
+            # A pair both added and removed in one request ends up removed.
+            result['status'] = 'added' if pair not in linked and pair not in to_add else 'unchanged'
+            to_add.add(pair)
+        else:
+            result['status'] = 'removed' if (pair in linked or pair in to_add) and pair not in to_remove else 'unchanged'
+            to_remove.add(pair)
+        results[index] = result
+
+    to_add = (to_add - to_remove) - linked
+    to_remove &= linked
+    if to_add or to_remove:
+        with transaction.atomic():
+            FeatureLink.objects.bulk_create(
+                [FeatureLink(location_id=location, accessibilityfeature_id=feature) for location, feature in to_add],
+                ignore_conflicts=True,
+            )
+            if to_remove:
+                removed_by_location = defaultdict(list)
+                for location, feature in to_remove:
+                    removed_by_location[location].append(feature)
+                pairs_filter = Q()
+                for location, feature_ids in removed_by_location.items():
+                    pairs_filter |= Q(location_id=location, accessibilityfeature_id__in=feature_ids)
+                FeatureLink.objects.filter(pairs_filter).delete()
+            # Bulk writes skip m2m_changed, so do what its receivers would, once.
+            facet_index.pairs_changed('accessibility_features', to_add, to_remove)
+            bump_version(Location)
+            changed = {location for location, _ in to_add | to_remove}
+            enqueue_for_locations(RECOMPUTE_LEVELS_JOB, changed)
+            touch_locations(changed)
+    return [results[index] for index in range(len(items))]
+
+
+def create_reviews(user, items):
+    valid, errors = validate_items(items, ReviewItemSerializer)
+    return _create(
+        Review, valid, errors,
+        lambda data: Review(location_id=data['location'], user=user, rating=data['rating'], comment=data['comment']),
+        after=_apply_review_ratings,
+    )
+
+
+def create_propositions(user, items):
+    valid, errors = validate_items(items, PropositionItemSerializer)
+    return _create(
+        Proposition, valid, errors,
+        lambda data: Proposition(location_id=data['location'], user=user, text=data['text']),
+    )
+
+
+def _apply_review_ratings(reviews):
+    ratings = defaultdict(Counter)
+    for review in reviews:
+        ratings[review.location_id][review.rating] += 1
+    for location_id, counts in ratings.items():
+        apply_rating_delta(location_id, sum(rating * count for rating, count in counts.items()), counts.total())
+        apply_stats_delta(location_id, counts)
+
+
+def _create(model, valid, errors, build, after=None):
+    results = {entry['index']: entry for entry in errors}
+    locations = existing_ids(Location, [data['location'] for _, data in valid])
+    pending = []
+    for index, data in valid:
+        if data['location'] in locations:
+            pending.append((index, build(data)))
+        else:
+            results[index] = {'index': index, 'status': 'error', 'errors': {'location': 'Location not found.'}}
+
+    if pending:
+        instances = [instance for _, instance in pending]
+        with transaction.atomic():
+            model.objects.bulk_create(instances)
+            # bulk_create skips post_save; apply what its receivers would, once.
+            if after is not None:
+                after(instances)
+            enqueue_for_locations(REINDEX_JOB, {instance.location_id for instance in instances})
+            bump_version(model)
+        for index, instance in pending:
+            results[index] = {'index': index, 'status': 'created', 'id': instance.pk}
+    return [results[index] for index in sorted(results)]
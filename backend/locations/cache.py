@@ -0,0 +1,171 @@
+import hashlib
+import secrets
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.http import HttpResponseNotModified, JsonResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import ModelVersion
+
+VERSION_STEP_RANGE = 1 << 20
+# Same separators as DRF's JSONRenderer.
+COMPACT_JSON = {'separators': (',', ':')}
+
+# Sent after every bump with ``previous`` and ``version`` as seen by this process.
+version_changed = Signal()
+
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+_stats_lock = threading.Lock()
+
+
+# Versioned like a model, but only bumped when a location is added, moved or removed.
+LOCATION_COORDINATES = 'locations.location.coordinates'
+# Bumped when the search index is rebuilt outside the write that made it stale (background jobs).
+SEARCH_INDEX = 'locations.searchterm'
+
+
+def version_key(model):
+    """``model`` is a model class or a plain version name such as ``LOCATION_COORDINATES``."""
+    if isinstance(model, str):
+        return model
+    return model._meta.label_lower
+
+
+def bump_version(*models):
+    """Advance the version of each model and announce it through ``version_changed``.
+
+    Steps are random rather than +1: a rolled back write can then never leave
+    behind a number that a later, different write reuses, so anything keyed
+    on a version (cached responses, in-process indexes) can't be revived.
+    """
+    for model in models:
+        name = version_key(model)
+        step = secrets.randbelow(VERSION_STEP_RANGE) + 1
+        if not ModelVersion.objects.filter(name=name).update(version=F('version') + step):
+            try:
+                with transaction.atomic():
+                    ModelVersion.objects.create(name=name, version=step)
+            except IntegrityError:
+                ModelVersion.objects.filter(name=name).update(version=F('version') + step)
+        version = ModelVersion.objects.filter(name=name).values_list('version', flat=True).first()
+        version_changed.send(sender=model, previous=version - step, version=version)
+
+
+def get_versions(models):
+    names = [version_key(model) for model in models]
+    versions = dict(ModelVersion.objects.filter(name__in=names).values_list('name', 'version'))
+    return tuple(versions.get(name, 0) for name in names)
+
+
+def cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def normalized_query(query_params):
+    return '&'.join(
+        f'{key}={",".join(sorted(query_params.getlist(key)))}' for key in sorted(query_params)
+    )
+
+
+def response_cache_key(parts, query_params, versions):
+    raw_key = '|'.join([*parts, normalized_query(query_params), repr(versions)])
+    return hashlib.sha1(raw_key.encode()).hexdigest()
+
+
+def if_none_match(request, etag):
+    return etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+
+
+class CachedResponseMixin:
+    """Caches the serialized data of ``list``/``retrieve`` responses.
+
+    Entries are keyed on the view, its URL kwargs, the negotiated renderer,
+    the normalized query string and the current version of every model in
+    ``cache_dependencies``. A write to any of those models bumps its version,
+    so stale data is never served; old entries simply age out. The same key doubles as the ETag.
+    """
+    cache_dependencies = ()
+    cache_bypass_params = ('stream',)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if any(param in request.query_params for param in self.cache_bypass_params):
+            return handler(request, *args, **kwargs)
+
+        versions = get_versions(self.cache_dependencies)
+        digest = response_cache_key(
+            [
+                type(self).__module__, type(self).__name__, self.action, repr(sorted(kwargs.items())),
+                # Renderers such as ColumnarRenderer produce different data, not just different bytes.
+                request.accepted_renderer.format,
+            ],
+            request.query_params, versions,
+        )
+        etag = f'"{digest}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+        if if_none_match(request, etag):
+            _count('not_modified')
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        cache = caches[settings.RESPONSE_CACHE_ALIAS]
+        cache_key = f'response:{digest}'
+        data = cache.get(cache_key)
+        if data is not None:
+            _count('hits')
+            return Response(data, headers={**headers, 'X-Cache': 'HIT'})
+
+        _count('misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(cache_key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            for header, value in headers.items():
+                response[header] = value
+            response['X-Cache'] = 'MISS'
+        return response
+
+
+async def acached_response(request, parts, dependencies, produce):
+    """Async counterpart of ``CachedResponseMixin`` for plain Django views.
+
+    ``produce`` is a coroutine function returning JSON-serializable data; it
+    only runs on a cache miss.
+    """
+    versions = await sync_to_async(get_versions)(dependencies)
+    digest = response_cache_key(parts, request.GET, versions)
+    etag = f'"{digest}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+    if if_none_match(request, etag):
+        _count('not_modified')
+        return HttpResponseNotModified(headers=headers)
+
+    cache = caches[settings.RESPONSE_CACHE_ALIAS]
+    cache_key = f'response:{digest}'
+    data = await cache.aget(cache_key)
+    if data is not None:
+        _count('hits')
+        return JsonResponse(data, safe=False, json_dumps_params=COMPACT_JSON, headers={**headers, 'X-Cache': 'HIT'})
+
+    _count('misses')
+    data = await produce()
+    await cache.aset(cache_key, data, settings.RESPONSE_CACHE_TIMEOUT)
+    return JsonResponse(data, safe=False, json_dumps_params=COMPACT_JSON, headers={**headers, 'X-Cache': 'MISS'})
@@ -0,0 +1,108 @@
+import math
+
+from .models import ACCESSIBILITY_LEVEL_COLORS
+from .snapshot import LEVEL_NAMES
+
+MAX_ZOOM = 20
+MAX_TILES = 64
+# Each 256px tile is split into CLUSTER_GRID x CLUSTER_GRID cells (32px at the default).
+CLUSTER_GRID = 8
+MAX_LATITUDE = 85.05112878
+MEMO_LIMIT = 4096
+
+
+def mercator_x(longitude, zoom):
+    return (longitude + 180.0) / 360.0 * (1 << zoom)
+
+
+def mercator_y(latitude, zoom):
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    return (1.0 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2.0 * (1 << zoom)
+
+
+def tile_bounds(zoom, x, y):
+    """(south, west, north, east) of a slippy-map tile."""
+    n = 1 << zoom
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+
+def tile_range(south, west, north, east, zoom):
+    """Inclusive (x0, y0, x1, y1) of the tiles covering the box."""
+    last = (1 << zoom) - 1
+    return (
+        min(last, int(mercator_x(west, zoom))),
+        min(last, int(mercator_y(north, zoom))),
+        min(last, int(mercator_x(east, zoom))),
+        min(last, int(mercator_y(south, zoom))),
+    )
+
+
+def tile_count(south, west, north, east, zoom):
+    x0, y0, x1, y1 = tile_range(south, west, north, east, zoom)
+    return (x1 - x0 + 1) * (y1 - y0 + 1)
+
+
+def tiles_for_bbox(south, west, north, east, zoom):
+    x0, y0, x1, y1 = tile_range(south, west, north, east, zoom)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def tile_clusters(snapshot, zoom, x, y):
+    """Grid clusters for one tile, memoized on the snapshot until locations change."""
+    key = ('clusters', zoom, x, y)
+    clusters = snapshot.memo.get(key)
+    if clusters is not None:
+        return clusters
+
+    scale = CLUSTER_GRID
+    cells = {}
+    latitudes, longitudes, levels, ids = snapshot.latitudes, snapshot.longitudes, snapshot.levels, snapshot.ids
+    for position in snapshot.in_bbox(*tile_bounds(zoom, x, y)):
+        lat = latitudes[position]
+        lng = longitudes[position]
+        cx = int(mercator_x(lng, zoom) * scale)
+        cy = int(mercator_y(lat, zoom) * scale)
+        # Points on a shared edge fall inside two tiles' boxes; keep them in one.
+        if cx // scale != x or cy // scale != y:
+            continue
+        cell = cells.get((cx, cy))
+        if cell is None:
+            cell = cells[(cx, cy)] = [0, 0.0, 0.0, [0] * len(LEVEL_NAMES), ids[position]]
+        cell[0] += 1
+        cell[1] += lat
+        cell[2] += lng
+        if levels[position] >= 0:
+            cell[3][levels[position]] += 1
+
+    clusters = []
+    for count, lat_sum, lng_sum, level_counts, first_id in cells.values():
+        level = None
+        if any(level_counts):
+            level = LEVEL_NAMES[max(range(len(level_counts)), key=level_counts.__getitem__)]
+        clusters.append({
+            'count': count,
+            'latitude': lat_sum / count,
+            'longitude': lng_sum / count,
+            'level': level,
+            'color': ACCESSIBILITY_LEVEL_COLORS.get(level, '#FFFFFF'),
+            'location_id': first_id if count == 1 else None,
+        })
+
+    if len(snapshot.memo) >= MEMO_LIMIT:
+        snapshot.memo.clear()
+    snapshot.memo[key] = clusters
+    return clusters
+
+
+def clusters_for_bbox(snapshot, south, west, north, east, zoom):
+    clusters = []
+    for x, y in tiles_for_bbox(south, west, north, east, zoom):
+        clusters.extend(
+            cluster for cluster in tile_clusters(snapshot, zoom, x, y)
+            if south <= cluster['latitude'] <= north and west <= cluster['longitude'] <= east
+        )
+    return clusters
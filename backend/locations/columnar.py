@@ -0,0 +1,172 @@
+"""Columnar encoding of location lists, served for ``?format=columnar``.
+
+Instead of one object per location the payload holds one array per field:
+
+- ``id_deltas``: each id minus the one before it.
+- ``latitude`` / ``longitude``: base64 of little-endian float64 arrays.
+- ``level``: index into ``levels`` (``[name, color]`` pairs), or -1 for none.
+- ``categories`` / ``accessibility_features``: per-row lists of indexes into
+  ``category_ids`` / ``feature_ids``.
+- ``review_count`` and ``rating_sum``; the average is their quotient.
+
+``decode_locations`` turns a payload back into the rows of the JSON list.
+"""
+import base64
+import sys
+from array import array
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .images import ORIGINAL
+from .levels import CategoryLink, FeatureLink, LevelLink
+from .models import AccessibilityLevel
+from .sync import ROW_CHUNK_SIZE, link_map
+
+FORMAT_VERSION = 1
+
+
+class ColumnarRenderer(JSONRenderer):
+    media_type = 'application/vnd.byteme.columnar+json'
+    format = 'columnar'
+
+    def get_indent(self, accepted_media_type, renderer_context):
+        return None
+
+
+def pack_floats(values):
+    packed = array('d', values)
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode('ascii')
+
+
+def unpack_floats(data):
+    packed = array('d')
+    packed.frombytes(base64.b64decode(data))
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return packed.tolist()
+
+
+def delta_encode(values):
+    previous, deltas = 0, []
+    for value in values:
+        deltas.append(value - previous)
+        previous = value
+    return deltas
+
+
+def delta_decode(deltas):
+    total, values = 0, []
+    for delta in deltas:
+        total += delta
+        values.append(total)
+    return values
+
+
+class Dictionary:
+    """Numbers distinct values in order of first appearance."""
+
+    def __init__(self):
+        self.indexes = {}
+
+    def __call__(self, value):
+        index = self.indexes.get(value)
+        if index is None:
+            index = self.indexes[value] = len(self.indexes)
+        return index
+
+    def values(self):
+        return list(self.indexes)
+
+
+def encode_locations(queryset):
+    """Columnar payload for ``queryset``, in its order; link ids come out sorted."""
+    location_ids = queryset.order_by().values('pk')
+    categories = link_map(CategoryLink, 'category_id', location_ids)
+    features = link_map(FeatureLink, 'accessibilityfeature_id', location_ids)
+    level_links = link_map(LevelLink, 'accessibilitylevel_id', location_ids)
+    level_rows = {pk: (name, color) for pk, name, color in AccessibilityLevel.objects.values_list('pk', 'name', 'color')}
+
+    levels, category_ids, feature_ids = Dictionary(), Dictionary(), Dictionary()
+    ids, names, latitudes, longitudes, level_column = [], [], [], [], []
+    category_column, feature_column, counts, sums, thumbnails = [], [], [], [], []
+    for pk, name, latitude, longitude, rating_sum, rating_count, sizes in queryset.values_list(
+        'pk', 'name', 'latitude', 'longitude', 'rating_sum', 'rating_count', 'thumbnails',
+    ).iterator(chunk_size=ROW_CHUNK_SIZE):
+        ids.append(pk)
+        names.append(name)
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+        level_ids = level_links.get(pk)
+        level_column.append(levels(level_rows[level_ids[0]]) if level_ids else -1)
+        category_column.append([category_ids(category) for category in sorted(categories.get(pk, ()))])
+        feature_column.append([feature_ids(feature) for feature in sorted(features.get(pk, ()))])
+        counts.append(rating_count)
+        sums.append(rating_sum)
+        thumbnails.append({size: url for size, url in sizes.items() if size != ORIGINAL})
+
+    return {
+        'format': ColumnarRenderer.format,
+        'version': FORMAT_VERSION,
+        'count': len(ids),
+        'id_deltas': delta_encode(ids),
+        'name': names,
+        'latitude': pack_floats(latitudes),
+        'longitude': pack_floats(longitudes),
+        'levels': [list(level) for level in levels.values()],
+        'level': level_column,
+        'category_ids': category_ids.values(),
+        'categories': category_column,
+        'feature_ids': feature_ids.values(),
+        'accessibility_features': feature_column,
+        'review_count': counts,
+        'rating_sum': sums,
+        'thumbnails': thumbnails,
+    }
+
+
+def decode_locations(payload):
+    """The rows of the JSON location list, from a payload made by ``encode_locations``."""
+    levels, category_ids, feature_ids = payload['levels'], payload['category_ids'], payload['feature_ids']
+    rows = []
+    for index, (pk, latitude, longitude) in enumerate(zip(
+        delta_decode(payload['id_deltas']), unpack_floats(payload['latitude']), unpack_floats(payload['longitude']),
+    )):
+        level = levels[payload['level'][index]] if payload['level'][index] >= 0 else (None, None)
+        count = payload['review_count'][index]
+        rows.append({
+            'id': pk,
+            'name': payload['name'][index],
+            'latitude': latitude,
+            'longitude': longitude,
+            'level': level[0],
+            'level_color': level[1],
+            'categories': [category_ids[i] for i in payload['categories'][index]],
+            'accessibility_features': [feature_ids[i] for i in payload['accessibility_features'][index]],
+            'review_count': count,
+            'review_average': payload['rating_sum'][index] / count if count else None,
+            'thumbnails': payload['thumbnails'][index],
+        })
+    return rows
+
+
+class ColumnarListMixin:
+    """Answers the list action with ``encode_locations`` when ``ColumnarRenderer`` was negotiated.
+
+    Rows come straight from ``values_list``; no serializer or model instance
+    is created per location.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != ColumnarRenderer.format:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        page = self.paginate_queryset(queryset.only('pk'))
+        if page is not None:
+            page_ids = [location.pk for location in page]
+            return self.get_paginated_response(
+                encode_locations(queryset.filter(pk__in=page_ids).order_by(*self.paginator.ordering))
+            )
+        return Response(encode_locations(queryset))
@@ -0,0 +1,200 @@
+"""Accessibility coverage per grid cell, for ``/api/analytics/coverage/``.
+
+``CoverageIndex`` keeps a columnar copy of what the analytics read from every
+location (coordinates, level, feature ids and rating totals), sorted by
+longitude like ``LocationSnapshot`` so a bounding box is one bisected slice.
+When the versions it depends on move it does not reload everything: like
+delta sync it reads the locations changed since its last refresh through
+``updated_at`` and the deleted ones through ``Tombstone``, and patches those
+rows in place. Big deltas, old refreshes and a row count that no longer
+matches the table (e.g. after a rolled back write) fall back to a full load.
+"""
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import get_versions
+from .levels import FeatureLink, LevelLink
+from .models import AccessibilityFeature, Location, Review, Tombstone
+from .snapshot import LEVEL_NAMES, NO_LEVEL, level_positions
+from .sync import ROW_CHUNK_SIZE, link_map
+
+# Ratings are written with F() updates that only bump Review; feature names live on AccessibilityFeature.
+DEPENDENCIES = (Location, Review, AccessibilityFeature)
+MAX_CELLS = 4096
+DEFAULT_RESOLUTION = 1.0
+# About 1 m of latitude; finer cells would hold one location each anyway.
+MIN_RESOLUTION = 1e-5
+MAX_RESOLUTION = 180.0
+# Changed rows patched in place before a full load is cheaper.
+MIN_PATCH = 256
+
+
+def cell_range(south, west, north, east, resolution):
+    """Inclusive (row0, col0, row1, col1) of the grid cells covering the box."""
+    return (
+        math.floor(south / resolution), math.floor(west / resolution),
+        math.floor(north / resolution), math.floor(east / resolution),
+    )
+
+
+def cell_count(south, west, north, east, resolution):
+    row0, col0, row1, col1 = cell_range(south, west, north, east, resolution)
+    return (row1 - row0 + 1) * (col1 - col0 + 1)
+
+
+def load_rows(queryset):
+    """(longitude, latitude, pk, level, feature ids, rating sum, rating count) rows, sorted."""
+    location_ids = queryset.values('pk')
+    features = link_map(FeatureLink, 'accessibilityfeature_id', location_ids)
+    levels = link_map(LevelLink, 'accessibilitylevel_id', location_ids)
+    level_index = level_positions()
+    return sorted(
+        (
+            longitude, latitude, pk,
+            level_index.get(levels[pk][0], NO_LEVEL) if pk in levels else NO_LEVEL,
+            tuple(sorted(features.get(pk, ()))), rating_sum, rating_count,
+        )
+        for pk, latitude, longitude, rating_sum, rating_count in queryset.values_list(
+            'pk', 'latitude', 'longitude', 'rating_sum', 'rating_count',
+        ).iterator(chunk_size=ROW_CHUNK_SIZE)
+    )
+
+
+class CoverageIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.versions = None
+        self.refreshed = None
+        self.feature_names = {}
+        self._load([])
+
+    def _load(self, rows):
+        columns = list(zip(*rows)) or [()] * 7
+        self.longitudes = array('d', columns[0])
+        self.latitudes = array('d', columns[1])
+        self.ids = array('q', columns[2])
+        self.levels = array('b', columns[3])
+        self.features = list(columns[4])
+        self.rating_sums = array('q', columns[5])
+        self.rating_counts = array('q', columns[6])
+        # Same order as the load_rows() tuples.
+        self.columns = (
+            self.longitudes, self.latitudes, self.ids, self.levels,
+            self.features, self.rating_sums, self.rating_counts,
+        )
+        self.longitude_of = dict(zip(self.ids, self.longitudes))
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _refresh(self, versions):
+        started = timezone.now()
+        if self.refreshed is None or self.refreshed < started - timedelta(days=settings.SYNC_TOMBSTONE_DAYS):
+            self._load(load_rows(Location.objects.all()))
+        else:
+            window = self.refreshed - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+            limit = max(MIN_PATCH, math.isqrt(len(self)))
+            changed = list(
+                Location.objects.filter(updated_at__gte=window).values_list('pk', flat=True)[:limit + 1]
+            )
+            if len(changed) > limit:
+                self._load(load_rows(Location.objects.all()))
+            else:
+                self._patch(
+                    Tombstone.objects.filter(model='location', deleted_at__gte=window).values_list('object_id', flat=True),
+                    load_rows(Location.objects.filter(pk__in=changed)) if changed else [],
+                )
+                if len(self) != Location.objects.count():
+                    self._load(load_rows(Location.objects.all()))
+        self.feature_names = dict(AccessibilityFeature.objects.values_list('pk', 'name'))
+        self.versions = versions
+        self.refreshed = started
+
+    def _patch(self, deleted, rows):
+        # Deletes first, then upserts, so an id reused after a delete stays.
+        for pk in deleted:
+            self._remove(pk)
+        for row in rows:
+            self._remove(row[2])
+            position = bisect_right(self.longitudes, row[0])
+            for column, value in zip(self.columns, row):
+                column.insert(position, value)
+            self.longitude_of[row[2]] = row[0]
+
+    def _remove(self, pk):
+        longitude = self.longitude_of.pop(pk, None)
+        if longitude is None:
+            return
+        position = bisect_left(self.longitudes, longitude)
+        while self.ids[position] != pk:
+            position += 1
+        for column in self.columns:
+            del column[position]
+
+    def coverage(self, south, west, north, east, resolution, versions=None):
+        """Report on the non-empty grid cells inside the box, refreshing first if ``versions`` moved."""
+        versions = versions or get_versions(DEPENDENCIES)
+        with self._lock:
+            if versions != self.versions:
+                self._refresh(versions)
+            return {
+                'levels': list(LEVEL_NAMES),
+                'features': {str(pk): name for pk, name in sorted(self.feature_names.items())},
+                'cells': self._cells(south, west, north, east, resolution),
+            }
+
+    def _cells(self, south, west, north, east, resolution):
+        cells = {}
+        latitudes, longitudes, levels = self.latitudes, self.longitudes, self.levels
+        features, rating_sums, rating_counts = self.features, self.rating_sums, self.rating_counts
+        floor = math.floor
+        for position in range(bisect_left(longitudes, west), bisect_right(longitudes, east)):
+            latitude = latitudes[position]
+            if not south <= latitude <= north:
+                continue
+            key = (floor(latitude / resolution), floor(longitudes[position] / resolution))
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = [0, [0] * len(LEVEL_NAMES), {}, 0, 0]
+            cell[0] += 1
+            if levels[position] != NO_LEVEL:
+                cell[1][levels[position]] += 1
+            feature_counts = cell[2]
+            for feature_id in features[position]:
+                feature_counts[feature_id] = feature_counts.get(feature_id, 0) + 1
+            cell[3] += rating_sums[position]
+            cell[4] += rating_counts[position]
+
+        result = []
+        for (row, col), (count, level_counts, feature_counts, rating_sum, rating_count) in sorted(cells.items()):
+            result.append({
+                'row': row,
+                'col': col,
+                # west,south,east,north like the bbox parameter.
+                'bounds': [col * resolution, row * resolution, (col + 1) * resolution, (row + 1) * resolution],
+                'count': count,
+                'levels': dict(zip(LEVEL_NAMES, level_counts)),
+                'features': {
+                    str(feature_id): feature_counts[feature_id] / count
+                    for feature_id in sorted(feature_counts) if feature_id in self.feature_names
+                },
+                'review_count': rating_count,
+                'rating_average': rating_sum / rating_count if rating_count else None,
+            })
+        return result
+
+
+coverage_index = CoverageIndex()
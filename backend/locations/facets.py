@@ -0,0 +1,287 @@
+import threading
+
+from django.dispatch import receiver
+
+from .cache import get_versions, version_changed
+from .levels import CategoryLink, FeatureLink, LevelLink, get_level_ids, level_for_score, location_levels_changed
+from .models import AccessibilityFeature, AccessibilityLevel, Category, Location
+
+FACET_GROUPS = {
+    'categories': (Category, CategoryLink, 'category_id'),
+    'accessibility_features': (AccessibilityFeature, FeatureLink, 'accessibilityfeature_id'),
+    'accessibility_levels': (AccessibilityLevel, LevelLink, 'accessibilitylevel_id'),
+}
+GROUP_BY_MODEL = {model: group for group, (model, _, _) in FACET_GROUPS.items()}
+GROUP_BY_LINK = {link: group for group, (_, link, _) in FACET_GROUPS.items()}
+TRACKED_MODELS = (Location, Category, AccessibilityFeature, AccessibilityLevel)
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+
+def ids_to_bitmap(ids):
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        bits[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bitmap_contains(bitmap):
+    """Fast ``pk in bitmap`` predicate; shifting a big int per lookup costs O(size)."""
+    bits = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    size = len(bits)
+    return lambda pk: (pk >> 3) < size and bits[pk >> 3] >> (pk & 7) & 1
+
+
+def bitmap_to_ids(bitmap):
+    ids = []
+    for index, byte in enumerate(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')):
+        if byte:
+            base = index << 3
+            ids.extend(base + bit for bit in range(8) if byte >> bit & 1)
+    return ids
+
+
+class FacetIndex:
+    """In-memory bitmaps (Python ints, bit N = location N) per category, feature and level.
+
+    Signals keep the bitmaps current for writes made in this process. Each of
+    those writes is followed by a version bump; the index advances its own
+    version only for bumps it has a matching delta for, so anything it did not
+    see (other processes, bulk SQL) leaves it stale and triggers a full
+    rebuild on the next read.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.versions = None
+        self.all = 0
+        self.bitmaps = {group: {} for group in FACET_GROUPS}
+        self.names = {group: {} for group in FACET_GROUPS}
+        self.expected = {model: 0 for model in TRACKED_MODELS}
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def current(self):
+        versions = dict(zip(TRACKED_MODELS, get_versions(TRACKED_MODELS)))
+        with self._lock:
+            if versions != self.versions:
+                self._rebuild(versions)
+        return self
+
+    def _rebuild(self, versions):
+        self._reset()
+        self.all = ids_to_bitmap(Location.objects.values_list('pk', flat=True).iterator())
+        for group, (model, link, column) in FACET_GROUPS.items():
+            self.names[group] = dict(model.objects.values_list('pk', 'name'))
+            members = {pk: [] for pk in self.names[group]}
+            for location_id, facet_id in link.objects.values_list('location_id', column).iterator():
+                members.setdefault(facet_id, []).append(location_id)
+            self.bitmaps[group] = {facet_id: ids_to_bitmap(ids) for facet_id, ids in members.items()}
+        self.versions = versions
+
+    # Queries
+
+    def facet_bitmap(self, group, names):
+        """OR of every facet in ``group`` called one of ``names`` (names are not unique)."""
+        wanted = set(names)
+        bitmap = 0
+        for facet_id, name in self.names[group].items():
+            if name in wanted:
+                bitmap |= self.bitmaps[group].get(facet_id, 0)
+        return bitmap
+
+    def select(self, selection, match=MATCH_ANY, exclude_group=None):
+        """Locations matching ``selection`` ({group: [names]}); groups are always ANDed together."""
+        result = self.all
+        for group, names in selection.items():
+            if not names or group == exclude_group:
+                continue
+            if match == MATCH_ALL:
+                for name in set(names):
+                    result &= self.facet_bitmap(group, [name])
+            else:
+                result &= self.facet_bitmap(group, names)
+        return result
+
+    def having_all(self, group, facet_ids):
+        """Locations linked to every facet in ``facet_ids`` (by id)."""
+        with self._lock:
+            result = self.all
+            for facet_id in set(facet_ids):
+                result &= self.bitmaps[group].get(facet_id, 0)
+            return result
+
+    def matching(self, selection, match=MATCH_ANY):
+        """Consistent snapshot of (selected bitmap, bitmap of all locations)."""
+        with self._lock:
+            return self.select(selection, match), self.all
+
+    def counts(self, selection, match=MATCH_ANY):
+        """Per-facet counts for the current selection.
+
+        With OR semantics a group's own selection is left out when counting it,
+        so the numbers show what ticking another option in that group would add.
+        """
+        with self._lock:
+            selected = self.select(selection, match)
+            facets = {}
+            for group in FACET_GROUPS:
+                base = self.select(selection, match, exclude_group=group) if match == MATCH_ANY else selected
+                facets[group] = [
+                    {'id': facet_id, 'name': name, 'count': (base & self.bitmaps[group].get(facet_id, 0)).bit_count()}
+                    for facet_id, name in sorted(self.names[group].items())
+                ]
+            return selected.bit_count(), facets
+
+    # Incremental updates, called from model signals
+
+    def _expect(self, model):
+        if self.versions is not None:
+            self.expected[model] += 1
+
+    def version_bumped(self, model, previous, version):
+        with self._lock:
+            if self.versions is None or model not in self.expected:
+                return
+            if self.expected[model] > 0 and self.versions[model] == previous:
+                self.expected[model] -= 1
+                self.versions[model] = version
+            else:
+                self.versions = None
+
+    def link(self, group, location_ids, facet_ids, add):
+        with self._lock:
+            if self.versions is None:
+                return
+            bitmaps = self.bitmaps[group]
+            mask = ids_to_bitmap(location_ids)
+            for facet_id in facet_ids:
+                if add:
+                    bitmaps[facet_id] = bitmaps.get(facet_id, 0) | mask
+                else:
+                    bitmaps[facet_id] = bitmaps.get(facet_id, 0) & ~mask
+
+    def clear_location(self, group, location_id):
+        self.link(group, [location_id], list(self.bitmaps[group]), add=False)
+
+    def clear_facet(self, group, facet_id):
+        with self._lock:
+            if self.versions is not None:
+                self.bitmaps[group][facet_id] = 0
+
+    def location_saved(self, location_id, created):
+        with self._lock:
+            if created and self.versions is not None:
+                self.all |= 1 << location_id
+                # Location.save() links new rows to the lowest level right after this signal.
+                level_id = get_level_ids()[level_for_score(0)]
+                self.bitmaps['accessibility_levels'][level_id] = (
+                    self.bitmaps['accessibility_levels'].get(level_id, 0) | 1 << location_id
+                )
+            self._expect(Location)
+
+    def location_deleted(self, location_id):
+        with self._lock:
+            if self.versions is not None:
+                mask = ~(1 << location_id)
+                self.all &= mask
+                for bitmaps in self.bitmaps.values():
+                    for facet_id in bitmaps:
+                        bitmaps[facet_id] &= mask
+            self._expect(Location)
+
+    def facet_saved(self, model, facet_id, name):
+        with self._lock:
+            if self.versions is not None:
+                self.names[GROUP_BY_MODEL[model]][facet_id] = name
+            self._expect(model)
+
+    def facet_deleted(self, model, facet_id):
+        with self._lock:
+            if self.versions is not None:
+                group = GROUP_BY_MODEL[model]
+                self.names[group].pop(facet_id, None)
+                self.bitmaps[group].pop(facet_id, None)
+            self._expect(model)
+
+    def levels_changed(self, changes):
+        with self._lock:
+            if self.versions is not None:
+                bitmaps = self.bitmaps['accessibility_levels']
+                for location_id, old_level, new_level in changes:
+                    bit = 1 << location_id
+                    if old_level is not None:
+                        bitmaps[old_level] = bitmaps.get(old_level, 0) & ~bit
+                    bitmaps[new_level] = bitmaps.get(new_level, 0) | bit
+            self._expect(Location)
+
+    def links_changed(self, link, instance, action, reverse, pk_set):
+        with self._lock:
+            group = GROUP_BY_LINK[link]
+            if action == 'post_clear':
+                if reverse:
+                    self.clear_facet(group, instance.pk)
+                else:
+                    self.clear_location(group, instance.pk)
+            elif reverse:
+                self.link(group, pk_set, [instance.pk], add=action == 'post_add')
+            else:
+                self.link(group, [instance.pk], pk_set, add=action == 'post_add')
+            self._expect(Location)
+
+    def pairs_changed(self, group, added, removed):
+        """Apply a batch of (location id, facet id) links added and removed in one write."""
+        with self._lock:
+            if self.versions is not None:
+                bitmaps = self.bitmaps[group]
+                for location_id, facet_id in added:
+                    bitmaps[facet_id] = bitmaps.get(facet_id, 0) | 1 << location_id
+                for location_id, facet_id in removed:
+                    bitmaps[facet_id] = bitmaps.get(facet_id, 0) & ~(1 << location_id)
+            self._expect(Location)
+
+
+facet_index = FacetIndex()
+
+
+@receiver(version_changed)
+def track_version(sender, previous, version, **kwargs):
+    facet_index.version_bumped(sender, previous, version)
+
+
+@receiver(location_levels_changed)
+def track_levels(sender, changes, **kwargs):
+    facet_index.levels_changed(changes)
+
+
+# The receivers below must run before the version bump for the same write;
+# locations.signals connects them ahead of its bump handlers.
+
+def track_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        facet_index.links_changed(sender, instance, action, reverse, pk_set or ())
+
+
+def track_location_save(sender, instance, created, **kwargs):
+    facet_index.location_saved(instance.pk, created)
+
+
+def track_location_delete(sender, instance, **kwargs):
+    facet_index.location_deleted(instance.pk)
+
+
+def track_facet_save(sender, instance, **kwargs):
+    facet_index.facet_saved(sender, instance.pk, instance.name)
+
+
+def track_facet_delete(sender, instance, **kwargs):
+    facet_index.facet_deleted(sender, instance.pk)
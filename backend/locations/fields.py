@@ -0,0 +1,58 @@
+from django.db import models
+from django.utils.functional import cached_property
+
+
+class LazyCloudinaryField(models.Field):
+    """``cloudinary.models.CloudinaryField`` that imports the Cloudinary SDK on first use.
+
+    The SDK pulls in requests and urllib3, while most processes never read or
+    write an image; empty values are handled without it. Deconstructs as the
+    real field, so migrations are unaffected.
+    """
+    description = 'A resource stored in Cloudinary'
+
+    def __init__(self, *args, **kwargs):
+        self._init_args = (args, dict(kwargs))
+        kwargs['max_length'] = 255
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def _field(self):
+        from cloudinary.models import CloudinaryField
+
+        args, kwargs = self._init_args
+        field = CloudinaryField(*args, **kwargs)
+        field.set_attributes_from_name(self.name)
+        field.model = self.model
+        return field
+
+    def deconstruct(self):
+        name, _, args, kwargs = super().deconstruct()
+        return name, 'cloudinary.models.CloudinaryField', args, kwargs
+
+    def get_internal_type(self):
+        return 'CharField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return self._field.from_db_value(value, expression, connection)
+
+    def to_python(self, value):
+        if value is None or value is False:
+            return value
+        return self._field.to_python(value)
+
+    def pre_save(self, model_instance, add):
+        return self._field.pre_save(model_instance, add)
+
+    def get_prep_value(self, value):
+        if not value:
+            return self.get_default()
+        return self._field.get_prep_value(value)
+
+    def value_to_string(self, obj):
+        return self.get_prep_value(self.value_from_object(obj))
+
+    def formfield(self, **kwargs):
+        return self._field.formfield(**kwargs)
@@ -0,0 +1,127 @@
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from .facets import FACET_GROUPS, MATCH_ALL, MATCH_ANY, bitmap_to_ids, facet_index
+from .models import Location
+from .search import search_queryset
+from .spatial import covering_prefixes, haversine_expression, radius_bboxes
+
+DEFAULT_RADIUS_M = 1000
+MAX_FACET_IN_IDS = 5000
+MAX_RADIUS_M = 50000
+
+
+def parse_floats(raw, count, param):
+    try:
+        values = [float(part) for part in raw.split(',')]
+    except ValueError:
+        raise ValidationError({param: 'Expected comma-separated numbers.'})
+    if len(values) != count:
+        raise ValidationError({param: f'Expected {count} comma-separated numbers.'})
+    return values
+
+
+def parse_bbox(raw):
+    """(south, west, north, east) from ``west,south,east,north``.
+
+    Boxes crossing the antimeridian (west > east) are rejected; clients
+    split them into one box on each side.
+    """
+    west, south, east, north = parse_floats(raw, 4, 'bbox')
+    if -180 <= east < west <= 180 and -90 <= south <= north <= 90:
+        raise ValidationError({'bbox': 'Boxes crossing the antimeridian are not supported; split them in two.'})
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValidationError({'bbox': 'Expected west,south,east,north within range.'})
+    return south, west, north, east
+
+
+def area_filter(south, west, north, east):
+    prefix_filter = Q()
+    for prefix in covering_prefixes(south, west, north, east):
+        prefix_filter |= Q(geohash__startswith=prefix)
+    return prefix_filter & Q(
+        latitude__gte=south, latitude__lte=north,
+        longitude__gte=west, longitude__lte=east,
+    )
+
+
+def filter_by_area(queryset, *boxes):
+    """Locations inside any of the (south, west, north, east) boxes."""
+    area = Q()
+    for box in boxes:
+        area |= area_filter(*box)
+    return queryset.filter(area)
+
+
+def facet_selection(params):
+    match = params.get('match', MATCH_ANY)
+    if match not in (MATCH_ANY, MATCH_ALL):
+        raise ValidationError({'match': f'Expected "{MATCH_ANY}" or "{MATCH_ALL}".'})
+    return {group: params.getlist(group) for group in FACET_GROUPS}, match
+
+
+def filter_facets(queryset, params):
+    selection, match = facet_selection(params)
+    if not any(selection.values()):
+        return queryset
+    selected, everything = facet_index.current().matching(selection, match)
+    count = selected.bit_count()
+    if count <= MAX_FACET_IN_IDS:
+        return queryset.filter(pk__in=bitmap_to_ids(selected))
+    if everything.bit_count() - count <= MAX_FACET_IN_IDS:
+        return queryset.exclude(pk__in=bitmap_to_ids(everything & ~selected))
+    # Neither side of the selection fits in an IN list; let the database join instead.
+    for group, names in selection.items():
+        if not names:
+            continue
+        if match == MATCH_ALL:
+            for name in set(names):
+                queryset = queryset.filter(pk__in=Location.objects.filter(**{f'{group}__name': name}).values('pk'))
+        else:
+            queryset = queryset.filter(pk__in=Location.objects.filter(**{f'{group}__name__in': names}).values('pk'))
+    return queryset
+
+
+def filter_spatial(queryset, params):
+    near = params.get('near')
+    if near is not None:
+        lat, lng = parse_floats(near, 2, 'near')
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValidationError({'near': 'Coordinates out of range.'})
+        try:
+            radius_m = float(params.get('radius_m', DEFAULT_RADIUS_M))
+        except ValueError:
+            raise ValidationError({'radius_m': 'Expected a number.'})
+        if not 0 < radius_m <= MAX_RADIUS_M:
+            raise ValidationError({'radius_m': f'Must be between 0 and {MAX_RADIUS_M}.'})
+        queryset = filter_by_area(queryset, *radius_bboxes(lat, lng, radius_m))
+        return queryset.annotate(
+            distance_m=haversine_expression(lat, lng)
+        ).filter(distance_m__lte=radius_m).order_by('distance_m', 'id')
+
+    bbox = params.get('bbox')
+    if bbox is not None:
+        south, west, north, east = parse_bbox(bbox)
+        queryset = filter_by_area(queryset, (south, west, north, east))
+        center_lat = (south + north) / 2
+        center_lng = (west + east) / 2
+        return queryset.annotate(
+            distance_m=haversine_expression(center_lat, center_lng)
+        ).order_by('distance_m', 'id')
+
+    return queryset
+
+
+def filter_locations(queryset, params):
+    """Apply the facet, search, rating and spatial filters of the location list."""
+    queryset = filter_facets(queryset, params)
+
+    query = params.get('q', '')
+    if query.strip():
+        queryset = search_queryset(queryset, query)
+
+    min_rating = params.get('min_rating')
+    if min_rating is not None:
+        queryset = queryset.filter(rating__gte=min_rating)
+
+    return filter_spatial(queryset, params)
@@ -0,0 +1,219 @@
+import logging
+import os
+import queue
+import secrets
+import shutil
+import threading
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+
+from .jobs import enqueue
+from .models import Location
+
+# Pillow makes the thumbnails of the local storage; it is imported on first use to keep startup lean.
+PILLOW_INSTALLED = find_spec('PIL') is not None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTHS = (160, 320, 640)
+ORIGINAL = 'original'
+# Accepted formats, as Pillow decoded them, and the extension the original is stored with.
+IMAGE_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+STATUS_PENDING = 'pending'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+IMAGE_JOB = 'locations.process_image'
+
+
+def size_key(width):
+    return f'{width}w'
+
+
+class CloudinaryImageStorage:
+    """Uploads the original; thumbnails are Cloudinary URL transformations of it."""
+
+    def store(self, location_id, path):
+        import cloudinary
+        import cloudinary.uploader
+
+        result = cloudinary.uploader.upload(path, folder='locations')
+        public_id = result['public_id']
+        thumbnails = {ORIGINAL: result['secure_url']}
+        for width in THUMBNAIL_WIDTHS:
+            thumbnails[size_key(width)] = cloudinary.CloudinaryImage(public_id).build_url(
+                width=width, crop='limit', quality='auto', fetch_format='auto', secure=True,
+            )
+        return public_id, thumbnails
+
+
+class LocalImageStorage:
+    """Writes the original and resized copies under MEDIA_ROOT; a stand-in for Cloudinary."""
+
+    def store(self, location_id, path):
+        if not PILLOW_INSTALLED:
+            # Falling back to the original for every size would make list views fetch full images.
+            raise ImproperlyConfigured('The local image storage needs Pillow to make thumbnails.')
+        from PIL import Image, ImageOps
+
+        directory = os.path.join('locations', str(location_id))
+        token = secrets.token_hex(8)
+        with Image.open(path) as image:
+            if image.format not in IMAGE_EXTENSIONS:
+                raise ValueError(f'Unsupported image format {image.format}.')
+            # Decodes the whole file, so a broken one fails before anything is written.
+            original = os.path.join(directory, f'{token}{IMAGE_EXTENSIONS[image.format]}')
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            os.makedirs(os.path.join(settings.MEDIA_ROOT, directory), exist_ok=True)
+            shutil.copyfile(path, os.path.join(settings.MEDIA_ROOT, original))
+            thumbnails = {ORIGINAL: self.url(original)}
+            for width in THUMBNAIL_WIDTHS:
+                name = os.path.join(directory, f'{token}-{width}.jpg')
+                resized = image.copy()
+                # Limits the width only; thumbnail() never upscales.
+                resized.thumbnail((width, image.height))
+                resized.save(os.path.join(settings.MEDIA_ROOT, name), 'JPEG', quality=82, optimize=True)
+                thumbnails[size_key(width)] = self.url(name)
+        return None, thumbnails
+
+    def url(self, name):
+        return settings.MEDIA_URL + name.replace(os.sep, '/')
+
+
+IMAGE_STORAGES = {
+    'cloudinary': CloudinaryImageStorage,
+    'local': LocalImageStorage,
+}
+
+
+def get_storage():
+    return IMAGE_STORAGES[settings.IMAGE_STORAGE]()
+
+
+def check_image_storage(app_configs, **kwargs):
+    if settings.IMAGE_STORAGE == 'local' and not PILLOW_INSTALLED:
+        return [checks.Error(
+            "IMAGE_STORAGE = 'local' needs Pillow to make thumbnails.",
+            hint='Install it with pip install -r requirements.txt.',
+            id='locations.E001',
+        )]
+    return []
+
+
+def image_format(upload):
+    """The format Pillow reads from the upload's content if it is in ``IMAGE_EXTENSIONS``, else None."""
+    from PIL import Image
+
+    try:
+        with Image.open(upload) as image:
+            image.verify()
+            found = image.format
+    except Exception:
+        # Broken input raises anything from OSError to SyntaxError.
+        return None
+    finally:
+        upload.seek(0)
+    return found if found in IMAGE_EXTENSIONS else None
+
+
+def stage_upload(upload):
+    """Copy an uploaded file to the staging directory so the worker can read it after the request."""
+    os.makedirs(settings.IMAGE_STAGING_DIR, exist_ok=True)
+    extension = os.path.splitext(upload.name)[1].lower()[:10]
+    path = os.path.join(settings.IMAGE_STAGING_DIR, f'{secrets.token_hex(16)}{extension}')
+    with open(path, 'wb') as staged:
+        for chunk in upload.chunks():
+            staged.write(chunk)
+    return path
+
+
+def store_image(location_id, path):
+    """Store a staged image and its thumbnails, then attach them to the location."""
+    location = Location.objects.filter(pk=location_id).first()
+    if location is None:
+        return
+    image_url, thumbnails = get_storage().store(location_id, path)
+    location.thumbnails = thumbnails
+    location.image_status = STATUS_READY
+    update_fields = ['thumbnails', 'image_status']
+    if image_url is not None:
+        location.image_url = image_url
+        update_fields.append('image_url')
+    location.save(update_fields=update_fields)
+
+
+def mark_image_failed(location_id):
+    location = Location.objects.filter(pk=location_id).first()
+    if location is not None:
+        location.image_status = STATUS_FAILED
+        location.save(update_fields=['image_status'])
+
+
+def process_image(location_id, path):
+    try:
+        store_image(location_id, path)
+    except Exception:
+        mark_image_failed(location_id)
+        raise
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _work():
+    while True:
+        location_id, path = _queue.get()
+        try:
+            process_image(location_id, path)
+        except Exception:
+            logger.exception('Processing image for location %s failed', location_id)
+        finally:
+            close_old_connections()
+            _queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_work, name='location-images', daemon=True)
+            _worker.start()
+
+
+def enqueue_image(location, upload):
+    """Mark the location pending and hand the upload to the background worker once committed.
+
+    With ``JOBS_ASYNC`` the upload becomes a job for ``run_worker``, which
+    then needs to see ``IMAGE_STAGING_DIR`` too; otherwise a thread in this
+    process handles it.
+    """
+    path = stage_upload(upload)
+    location.image_status = STATUS_PENDING
+    location.save(update_fields=['image_status'])
+    if settings.JOBS_ASYNC:
+        enqueue(IMAGE_JOB, location_id=location.pk, path=path)
+        return
+
+    def submit():
+        if settings.IMAGE_WORKER_ASYNC:
+            _ensure_worker()
+            _queue.put((location.pk, path))
+        else:
+            process_image(location.pk, path)
+
+    transaction.on_commit(submit)
+
+
+def wait_for_images():
+    """Block until every queued image has been processed."""
+    _queue.join()
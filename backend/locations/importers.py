@@ -0,0 +1,173 @@
+import csv
+import json
+
+GEOJSON_CHUNK_SIZE = 1 << 16
+LIST_SEPARATOR = ';'
+
+_decoder = json.JSONDecoder()
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+class _StreamReader:
+    """Pulls JSON values out of a text stream without loading it whole."""
+
+    def __init__(self, fp, chunk_size=GEOJSON_CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self):
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n\x1e':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._read_more():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f'Malformed GeoJSON: expected {char!r} near offset {self.pos}.')
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._read_more():
+                    raise
+                continue
+            # A number that ends exactly at the buffer edge may have been cut in half.
+            if end == len(self.buf) and self._read_more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_geojson_features(fp, chunk_size=GEOJSON_CHUNK_SIZE):
+    """Yield features from a FeatureCollection, a single Feature or a GeoJSON text sequence.
+
+    The ``features`` array is decoded one element at a time, so memory use
+    does not depend on the size of the file.
+    """
+    reader = _StreamReader(fp, chunk_size)
+    while reader.peek():
+        reader.expect('{')
+        members = {}
+        streamed = False
+        while True:
+            char = reader.peek()
+            if char == '}':
+                reader.pos += 1
+                break
+            if char == ',':
+                reader.pos += 1
+                continue
+            if char == '':
+                raise ValueError('Malformed GeoJSON: unexpected end of file.')
+            key = reader.value()
+            reader.expect(':')
+            if key == 'features' and reader.peek() == '[':
+                reader.pos += 1
+                streamed = True
+                while True:
+                    char = reader.peek()
+                    if char == ']':
+                        reader.pos += 1
+                        break
+                    if char == ',':
+                        reader.pos += 1
+                        continue
+                    if char == '':
+                        raise ValueError('Malformed GeoJSON: unexpected end of file.')
+                    yield reader.value()
+            else:
+                members[key] = reader.value()
+        if not streamed and members.get('type') == 'Feature':
+            yield members
+
+
+def _names(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+    return [name.strip() for name in value if name and str(name).strip()]
+
+
+def _coordinate(value, low, high, field):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ImportRowError(f'invalid {field} {value!r}')
+    if not low <= number <= high:
+        raise ImportRowError(f'{field} {number} out of range')
+    return number
+
+
+def normalize_row(name, latitude, longitude, description='', address='', categories=None, features=None):
+    name = (name or '').strip()
+    if not name:
+        raise ImportRowError('missing name')
+    return {
+        'name': name[:200],
+        'description': description or '',
+        'address': (address or '')[:255],
+        'latitude': _coordinate(latitude, -90, 90, 'latitude'),
+        'longitude': _coordinate(longitude, -180, 180, 'longitude'),
+        'categories': _names(categories),
+        'accessibility_features': _names(features),
+    }
+
+
+def iter_csv_rows(fp):
+    """CSV with name,latitude,longitude[,description,address,categories,accessibility_features].
+
+    Multiple categories/features in one cell are separated by ``;``.
+    """
+    for line_number, row in enumerate(csv.DictReader(fp), start=2):
+        try:
+            yield line_number, normalize_row(
+                row.get('name'), row.get('latitude'), row.get('longitude'),
+                description=row.get('description'), address=row.get('address'),
+                categories=row.get('categories'), features=row.get('accessibility_features'),
+            )
+        except ImportRowError as exc:
+            yield line_number, exc
+
+
+def iter_geojson_rows(fp):
+    for index, feature in enumerate(iter_geojson_features(fp), start=1):
+        try:
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') != 'Point':
+                raise ImportRowError('geometry is not a Point')
+            coordinates = geometry.get('coordinates') or []
+            if len(coordinates) < 2:
+                raise ImportRowError('missing coordinates')
+            properties = feature.get('properties') or {}
+            yield index, normalize_row(
+                properties.get('name'), coordinates[1], coordinates[0],
+                description=properties.get('description'), address=properties.get('address'),
+                categories=properties.get('categories'), features=properties.get('accessibility_features'),
+            )
+        except ImportRowError as exc:
+            yield index, exc
@@ -0,0 +1,286 @@
+"""Database-backed background jobs, run by ``manage.py run_worker``.
+
+Handlers register under a name with ``@job`` and are called with the job's
+payload as keyword arguments. ``enqueue`` writes a ``Job`` row in the
+caller's transaction, so work queued by a rolled back request never runs.
+With ``JOBS_ASYNC`` off (the default) it calls the handler straight away
+instead, which keeps a single-process setup working without a worker.
+
+Queued jobs with the same name and key are deduplicated. Handlers marked
+``coalesce`` take list-valued payloads: duplicates are merged into the
+queued row, and the worker runs up to ``JOB_BATCH_SIZE`` ready jobs of that
+name as one call with the lists concatenated. Failed jobs are retried with
+exponential backoff up to their ``max_attempts``.
+"""
+import logging
+import os
+import random
+import secrets
+import signal
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Job
+from .profiling import metrics
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class JobType:
+    def __init__(self, name, handler, coalesce=False, max_attempts=None, on_failure=None):
+        self.name = name
+        self.handler = handler
+        self.coalesce = coalesce
+        self.max_attempts = max_attempts
+        # Called with the payload once the last attempt has failed.
+        self.on_failure = on_failure
+
+    @property
+    def attempts_allowed(self):
+        return self.max_attempts or settings.JOB_MAX_ATTEMPTS
+
+
+_registry = {}
+
+
+def job(name, coalesce=False, max_attempts=None, on_failure=None):
+    """Register the decorated function as the handler of ``name`` jobs."""
+    def register(handler):
+        _registry[name] = JobType(name, handler, coalesce, max_attempts, on_failure)
+        return handler
+    return register
+
+
+def merge_payloads(payloads):
+    """Concatenate the list values of each field, dropping repeats."""
+    merged = {}
+    for payload in payloads:
+        for field, values in payload.items():
+            merged.setdefault(field, {}).update(dict.fromkeys(values))
+    return {field: list(values) for field, values in merged.items()}
+
+
+def _timed(job_type, payload):
+    start = time.perf_counter()
+    try:
+        job_type.handler(**payload)
+    except Exception:
+        metrics.record_job(job_type.name, STATUS_FAILED, time.perf_counter() - start)
+        raise
+    duration = time.perf_counter() - start
+    metrics.record_job(job_type.name, STATUS_DONE, duration)
+    return duration
+
+
+def enqueue(name, key='', **payload):
+    """Queue ``name`` with ``payload``; returns the ``Job`` holding it, or None when run inline."""
+    job_type = _registry[name]
+    if not settings.JOBS_ASYNC:
+        _timed(job_type, payload)
+        return None
+
+    key = str(key)
+    while True:
+        if key:
+            with transaction.atomic():
+                queued = Job.objects.select_for_update().filter(name=name, key=key, status=STATUS_QUEUED).first()
+                if queued is not None:
+                    if job_type.coalesce:
+                        merged = merge_payloads([queued.payload, payload])
+                        if merged != queued.payload:
+                            queued.payload = merged
+                            queued.save(update_fields=['payload'])
+                    return queued
+        try:
+            with transaction.atomic():
+                return Job.objects.create(name=name, key=key, payload=payload)
+        except IntegrityError:
+            # Another request queued the same key in between; merge into theirs.
+            continue
+
+
+def backoff(attempts):
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+    # Jitter keeps jobs that failed together from retrying in lockstep.
+    return delay * random.uniform(1, 1.25)
+
+
+def requeue(jobs, **fields):
+    """Put claimed ``jobs`` back in the queue with ``fields`` set; returns how many went back.
+
+    A job whose name and key were queued again while it ran is merged into
+    that queued row instead, since only one of them may be queued at a time.
+    """
+    requeued = 0
+    for claimed in jobs:
+        job_type = _registry.get(claimed.name)
+        mine = Job.objects.filter(pk=claimed.pk, status=STATUS_RUNNING, claimed_by=claimed.claimed_by)
+        while True:
+            try:
+                with transaction.atomic():
+                    queued = None
+                    if claimed.key:
+                        queued = Job.objects.select_for_update().filter(
+                            name=claimed.name, key=claimed.key, status=STATUS_QUEUED,
+                        ).first()
+                    if queued is None:
+                        requeued += mine.update(status=STATUS_QUEUED, claimed_by='', locked_at=None, **fields)
+                    elif mine.delete()[0]:
+                        if job_type is not None and job_type.coalesce:
+                            merged = merge_payloads([queued.payload, claimed.payload])
+                            if merged != queued.payload:
+                                queued.payload = merged
+                                queued.save(update_fields=['payload'])
+                        requeued += 1
+                break
+            except IntegrityError:
+                # The key was queued again in between; merge into that row.
+                continue
+    return requeued
+
+
+def requeue_stale(now=None):
+    """Return jobs whose worker died mid-run (running past ``JOB_TIMEOUT``) to the queue."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=settings.JOB_TIMEOUT)
+    return requeue(
+        Job.objects.filter(status=STATUS_RUNNING, locked_at__lt=cutoff),
+        run_after=now, last_error='Worker stopped before the job finished.',
+    )
+
+
+def claim(worker_id):
+    """Lock the next ready job, plus same-named ones for a coalescing handler; [] when idle."""
+    now = timezone.now()
+    ready = Job.objects.filter(status=STATUS_QUEUED, run_after__lte=now).order_by('run_after', 'pk')
+    first = ready.values_list('pk', 'name').first()
+    if first is None:
+        return []
+    job_type = _registry.get(first[1])
+    ids = [first[0]]
+    if job_type is not None and job_type.coalesce:
+        ids = list(ready.filter(name=first[1]).values_list('pk', flat=True)[:settings.JOB_BATCH_SIZE])
+    # A conditional UPDATE rather than row locks, so concurrent workers work on SQLite too:
+    # whoever flips a row to running first owns it.
+    Job.objects.filter(pk__in=ids, status=STATUS_QUEUED).update(
+        status=STATUS_RUNNING, claimed_by=worker_id, locked_at=now,
+    )
+    return list(Job.objects.filter(pk__in=ids, status=STATUS_RUNNING, claimed_by=worker_id).order_by('pk'))
+
+
+def run_claimed(jobs):
+    job_type = _registry.get(jobs[0].name)
+    ids = [claimed.pk for claimed in jobs]
+    # Only touch rows still ours; a job requeued as stale may belong to another worker by now.
+    mine = Job.objects.filter(pk__in=ids, status=STATUS_RUNNING, claimed_by=jobs[0].claimed_by)
+    attempts = max(claimed.attempts for claimed in jobs) + 1
+    payload = merge_payloads([claimed.payload for claimed in jobs]) if len(jobs) > 1 else jobs[0].payload
+    try:
+        if job_type is None:
+            raise LookupError(f'No handler is registered for {jobs[0].name!r}.')
+        duration = _timed(job_type, payload)
+    except Exception:
+        logger.warning('Job %s %s failed (attempt %s)', jobs[0].name, ids, attempts, exc_info=True)
+        failure = {'attempts': attempts, 'last_error': traceback.format_exc()}
+        if job_type is not None and attempts < job_type.attempts_allowed:
+            requeue(jobs, run_after=timezone.now() + timedelta(seconds=backoff(attempts)), **failure)
+            return False
+        mine.update(status=STATUS_FAILED, finished_at=timezone.now(), **failure)
+        if job_type is not None and job_type.on_failure is not None:
+            job_type.on_failure(**payload)
+        return False
+
+    mine.update(status=STATUS_DONE, attempts=attempts, finished_at=timezone.now(), duration_ms=duration * 1000)
+    logger.info('Job %s %s done in %.1f ms', jobs[0].name, ids, duration * 1000)
+    return True
+
+
+def run_pending(worker_id=None, limit=None):
+    """Run ready jobs in this thread until none are left (or ``limit`` runs); returns the number of runs."""
+    worker_id = worker_id or new_worker_id()
+    runs = 0
+    requeue_stale()
+    while limit is None or runs < limit:
+        jobs = claim(worker_id)
+        if not jobs:
+            break
+        run_claimed(jobs)
+        runs += 1
+    return runs
+
+
+def prune_jobs():
+    """Delete finished and failed jobs older than ``JOB_RETENTION_HOURS``."""
+    cutoff = timezone.now() - timedelta(hours=settings.JOB_RETENTION_HOURS)
+    return Job.objects.filter(status__in=[STATUS_DONE, STATUS_FAILED], finished_at__lt=cutoff).delete()[0]
+
+
+def new_worker_id():
+    return f'{os.getpid()}-{threading.get_ident()}-{secrets.token_hex(4)}'
+
+
+class Worker:
+    """Polls for jobs on ``threads`` threads until stopped, or until idle with ``burst``."""
+
+    def __init__(self, threads=1, poll_interval=None, burst=False):
+        self.threads = threads
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.burst = burst
+        self.stopping = threading.Event()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def loop(self):
+        worker_id = new_worker_id()
+        next_maintenance = 0
+        try:
+            while not self.stopping.is_set():
+                try:
+                    if time.monotonic() >= next_maintenance:
+                        requeue_stale()
+                        prune_jobs()
+                        next_maintenance = time.monotonic() + settings.JOB_TIMEOUT
+                    jobs = claim(worker_id)
+                    if jobs:
+                        run_claimed(jobs)
+                        continue
+                except Exception:
+                    logger.exception('Job worker %s hit an error', worker_id)
+                finally:
+                    close_old_connections()
+                if self.burst:
+                    break
+                self.stopping.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+    def run(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        if self.threads == 1:
+            self.loop()
+            return
+        threads = [
+            threading.Thread(target=self.loop, name=f'job-worker-{index}', daemon=True)
+            for index in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # join() with a timeout, so signals still reach the main thread.
+            while thread.is_alive():
+                thread.join(0.5)
+
@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.dispatch import Signal
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache import bump_version
+from .models import ACCESSIBILITY_LEVEL_COLORS, AccessibilityLevel, Location
+
+LEVEL_THRESHOLDS = (
+    (15, 'fully_accessible'),
+    (10, 'mostly_accessible'),
+    (5, 'partially_accessible'),
+    (0, 'limited_accessibility'),
+)
+
+FeatureLink = Location.accessibility_features.through
+CategoryLink = Location.categories.through
+LevelLink = Location.accessibility_levels.through
+
+BATCH_SIZE = 500
+
+# Level links are written straight to the through table, so m2m_changed never
+# fires for them; this carries ``changes`` as (location_id, old_level_id, new_level_id).
+location_levels_changed = Signal()
+
+_level_ids = {}
+
+
+def level_for_score(score):
+    for threshold, name in LEVEL_THRESHOLDS:
+        if score >= threshold:
+            return name
+    return LEVEL_THRESHOLDS[-1][1]
+
+
+def get_level_ids():
+    """Map level name -> AccessibilityLevel id, creating/recolouring rows once per process."""
+    if not _level_ids:
+        levels = {level.name: level for level in AccessibilityLevel.objects.filter(name__in=ACCESSIBILITY_LEVEL_COLORS)}
+        level_ids = {}
+        for name, color in ACCESSIBILITY_LEVEL_COLORS.items():
+            level = levels.get(name)
+            if level is None:
+                level = AccessibilityLevel.objects.create(name=name, color=color)
+            elif level.color != color:
+                level.color = color
+                level.save(update_fields=['color'])
+            level_ids[name] = level.id
+        # Saving a level resets the cache, so only publish once every row is in place.
+        _level_ids.update(level_ids)
+    return _level_ids
+
+
+def clear_level_cache():
+    _level_ids.clear()
+
+
+def _link_count(link_model):
+    links = link_model.objects.filter(location_id=OuterRef('pk')).order_by().values('location_id')
+    return Coalesce(Subquery(links.annotate(total=Count('pk')).values('total'), output_field=IntegerField()), 0)
+
+
+def bulk_recompute_levels(queryset):
+    """Recompute the accessibility level of every location in ``queryset``.
+
+    Costs one SELECT plus one DELETE/INSERT per batch of changed locations,
+    independent of how many features or categories each location has.
+    """
+    level_ids = get_level_ids()
+    rows = Location.objects.filter(pk__in=queryset.values('pk')).order_by().annotate(
+        features_score=_link_count(FeatureLink),
+        categories_score=_link_count(CategoryLink),
+        current_level=Subquery(
+            LevelLink.objects.filter(location_id=OuterRef('pk')).values('accessibilitylevel_id')[:1]
+        ),
+    ).values_list('pk', 'features_score', 'categories_score', 'current_level')
+
+    changed = []
+    for pk, features_score, categories_score, current_level in rows:
+        level_id = level_ids[level_for_score(features_score + categories_score)]
+        if level_id != current_level:
+            changed.append((pk, current_level, level_id))
+
+    if not changed:
+        return 0
+    with transaction.atomic():
+        for start in range(0, len(changed), BATCH_SIZE):
+            batch = changed[start:start + BATCH_SIZE]
+            LevelLink.objects.filter(location_id__in=[pk for pk, _, _ in batch]).delete()
+            LevelLink.objects.bulk_create(
+                [LevelLink(location_id=pk, accessibilitylevel_id=level_id) for pk, _, level_id in batch]
+            )
+        location_levels_changed.send(sender=Location, changes=changed)
+        bump_version(Location)
+    return len(changed)
+
+
+def recompute_levels(location_ids):
+    location_ids = [pk for pk in location_ids if pk is not None]
+    if location_ids:
+        bulk_recompute_levels(Location.objects.filter(pk__in=location_ids))
@@ -0,0 +1,149 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from locations.cache import LOCATION_COORDINATES, bump_version
+from locations.importers import iter_csv_rows, iter_geojson_rows
+from locations.levels import CategoryLink, FeatureLink, LevelLink, get_level_ids, level_for_score
+from locations.models import AccessibilityFeature, Category, Location
+from locations.search import reindex_locations
+from locations.spatial import encode_geohash
+
+MAX_REPORTED_ERRORS = 20
+LINK_INSERT_CHUNK = 500
+
+
+def insert_links(model, columns, rows):
+    """Multi-row INSERT into an auto-created through table, skipping model instantiation."""
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES '.format(quote(model._meta.db_table), ', '.join(quote(c) for c in columns))
+    placeholder = '({})'.format(', '.join(['%s'] * len(columns)))
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), LINK_INSERT_CHUNK):
+            chunk = rows[start:start + LINK_INSERT_CHUNK]
+            cursor.execute(sql + ', '.join([placeholder] * len(chunk)), [value for row in chunk for value in row])
+
+
+class Command(BaseCommand):
+    help = 'Bulk import locations from a CSV or GeoJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['auto', 'csv', 'geojson'], default='auto')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help='Parse and validate without writing.')
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Create categories/features that do not exist yet instead of ignoring them.',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist.')
+        file_format = options['format']
+        if file_format == 'auto':
+            file_format = 'csv' if path.suffix.lower() == '.csv' else 'geojson'
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        self.dry_run = options['dry_run']
+        self.create_missing = options['create_missing']
+        self.category_ids = dict(Category.objects.values_list('name', 'id'))
+        self.feature_ids = dict(AccessibilityFeature.objects.values_list('name', 'id'))
+        self.level_ids = get_level_ids()
+        self.unknown = {'category': set(), 'feature': set()}
+        self.errors = 0
+        self.imported = 0
+
+        started = time.perf_counter()
+        with path.open(newline='', encoding='utf-8') as fp:
+            rows = iter_csv_rows(fp) if file_format == 'csv' else iter_geojson_rows(fp)
+            batch = []
+            batch_number = 0
+            try:
+                for position, row in rows:
+                    if isinstance(row, Exception):
+                        self.report_error(position, row)
+                        continue
+                    batch.append(row)
+                    if len(batch) >= options['batch_size']:
+                        batch_number += 1
+                        self.flush(batch, batch_number)
+                        batch = []
+            except ValueError as exc:
+                raise CommandError(f'{path}: {exc} ({self.imported} rows imported before the error).')
+            if batch:
+                batch_number += 1
+                self.flush(batch, batch_number)
+
+        elapsed = time.perf_counter() - started
+        for kind, names in self.unknown.items():
+            if names:
+                self.stdout.write(self.style.WARNING(
+                    f'Ignored {len(names)} unknown {kind} name(s): {", ".join(sorted(names)[:10])}'
+                ))
+        verb = 'Validated' if self.dry_run else 'Imported'
+        rate = self.imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {self.imported} locations in {elapsed:.2f}s ({rate:.0f} rows/s), {self.errors} rows skipped.'
+        ))
+
+    def report_error(self, position, error):
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f'Row {position}: {error}')
+        elif self.errors == MAX_REPORTED_ERRORS + 1:
+            self.stderr.write('Further row errors suppressed.')
+
+    def resolve(self, names, ids, model, kind):
+        resolved = []
+        missing = [name for name in names if name not in ids]
+        if missing and self.create_missing and not self.dry_run:
+            for obj in model.objects.bulk_create([model(name=name) for name in dict.fromkeys(missing)]):
+                ids[obj.name] = obj.id
+        for name in names:
+            if name in ids:
+                resolved.append(ids[name])
+            else:
+                self.unknown[kind].add(name)
+        return list(dict.fromkeys(resolved))
+
+    def flush(self, rows, batch_number):
+        started = time.perf_counter()
+        for row in rows:
+            row['categories'] = self.resolve(row['categories'], self.category_ids, Category, 'category')
+            row['accessibility_features'] = self.resolve(
+                row['accessibility_features'], self.feature_ids, AccessibilityFeature, 'feature',
+            )
+
+        if not self.dry_run:
+            with transaction.atomic():
+                locations = Location.objects.bulk_create([
+                    Location(
+                        name=row['name'], description=row['description'], address=row['address'],
+                        latitude=row['latitude'], longitude=row['longitude'],
+                        geohash=encode_geohash(row['latitude'], row['longitude']),
+                    )
+                    for row in rows
+                ])
+                category_links, feature_links, level_links = [], [], []
+                for location, row in zip(locations, rows):
+                    category_links.extend((location.id, pk) for pk in row['categories'])
+                    feature_links.extend((location.id, pk) for pk in row['accessibility_features'])
+                    score = len(row['categories']) + len(row['accessibility_features'])
+                    level_links.append((location.id, self.level_ids[level_for_score(score)]))
+                insert_links(CategoryLink, ('location_id', 'category_id'), category_links)
+                insert_links(FeatureLink, ('location_id', 'accessibilityfeature_id'), feature_links)
+                insert_links(LevelLink, ('location_id', 'accessibilitylevel_id'), level_links)
+                reindex_locations([location.id for location in locations])
+                bump_version(Location, Category, AccessibilityFeature, LOCATION_COORDINATES)
+
+        self.imported += len(rows)
+        elapsed = time.perf_counter() - started
+        rate = len(rows) / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Batch {batch_number}: {len(rows)} rows ({self.imported} total) in {elapsed:.2f}s, {rate:.0f} rows/s'
+        )
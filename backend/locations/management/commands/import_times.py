@@ -0,0 +1,98 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# "import time: <self us> | <cumulative us> | <indent><module>", as written by python -X importtime.
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+# Runs in a fresh interpreter, so nothing is imported yet; loads the URLconf as the first request would.
+STARTUP = '''
+import json, resource, django
+django.setup()
+from django.apps import apps
+from django.conf import settings
+from importlib import import_module
+import_module(settings.ROOT_URLCONF)
+print(json.dumps({
+    'apps': [config.name for config in apps.get_app_configs()],
+    'urlconf': settings.ROOT_URLCONF,
+    # Kilobytes on Linux.
+    'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+'''
+
+
+def parse_import_tree(lines):
+    """(module, self microseconds, children) roots from ``-X importtime`` output."""
+    pending = {}
+    for line in lines:
+        match = IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        self_us, _, indent, module = match.groups()
+        depth = len(indent) // 2
+        # Children are reported before their parent, one level deeper.
+        node = (module, int(self_us), pending.pop(depth + 1, []))
+        pending.setdefault(depth, []).append(node)
+    return [node for depth in sorted(pending) for node in pending[depth]]
+
+
+def owner_of(module, owners):
+    matches = [owner for owner in owners if module == owner or module.startswith(owner + '.')]
+    return max(matches, key=len) if matches else None
+
+
+def attribute(roots, owners, fallback):
+    """Self time per owner; modules outside every owner count towards whoever imported them."""
+    totals = {}
+    stack = [(node, fallback) for node in roots]
+    while stack:
+        (module, self_us, children), inherited = stack.pop()
+        owner = owner_of(module, owners) or inherited
+        totals[owner] = totals.get(owner, 0) + self_us
+        stack.extend((child, owner) for child in children)
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the cold start of a settings module in a fresh interpreter: django.setup() '
+        'plus the URLconf, with import time attributed to each installed app.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'byteme.settings'),
+            help='Settings module to measure, e.g. byteme.settings_api.',
+        )
+        parser.add_argument('--limit', type=int, default=20, help='Rows to show.')
+        parser.add_argument('--repeat', type=int, default=3, help='Fresh starts to measure; the fastest is shown.')
+
+    def handle(self, *args, profile, limit, repeat, **options):
+        # Import times are noisy; keep the fastest of a few fresh starts.
+        runs = [self.measure(profile) for _ in range(max(repeat, 1))]
+        started, totals = min(runs, key=lambda run: sum(run[1].values()))
+        total = sum(totals.values())
+
+        self.stdout.write(
+            f'{profile}: {total / 1000:.0f} ms of imports, peak RSS {started["max_rss"] / 1024:.1f} MB'
+        )
+        self.stdout.write(f'{"app":<32} {"ms":>8} {"share":>6}')
+        for owner, micros in sorted(totals.items(), key=lambda item: -item[1])[:limit]:
+            self.stdout.write(f'{owner:<32} {micros / 1000:>8.1f} {micros / total:>6.1%}')
+
+    def measure(self, profile):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP],
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': profile},
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'Starting with {profile} failed:\n{result.stderr[-2000:]}')
+        started = json.loads(result.stdout.splitlines()[-1])
+        owners = started['apps'] + [started['urlconf'].rsplit('.', 1)[0], 'django']
+        return started, attribute(parse_import_tree(result.stderr.splitlines()), owners, 'python')
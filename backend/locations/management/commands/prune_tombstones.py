@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from locations.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete sync tombstones older than SYNC_TOMBSTONE_DAYS.'
+
+    def handle(self, *args, **options):
+        pruned = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {pruned} tombstones older than {settings.SYNC_TOMBSTONE_DAYS} days.'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from locations.ratings import rebuild_ratings
+from locations.review_stats import rebuild_review_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute Location.rating_sum/rating_count/rating and the review stats from the reviews table.'
+
+    def handle(self, *args, **options):
+        updated = rebuild_ratings()
+        with_reviews = rebuild_review_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt ratings for {updated} locations and review stats for {with_reviews} reviewed locations.'
+        ))
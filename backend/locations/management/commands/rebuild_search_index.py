@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from locations.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for every location.'
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} locations.'))
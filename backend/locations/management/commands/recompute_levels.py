@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from locations.levels import bulk_recompute_levels
+from locations.models import Location
+
+
+class Command(BaseCommand):
+    help = 'Recompute the accessibility level of every location.'
+
+    def handle(self, *args, **options):
+        changed = bulk_recompute_levels(Location.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Updated the level of {changed} locations.'))
@@ -0,0 +1,49 @@
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def run_worker_process(threads, poll_interval, burst):
+    # Spawned children import this module before Django is set up, so nothing
+    # touching models can be imported at module level.
+    import django
+
+    django.setup()
+    from locations.jobs import Worker
+
+    Worker(threads, poll_interval, burst).run()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (see JOBS_ASYNC) until stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=1, help='Worker threads per process.')
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes, this one included.')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL)
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is ready to run.')
+
+    def handle(self, *args, threads, processes, poll_interval, burst, **options):
+        from locations.jobs import Worker
+
+        threads, processes = max(threads, 1), max(processes, 1)
+        self.stdout.write(f'Running jobs on {processes} process(es) x {threads} thread(s).')
+        # Spawned children set Django up from scratch instead of sharing this process's connections.
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        children = [
+            context.Process(target=run_worker_process, args=(threads, poll_interval, burst), daemon=True)
+            for _ in range(processes - 1)
+        ]
+        for child in children:
+            child.start()
+        try:
+            Worker(threads, poll_interval, burst).run()
+        finally:
+            for child in children:
+                if not burst:
+                    child.terminate()
+                child.join()
+        self.stdout.write(self.style.SUCCESS('Worker stopped.'))
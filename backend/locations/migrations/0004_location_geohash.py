@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 18:48
+
+from django.db import migrations, models
+
+from locations.spatial import encode_geohash
+
+
+def fill_geohash(apps, schema_editor):
+    Location = apps.get_model('locations', 'Location')
+    batch = []
+    for location in Location.objects.only('id', 'latitude', 'longitude').iterator(chunk_size=2000):
+        location.geohash = encode_geohash(location.latitude, location.longitude)
+        batch.append(location)
+        if len(batch) >= 2000:
+            Location.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        Location.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0003_alter_accessibilitylevel_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
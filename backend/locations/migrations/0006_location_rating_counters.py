@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-17 18:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_counters(apps, schema_editor):
+    Location = apps.get_model('locations', 'Location')
+    Review = apps.get_model('locations', 'Review')
+    reviews = Review.objects.filter(location=OuterRef('pk')).order_by().values('location')
+    Location.objects.update(
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+        rating_count=Coalesce(Subquery(reviews.annotate(total=Count('id')).values('total')), 0),
+    )
+    Location.objects.filter(rating_count=0).update(rating=0)
+    for location in Location.objects.filter(rating_count__gt=0).only('rating_sum', 'rating_count').iterator():
+        location.rating = round(location.rating_sum / location.rating_count, 1)
+        location.save(update_fields=['rating'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0005_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='rating',
+            field=models.DecimalField(db_index=True, decimal_places=1, default=0, max_digits=3),
+        ),
+        migrations.RunPython(fill_rating_counters, migrations.RunPython.noop),
+    ]
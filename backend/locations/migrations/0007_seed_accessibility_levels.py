@@ -0,0 +1,30 @@
+from django.db import migrations
+
+LEVEL_COLORS = {
+    'fully_accessible': '#00FF00',
+    'mostly_accessible': '#0000FF',
+    'partially_accessible': '#FFA500',
+    'limited_accessibility': '#FF0000',
+}
+
+
+def seed_levels(apps, schema_editor):
+    AccessibilityLevel = apps.get_model('locations', 'AccessibilityLevel')
+    for name, color in LEVEL_COLORS.items():
+        level = AccessibilityLevel.objects.filter(name=name).first()
+        if level is None:
+            AccessibilityLevel.objects.create(name=name, color=color)
+        elif level.color != color:
+            level.color = color
+            level.save(update_fields=['color'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0006_location_rating_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_levels, migrations.RunPython.noop),
+    ]
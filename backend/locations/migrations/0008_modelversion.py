@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 18:55
+
+from django.db import migrations, models
+
+VERSIONED_MODELS = (
+    'locations.location', 'locations.review', 'locations.proposition',
+    'locations.category', 'locations.accessibilityfeature', 'locations.accessibilitylevel',
+)
+
+
+def seed_versions(apps, schema_editor):
+    ModelVersion = apps.get_model('locations', 'ModelVersion')
+    ModelVersion.objects.bulk_create(
+        [ModelVersion(name=name, version=0) for name in VERSIONED_MODELS], ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0007_seed_accessibility_levels'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelVersion',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_versions, migrations.RunPython.noop),
+    ]
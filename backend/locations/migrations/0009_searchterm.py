@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-17 19:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from locations.text import term_weights
+
+
+def build_search_index(apps, schema_editor):
+    Location = apps.get_model('locations', 'Location')
+    Review = apps.get_model('locations', 'Review')
+    Proposition = apps.get_model('locations', 'Proposition')
+    SearchTerm = apps.get_model('locations', 'SearchTerm')
+    for location in Location.objects.iterator(chunk_size=1000):
+        fields = [('name', location.name), ('address', location.address), ('description', location.description)]
+        fields += [('review', text) for text in Review.objects.filter(location=location).values_list('comment', flat=True)]
+        fields += [('proposition', text) for text in Proposition.objects.filter(location=location).values_list('text', flat=True)]
+        SearchTerm.objects.bulk_create([
+            SearchTerm(location=location, term=term, weight=weight)
+            for term, weight in term_weights(fields).items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0008_modelversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=64)),
+                ('weight', models.PositiveIntegerField()),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='locations.location')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('location', 'term'), name='search_term_location_term_uniq')],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0009_searchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='image_status',
+            field=models.CharField(blank=True, editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 19:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0010_location_thumbnails'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['latitude', 'longitude'], name='location_lat_lng_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proposition',
+            index=models.Index(fields=['location', 'created_at', 'id'], name='proposition_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['location', 'created_at', 'id'], name='review_location_idx'),
+        ),
+    ]
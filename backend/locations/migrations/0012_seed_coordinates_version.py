@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def seed_version(apps, schema_editor):
+    ModelVersion = apps.get_model('locations', 'ModelVersion')
+    ModelVersion.objects.bulk_create(
+        [ModelVersion(name='locations.location.coordinates', version=0)], ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0011_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_version, migrations.RunPython.noop),
+    ]
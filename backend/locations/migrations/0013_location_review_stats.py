@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-17 19:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import RowNumber
+
+
+def fill_review_stats(apps, schema_editor):
+    Review = apps.get_model('locations', 'Review')
+    LocationReviewStats = apps.get_model('locations', 'LocationReviewStats')
+    reviews = Review.objects.order_by()
+    latest = {}
+    for location_id, review_id in reviews.annotate(
+        position=Window(RowNumber(), partition_by=F('location_id'), order_by=[F('created_at').desc(), F('id').desc()]),
+    ).filter(position__lte=5).order_by('location_id', 'position').values_list('location_id', 'id'):
+        latest.setdefault(location_id, []).append(review_id)
+    totals = reviews.values('location_id').annotate(
+        total=Count('id'), rating_total=Sum('rating'),
+        **{f'stars_{rating}': Count('id', filter=Q(rating=rating)) for rating in range(1, 6)},
+    )
+    LocationReviewStats.objects.bulk_create([
+        LocationReviewStats(
+            location_id=row['location_id'], count=row['total'], rating_sum=row['rating_total'],
+            latest_review_ids=latest.get(row['location_id'], []),
+            **{f'stars_{rating}': row[f'stars_{rating}'] for rating in range(1, 6)},
+        )
+        for row in totals
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0012_seed_coordinates_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationReviewStats',
+            fields=[
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stats', serialize=False, to='locations.location')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+                ('latest_review_ids', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 20:25
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0015_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+    ]
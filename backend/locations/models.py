@@ -1,6 +1,20 @@
-from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
 from django.conf import settings
-from cloudinary.models import CloudinaryField
+from django.utils import timezone
+from .fields import LazyCloudinaryField
+from .spatial import encode_geohash
+
+class ModelVersion(models.Model):
+    """Per-model change counter shared by every process; bumped from model signals.
+
+    Only equality matters to readers, see ``locations.cache.bump_version``.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}@{self.version}"
 
 class AccessibilityFeature(models.Model):
     name = models.CharField(max_length=100)
@@ -36,52 +50,167 @@ class Location(models.Model):
     latitude = models.FloatField()
     longitude = models.FloatField()
     accessibility_features = models.ManyToManyField(AccessibilityFeature, related_name="locations")
-    image_url = CloudinaryField('image', blank=True, null=True)
+    image_url = LazyCloudinaryField('image', blank=True, null=True)
     categories = models.ManyToManyField(Category, related_name="locations")
     accessibility_levels = models.ManyToManyField(AccessibilityLevel, related_name="locations") 
-    rating = models.DecimalField(max_digits=3, decimal_places=1, default=0)
+    rating = models.DecimalField(max_digits=3, decimal_places=1, default=0, db_index=True)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    geohash = models.CharField(max_length=12, db_index=True, blank=True, editable=False)
+    # Width descriptor ("160w", ...) or "original" -> URL, filled in by the image worker.
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
+    image_status = models.CharField(max_length=10, blank=True, editable=False)
+    # Also bumped when links, level or rating counters change; drives /api/sync/.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Bounding boxes too large for geohash prefixes fall back to these ranges.
+            models.Index(fields=['latitude', 'longitude'], name='location_lat_lng_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
     def calculate_accessibility_level(self):
-        features_score = self.accessibility_features.count()
-        categories_score = self.categories.count()
-        total_score = features_score + categories_score
-        if total_score >= 15:
-            return 'fully_accessible'
-        elif total_score >= 10:
-            return 'mostly_accessible'
-        elif total_score >= 5:
-            return 'partially_accessible'
-        else:
-            return 'limited_accessibility'
+        from .levels import level_for_score
+
+        return level_for_score(self.accessibility_features.count() + self.categories.count())
 
     def save(self, *args, **kwargs):
+        adding = self._state.adding
+        self.geohash = encode_geohash(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'updated_at'}
+            if {'latitude', 'longitude'} & update_fields:
+                update_fields.add('geohash')
+            kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
-        accessibility_level_name = self.calculate_accessibility_level()
-        color = ACCESSIBILITY_LEVEL_COLORS.get(accessibility_level_name, '#FFFFFF')  # Default to white
-        level, created = AccessibilityLevel.objects.get_or_create(
-            name=accessibility_level_name,
-            defaults={'color': color}
-        )
-        if not created and level.color != color:
-            level.color = color
-            level.save()
-        self.accessibility_levels.set([level])
+        if adding:
+            # A new location has no features or categories yet; later M2M
+            # changes recompute the level through the m2m_changed signal.
+            from .levels import get_level_ids, level_for_score
+
+            level_id = get_level_ids()[level_for_score(0)]
+            self.accessibility_levels.through.objects.create(location_id=self.pk, accessibilitylevel_id=level_id)
+
+MIN_RATING = 1
+MAX_RATING = 5
+
 
 class Review(models.Model):
     location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    rating = models.IntegerField()
+    rating = models.IntegerField(validators=[MinValueValidator(MIN_RATING), MaxValueValidator(MAX_RATING)])
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='review_created_id_idx'),
+            models.Index(fields=['location', 'created_at', 'id'], name='review_location_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # post_save updates the location's rating counters; a failure there
+        # must not leave the review saved with the counters behind.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+class LocationReviewStats(models.Model):
+    """Review summary of a location, kept current by ``locations.review_stats``.
+
+    A location without a row has no reviews.
+    """
+    location = models.OneToOneField(Location, on_delete=models.CASCADE, primary_key=True, related_name='review_stats')
+    count = models.PositiveIntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    # Newest first.
+    latest_review_ids = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"Review stats of {self.location_id}"
 
 class Proposition(models.Model):
     location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='propositions')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='proposition_created_id_idx'),
+            models.Index(fields=['location', 'created_at', 'id'], name='proposition_location_idx'),
+        ]
 
     def __str__(self):
         return f"Proposition by {self.user} on {self.location}"
+
+
+class SearchTerm(models.Model):
+    """Inverted index row: ``term`` appears in ``location`` (or its reviews/propositions)."""
+    term = models.CharField(max_length=64, db_index=True)
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['location', 'term'], name='search_term_location_term_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.location_id}"
+
+
+class Tombstone(models.Model):
+    """Deleted location, review or proposition, kept so sync clients can drop it too."""
+    model = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted at {self.deleted_at}"
+
+
+class Job(models.Model):
+    """Background work for ``manage.py run_worker``; see ``locations.jobs``."""
+    name = models.CharField(max_length=100)
+    # Queued jobs sharing a name and a non-empty key are merged into one.
+    key = models.CharField(max_length=200, blank=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_ready_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'key'], condition=models.Q(status='queued') & ~models.Q(key=''),
+                name='job_queued_key_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
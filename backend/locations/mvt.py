@@ -0,0 +1,123 @@
+"""Minimal Mapbox Vector Tile (spec 2.1) encoder for point layers.
+
+Writes the protobuf wire format by hand, so no protobuf runtime or compiled
+schema is needed.
+"""
+import struct
+
+EXTENT = 4096
+VERSION = 2
+POINT = 1
+MOVE_TO = 1
+
+# Field numbers from vector_tile.proto.
+TILE_LAYERS = 3
+LAYER_NAME, LAYER_FEATURES, LAYER_KEYS, LAYER_VALUES, LAYER_EXTENT, LAYER_VERSION = 1, 2, 3, 4, 5, 15
+FEATURE_ID, FEATURE_TAGS, FEATURE_TYPE, FEATURE_GEOMETRY = 1, 2, 3, 4
+VALUE_STRING, VALUE_DOUBLE, VALUE_UINT, VALUE_SINT, VALUE_BOOL = 1, 3, 5, 6, 7
+
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+
+
+def varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+def zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def field_key(number, wire_type):
+    return varint(number << 3 | wire_type)
+
+
+def varint_field(number, value):
+    return field_key(number, VARINT) + varint(value)
+
+
+def bytes_field(number, payload):
+    return field_key(number, LENGTH_DELIMITED) + varint(len(payload)) + payload
+
+
+def packed_field(number, values):
+    payload = bytearray()
+    for value in values:
+        payload += varint(value)
+    return bytes_field(number, payload)
+
+
+def encode_value(value):
+    # bool first: it is an int subclass.
+    if isinstance(value, bool):
+        return varint_field(VALUE_BOOL, int(value))
+    if isinstance(value, int):
+        return varint_field(VALUE_UINT, value) if value >= 0 else varint_field(VALUE_SINT, zigzag(value))
+    if isinstance(value, float):
+        return field_key(VALUE_DOUBLE, FIXED64) + struct.pack('<d', value)
+    return bytes_field(VALUE_STRING, str(value).encode())
+
+
+class PointLayer:
+    """Collects point features; keys and values are shared across the layer's features."""
+
+    def __init__(self, name, extent=EXTENT):
+        self.name = name
+        self.extent = extent
+        self.keys = {}
+        self.values = {}
+        self.features = []
+
+    def __len__(self):
+        return len(self.features)
+
+    def _index(self, table, item):
+        index = table.get(item)
+        if index is None:
+            index = table[item] = len(table)
+        return index
+
+    def add(self, x, y, properties, feature_id=None):
+        """Add a point at tile coordinates (``0..extent``); ``None`` properties are left out."""
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(self._index(self.keys, key))
+            # Keyed by type too, so 1, 1.0 and True stay distinct values.
+            tags.append(self._index(self.values, (type(value), value)))
+        feature = bytearray()
+        if feature_id is not None:
+            feature += varint_field(FEATURE_ID, feature_id)
+        if tags:
+            feature += packed_field(FEATURE_TAGS, tags)
+        feature += varint_field(FEATURE_TYPE, POINT)
+        feature += packed_field(FEATURE_GEOMETRY, (MOVE_TO | 1 << 3, zigzag(x), zigzag(y)))
+        self.features.append(bytes(feature))
+
+    def encode(self):
+        layer = bytearray(varint_field(LAYER_VERSION, VERSION))
+        layer += bytes_field(LAYER_NAME, self.name.encode())
+        for feature in self.features:
+            layer += bytes_field(LAYER_FEATURES, feature)
+        for key in self.keys:
+            layer += bytes_field(LAYER_KEYS, key.encode())
+        for _, value in self.values:
+            layer += bytes_field(LAYER_VALUES, encode_value(value))
+        layer += varint_field(LAYER_EXTENT, self.extent)
+        return bytes(layer)
+
+
+def encode_tile(layers):
+    """A tile holding every non-empty layer; a tile with no features is empty bytes."""
+    tile = bytearray()
+    for layer in layers:
+        if len(layer):
+            tile += bytes_field(TILE_LAYERS, layer.encode())
+    return bytes(tile)
@@ -0,0 +1,219 @@
+import heapq
+import math
+import threading
+from array import array
+
+from django.dispatch import receiver
+
+from .cache import LOCATION_COORDINATES, get_versions, version_changed
+from .models import Location
+from .spatial import EARTH_RADIUS_M
+
+LEAF_SIZE = 16
+# Moved/added points are searched by brute force until there are this many.
+MIN_OVERLAY = 256
+
+
+def unit_vector(latitude, longitude):
+    """Point on the unit sphere; straight-line distance there orders like great-circle distance."""
+    lat = math.radians(latitude)
+    lng = math.radians(longitude)
+    cos_lat = math.cos(lat)
+    return cos_lat * math.cos(lng), cos_lat * math.sin(lng), math.sin(lat)
+
+
+def chord_to_meters(squared_chord):
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(squared_chord) / 2))
+
+
+class KDTree:
+    """Static 3-d tree over (pk, latitude, longitude) points.
+
+    Nodes are tuples: ``(axis, split, left, right)`` or a leaf ``(start, stop)``
+    addressing a run of the point arrays, which are stored in tree order.
+    """
+
+    def __init__(self, points):
+        ids, latitudes, longitudes, coords = array('q'), array('d'), array('d'), ([], [], [])
+        for pk, latitude, longitude in points:
+            ids.append(pk)
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+            for axis, value in enumerate(unit_vector(latitude, longitude)):
+                coords[axis].append(value)
+        order = list(range(len(ids)))
+        self.root = self._build(order, coords, 0, len(order))
+        self.ids = array('q', [ids[i] for i in order])
+        self.latitudes = array('d', [latitudes[i] for i in order])
+        self.longitudes = array('d', [longitudes[i] for i in order])
+        self.coords = tuple(array('d', [axis_values[i] for i in order]) for axis_values in coords)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _build(self, order, coords, start, stop):
+        if stop - start <= LEAF_SIZE:
+            return start, stop
+        part = order[start:stop]
+        axis = max(range(3), key=lambda axis: _spread(coords[axis], part))
+        part.sort(key=coords[axis].__getitem__)
+        order[start:stop] = part
+        middle = (start + stop) // 2
+        return (
+            axis, coords[axis][order[middle]],
+            self._build(order, coords, start, middle), self._build(order, coords, middle, stop),
+        )
+
+    def search(self, point, k, accept, heap):
+        """Push the ``k`` nearest accepted points onto ``heap`` as (-squared chord, position)."""
+        ids, (xs, ys, zs) = self.ids, self.coords
+        x, y, z = point
+
+        def visit(node):
+            if len(node) == 2:
+                for position in range(node[0], node[1]):
+                    if not accept(ids[position]):
+                        continue
+                    distance = (xs[position] - x) ** 2 + (ys[position] - y) ** 2 + (zs[position] - z) ** 2
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-distance, position))
+                    elif distance < -heap[0][0]:
+                        heapq.heapreplace(heap, (-distance, position))
+                return
+            axis, split, left, right = node
+            difference = point[axis] - split
+            visit(left if difference < 0 else right)
+            # The far side can only help if the splitting plane is closer than the worst kept point.
+            if len(heap) < k or difference * difference < -heap[0][0]:
+                visit(right if difference < 0 else left)
+
+        visit(self.root)
+        return heap
+
+
+def _spread(values, part):
+    picked = [values[i] for i in part]
+    return max(picked) - min(picked)
+
+
+class NearestIndex:
+    """KD-tree over every location, kept current by model signals.
+
+    Saves and deletes made in this process are applied in place: the old
+    point is masked out of the tree and the new one goes into a small overlay
+    that is searched by brute force, until the overlay is big enough to fold
+    everything into a fresh tree. As with the facet index, only version bumps
+    it has a matching delta for are accepted; any other change to
+    ``LOCATION_COORDINATES`` triggers a full rebuild from the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.version = None
+        self.tree = KDTree(())
+        self.removed = set()
+        self.overlay = {}
+        self.expected = 0
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def current(self):
+        version = get_versions((LOCATION_COORDINATES,))[0]
+        with self._lock:
+            if version != self.version:
+                self._reset()
+                self.tree = KDTree(Location.objects.values_list('pk', 'latitude', 'longitude').iterator(chunk_size=5000))
+                self.version = version
+        return self
+
+    def _compact(self):
+        tree = self.tree
+        points = [
+            (pk, tree.latitudes[position], tree.longitudes[position])
+            for position, pk in enumerate(tree.ids) if pk not in self.removed
+        ]
+        points.extend((pk, latitude, longitude) for pk, (latitude, longitude) in self.overlay.items())
+        self.tree = KDTree(points)
+        self.removed = set()
+        self.overlay = {}
+
+    def nearest(self, latitude, longitude, k, accept=None):
+        """Up to ``k`` (pk, latitude, longitude, distance_m) tuples, nearest first.
+
+        ``accept(pk)`` can reject locations, e.g. ones missing a required feature.
+        """
+        point = unit_vector(latitude, longitude)
+        with self._lock:
+            tree, removed = self.tree, self.removed
+            if accept is None:
+                tree_accept = lambda pk: pk not in removed
+            else:
+                tree_accept = lambda pk: pk not in removed and accept(pk)
+            found = [
+                (-distance, tree.ids[position], tree.latitudes[position], tree.longitudes[position])
+                for distance, position in tree.search(point, k, tree_accept, [])
+            ]
+            for pk, (lat, lng) in self.overlay.items():
+                if accept is None or accept(pk):
+                    found.append((sum((a - b) ** 2 for a, b in zip(point, unit_vector(lat, lng))), pk, lat, lng))
+        found.sort()
+        return [(pk, lat, lng, chord_to_meters(distance)) for distance, pk, lat, lng in found[:k]]
+
+    # Incremental updates, called from model signals
+
+    def version_bumped(self, previous, version):
+        with self._lock:
+            if self.version is None:
+                return
+            if self.expected > 0 and self.version == previous:
+                self.expected -= 1
+                self.version = version
+            else:
+                self.version = None
+
+    def location_saved(self, location_id, latitude, longitude):
+        with self._lock:
+            if self.version is None:
+                return
+            self.removed.add(location_id)
+            self.overlay[location_id] = (latitude, longitude)
+            if len(self.overlay) > max(MIN_OVERLAY, math.isqrt(len(self.tree))):
+                self._compact()
+            self.expected += 1
+
+    def location_deleted(self, location_id):
+        with self._lock:
+            if self.version is None:
+                return
+            self.removed.add(location_id)
+            self.overlay.pop(location_id, None)
+            self.expected += 1
+
+
+nearest_index = NearestIndex()
+
+
+def coordinates_changed(instance, update_fields=None):
+    return update_fields is None or bool({'latitude', 'longitude'} & set(update_fields))
+
+
+@receiver(version_changed)
+def track_version(sender, previous, version, **kwargs):
+    if sender == LOCATION_COORDINATES:
+        nearest_index.version_bumped(previous, version)
+
+
+# Must run before the LOCATION_COORDINATES bump for the same write; see locations.signals.
+
+def track_location_save(sender, instance, update_fields=None, **kwargs):
+    if coordinates_changed(instance, update_fields):
+        nearest_index.location_saved(instance.pk, instance.latitude, instance.longitude)
+
+
+def track_location_delete(sender, instance, **kwargs):
+    nearest_index.location_deleted(instance.pk)
@@ -0,0 +1,61 @@
+from rest_framework.pagination import CursorPagination
+
+# Annotations the location list can be ordered by instead of id.
+RANKED_ANNOTATIONS = ('search_rank', 'distance_m')
+
+
+def ranked_ordering(queryset):
+    """The queryset's ordering when it leads with a search rank or distance, else None."""
+    ordering = queryset.query.order_by
+    if ordering and ordering[0].lstrip('-') in RANKED_ANNOTATIONS:
+        return tuple(ordering)
+    return None
+
+
+def cap_ranked(queryset, params, limit):
+    """Only the ``limit`` best ranked or nearest matches of a search or radius query.
+
+    A bbox is already bounded by the viewport and is left alone.
+    """
+    if ranked_ordering(queryset) and ('search_rank' in queryset.query.annotations or 'near' in params):
+        return queryset.filter(pk__in=queryset.values('pk')[:limit])
+    return queryset
+
+
+class OptInCursorPagination(CursorPagination):
+    """Keyset pagination that only kicks in when the client asks for a page.
+
+    Plain requests keep returning a bare list so existing clients don't break.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+
+    def page_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.page_requested(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class LocationCursorPagination(OptInCursorPagination):
+    """Pages by id, or by rank for search and distance ordered results."""
+
+    def get_ordering(self, request, queryset, view):
+        return ranked_ordering(queryset) or super().get_ordering(request, queryset, view)
+
+
+class CreatedAtCursorPagination(OptInCursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+class LocationReviewPagination(CursorPagination):
+    """Always paged, newest first; a location can collect any number of reviews."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
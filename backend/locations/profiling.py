@@ -0,0 +1,263 @@
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .cache import cache_stats
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, Prometheus style; +Inf is implied.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_IN_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL with literals and IN lists collapsed, so the same query with other values matches."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    """Per-view request and per-job statistics since the process started."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.durations = {}
+        self.db_durations = {}
+        self.queries = Counter()
+        self.duplicates = Counter()
+        self.profiles = Counter()
+        self.job_durations = {}
+
+    def record(self, labels, duration, db_duration, queries, duplicates, profiled):
+        with self._lock:
+            self.durations.setdefault(labels, Histogram()).observe(duration)
+            self.db_durations.setdefault(labels, Histogram()).observe(db_duration)
+            self.queries[labels] += queries
+            self.duplicates[labels] += duplicates
+            if profiled:
+                self.profiles[labels] += 1
+
+    def record_job(self, name, status, duration):
+        with self._lock:
+            self.job_durations.setdefault((('job', name), ('status', status)), Histogram()).observe(duration)
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            _histogram(lines, 'byteme_request_duration_seconds', 'Wall time per request.', self.durations)
+            _histogram(lines, 'byteme_db_duration_seconds', 'Time spent in SQL per request.', self.db_durations)
+            _counter(lines, 'byteme_db_queries_total', 'SQL queries executed.', self.queries)
+            _counter(
+                lines, 'byteme_db_duplicate_queries_total',
+                'Queries repeating a fingerprint already seen in the same request.', self.duplicates,
+            )
+            _counter(lines, 'byteme_profiles_total', 'Slow requests captured with cProfile.', self.profiles)
+            _histogram(
+                lines, 'byteme_job_duration_seconds', 'Wall time per background job run in this process.',
+                self.job_durations,
+            )
+        stats = cache_stats()
+        _counter(
+            lines, 'byteme_response_cache_total', 'Cached response lookups by result.',
+            {(('result', result),): count for result, count in sorted(stats.items())},
+        )
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _histogram(lines, name, help_text, histograms):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{name}_bucket{_labels(labels + (("le", repr(bound)),))} {count}')
+        lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+        lines.append(f'{name}_sum{_labels(labels)} {histogram.total}')
+        lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+
+
+def _counter(lines, name, help_text, counts):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for labels, count in sorted(counts.items()):
+        lines.append(f'{name}{_labels(labels)} {count}')
+
+
+metrics = Metrics()
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook timing every query; works with DEBUG off."""
+
+    def __init__(self):
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def count(self):
+        return sum(self.fingerprints.values())
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.fingerprints.values())
+
+
+# The request being recorded; sync_to_async copies it into the thread that runs the ORM.
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_recorder():
+    """Hook ``record_query`` into this thread's connections, once per connection."""
+    for connection in connections.all():
+        if record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(record_query)
+
+
+class ProfilingMiddleware:
+    """Opt-in request instrumentation, enabled with ``PROFILING=True``.
+
+    Adds a ``Server-Timing`` header, feeds ``metrics`` (served at
+    ``/api/_metrics/``) and logs query fingerprints repeated at least
+    ``PROFILING_DUPLICATE_THRESHOLD`` times in one request, the usual N+1
+    shape. A ``PROFILING_SAMPLE_RATE`` share of requests runs under cProfile;
+    those slower than ``PROFILING_SLOW_MS`` are dumped to ``PROFILING_DIR``.
+    Streaming responses are measured until the response object is returned.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        install_recorder()
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile() if random.random() < settings.PROFILING_SAMPLE_RATE else None
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            current_recorder.reset(token)
+        return self.finish(request, response, time.perf_counter() - start, recorder, profiler)
+
+    async def __acall__(self, request):
+        # cProfile only follows the thread it was enabled in, and the event
+        # loop interleaves requests, so async requests are never profiled.
+        await sync_to_async(install_recorder)()
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, time.perf_counter() - start, recorder, None)
+
+    def finish(self, request, response, duration, recorder, profiler):
+        view = self.view_name(request)
+        dumped = profiler is not None and duration * 1000 >= settings.PROFILING_SLOW_MS
+        if dumped:
+            self.dump(profiler, view, duration)
+        repeated = {
+            sql: count for sql, count in recorder.fingerprints.items()
+            if count >= settings.PROFILING_DUPLICATE_THRESHOLD
+        }
+        if repeated:
+            logger.warning(
+                'Repeated queries in %s %s: %s', request.method, view,
+                '; '.join(f'{count}x {sql[:200]}' for sql, count in repeated.items()),
+            )
+        metrics.record(
+            (('view', view), ('method', request.method)),
+            duration, recorder.duration, recorder.count, recorder.duplicates, dumped,
+        )
+        response['Server-Timing'] = (
+            f'app;dur={duration * 1000:.1f}, db;dur={recorder.duration * 1000:.1f}, '
+            f'queries;desc="{recorder.count}", duplicates;desc="{recorder.duplicates}"'
+        )
+        return response
+
+    def view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match.route
+
+    def dump(self, profiler, view, duration):
+        directory = settings.PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        view = re.sub(r'[^A-Za-z0-9_-]', '_', view)
+        stamp = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{threading.get_ident()}'
+        name = f'{stamp}-{view}-{duration * 1000:.0f}ms.prof'
+        profiler.dump_stats(os.path.join(directory, name))
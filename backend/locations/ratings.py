@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Round
+from django.db.models.lookups import LessThanOrEqual
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import Location, Review
+
+
+def average_expression(rating_sum, rating_count):
+    """Rounded average as stored in ``Location.rating`` (0 when there are no reviews)."""
+    return Case(
+        When(LessThanOrEqual(rating_count, 0), then=Value(0)),
+        default=Round(ExpressionWrapper(rating_sum * 1.0 / rating_count, output_field=FloatField()), 1),
+        output_field=DecimalField(max_digits=3, decimal_places=1),
+    )
+
+
+def apply_rating_delta(location_id, rating_delta, count_delta):
+    if location_id is None or (rating_delta == 0 and count_delta == 0):
+        return
+    new_sum = F('rating_sum') + rating_delta
+    new_count = F('rating_count') + count_delta
+    # Every right-hand side sees the row as it was before the UPDATE, so the
+    # average is computed from the new totals within the same statement.
+    Location.objects.filter(pk=location_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating=average_expression(new_sum, new_count),
+        updated_at=timezone.now(),
+    )
+
+
+def rebuild_ratings(queryset=None):
+    """Recompute the counters for every location in ``queryset`` with two UPDATE statements."""
+    if queryset is None:
+        queryset = Location.objects.all()
+    reviews = Review.objects.filter(location=OuterRef('pk')).order_by().values('location')
+    with transaction.atomic():
+        updated = queryset.update(
+            rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+            rating_count=Coalesce(Subquery(reviews.annotate(total=Count('id')).values('total')), 0),
+            updated_at=timezone.now(),
+        )
+        queryset.update(rating=average_expression(F('rating_sum'), F('rating_count')))
+        bump_version(Location)
+    return updated
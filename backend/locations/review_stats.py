@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import RowNumber
+
+from .cache import bump_version
+from .models import Location, LocationReviewStats, Review
+
+LATEST_REVIEWS = 5
+STARS = range(1, 6)
+BATCH_SIZE = 1000
+
+
+def star_field(rating):
+    return f'stars_{rating}' if rating in STARS else None
+
+
+def latest_review_ids(location_id):
+    # Served from review_location_idx without touching the table rows.
+    return list(
+        Review.objects.filter(location_id=location_id).order_by('-created_at', '-id')
+        .values_list('id', flat=True)[:LATEST_REVIEWS]
+    )
+
+
+def apply_stats_delta(location_id, ratings):
+    """Update the stats row of a location after its reviews changed.
+
+    ``ratings`` maps a star rating to how many reviews with it were added
+    (negative for removed ones). Costs one SELECT and one UPDATE; a location
+    without a row yet is rebuilt from its reviews instead.
+    """
+    if location_id is None:
+        return
+    changes = {'latest_review_ids': latest_review_ids(location_id)}
+    count = sum(ratings.values())
+    rating_sum = sum(rating * delta for rating, delta in ratings.items())
+    if count:
+        changes['count'] = F('count') + count
+    if rating_sum:
+        changes['rating_sum'] = F('rating_sum') + rating_sum
+    for rating, delta in ratings.items():
+        field = star_field(rating)
+        # Ratings outside 1-5 still count towards the total, just not the histogram.
+        if field is not None and delta:
+            changes[field] = F(field) + delta
+    if not LocationReviewStats.objects.filter(pk=location_id).update(**changes):
+        rebuild_review_stats(Location.objects.filter(pk=location_id), bump=False)
+
+
+def rebuild_review_stats(queryset=None, bump=True):
+    """Recompute the stats rows of every location in ``queryset`` from the reviews table."""
+    if queryset is None:
+        queryset = Location.objects.all()
+    reviews = Review.objects.filter(location__in=queryset.values('pk')).order_by()
+    totals = reviews.values('location_id').annotate(
+        total=Count('id'),
+        rating_total=Sum('rating'),
+        **{star_field(rating): Count('id', filter=Q(rating=rating)) for rating in STARS},
+    )
+    latest = {}
+    for location_id, review_id in reviews.annotate(
+        position=Window(RowNumber(), partition_by=F('location_id'), order_by=[F('created_at').desc(), F('id').desc()]),
+    ).filter(position__lte=LATEST_REVIEWS).order_by('location_id', 'position').values_list('location_id', 'id'):
+        latest.setdefault(location_id, []).append(review_id)
+
+    rows = [
+        LocationReviewStats(
+            location_id=row['location_id'], count=row['total'], rating_sum=row['rating_total'],
+            latest_review_ids=latest.get(row['location_id'], []),
+            **{star_field(rating): row[star_field(rating)] for rating in STARS},
+        )
+        for row in totals
+    ]
+    with transaction.atomic():
+        LocationReviewStats.objects.filter(location__in=queryset.values('pk')).delete()
+        LocationReviewStats.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        if bump:
+            bump_version(Location)
+    return len(rows)
+
+
+def stats_data(stats):
+    """The ``review_stats`` field of a location; ``stats`` is None when it has no reviews."""
+    if stats is None:
+        return {'count': 0, 'average': None, 'histogram': {str(rating): 0 for rating in STARS}, 'latest_review_ids': []}
+    return {
+        'count': stats.count,
+        'average': round(stats.rating_sum / stats.count, 2) if stats.count else None,
+        'histogram': {str(rating): getattr(stats, star_field(rating)) for rating in STARS},
+        'latest_review_ids': stats.latest_review_ids,
+    }
@@ -0,0 +1,99 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+
+from .models import Location, Proposition, Review, SearchTerm
+from .text import parse_query, term_weights
+
+INDEX_BATCH_SIZE = 1000
+SUGGEST_LIMIT = 10
+
+
+def location_terms(location_ids):
+    """Term weights per location, built from the location and its reviews/propositions."""
+    fields = defaultdict(list)
+    for pk, name, address, description in Location.objects.filter(pk__in=location_ids).values_list(
+        'pk', 'name', 'address', 'description'
+    ):
+        fields[pk].extend([('name', name), ('address', address), ('description', description)])
+    for location_id, comment in Review.objects.filter(location_id__in=location_ids).values_list('location_id', 'comment'):
+        fields[location_id].append(('review', comment))
+    for location_id, text in Proposition.objects.filter(location_id__in=location_ids).values_list('location_id', 'text'):
+        fields[location_id].append(('proposition', text))
+    return {pk: term_weights(pairs) for pk, pairs in fields.items()}
+
+
+def reindex_locations(location_ids):
+    """Replace the index rows of the given locations; deleted locations simply drop out."""
+    location_ids = [pk for pk in set(location_ids) if pk is not None]
+    for start in range(0, len(location_ids), INDEX_BATCH_SIZE):
+        batch = location_ids[start:start + INDEX_BATCH_SIZE]
+        terms = location_terms(batch)
+        with transaction.atomic():
+            SearchTerm.objects.filter(location_id__in=batch).delete()
+            SearchTerm.objects.bulk_create(
+                [
+                    SearchTerm(location_id=pk, term=term, weight=weight)
+                    for pk, weights in terms.items()
+                    for term, weight in weights.items()
+                ],
+                batch_size=INDEX_BATCH_SIZE,
+            )
+
+
+def rebuild_search_index():
+    SearchTerm.objects.all().delete()
+    ids = list(Location.objects.values_list('pk', flat=True))
+    reindex_locations(ids)
+    return len(ids)
+
+
+def _term_conditions(query):
+    exact, prefix = parse_query(query)
+    conditions = [Q(term=term) for term in exact]
+    if prefix:
+        conditions.append(Q(term__startswith=prefix))
+    return conditions
+
+
+def matching_terms(query):
+    """Per-location rows (location, rank) for locations matching every word of ``query``.
+
+    Returns ``None`` when the query has no searchable words.
+    """
+    conditions = _term_conditions(query)
+    if not conditions:
+        return None
+    any_condition = Q()
+    for condition in conditions:
+        any_condition |= condition
+    hits = {
+        f'hit_{i}': Max(Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField()))
+        for i, condition in enumerate(conditions)
+    }
+    return (
+        SearchTerm.objects.filter(any_condition)
+        .values('location')
+        .annotate(rank=Sum('weight'), **hits)
+        .filter(**{name: 1 for name in hits})
+    )
+
+
+def search_queryset(queryset, query):
+    matches = matching_terms(query)
+    if matches is None:
+        return queryset.none()
+    rank = Subquery(
+        matches.filter(location=OuterRef('pk')).values('rank')[:1], output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=matches.values('location')).annotate(search_rank=rank).order_by('-search_rank', 'id')
+
+
+def suggest(query, limit=SUGGEST_LIMIT):
+    matches = matching_terms(query)
+    if matches is None:
+        return []
+    top = list(matches.order_by('-rank', 'location').values_list('location', flat=True)[:limit])
+    names = dict(Location.objects.filter(pk__in=top).values_list('pk', 'name'))
+    return [{'id': pk, 'name': names[pk]} for pk in top if pk in names]
@@ -1,5 +1,14 @@
 from rest_framework import serializers
 from .models import Location, AccessibilityFeature, Review, Category, AccessibilityLevel, Proposition
+from .images import ORIGINAL
+from .review_stats import stats_data
+
+
+class ThumbnailsField(serializers.ReadOnlyField):
+    """Size map for ``srcset`` ({"160w": url, ...}); never includes the original."""
+
+    def to_representation(self, value):
+        return {size: url for size, url in value.items() if size != ORIGINAL}
 
 class AccessibilityFeatureSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,14 +43,20 @@ class LocationSerializer(serializers.ModelSerializer):
     categories = CategorySerializer(many=True, read_only=True)
     accessibility_levels = AccessibilityLevelSerializer(many=True, read_only=True)
     accessibility_features = AccessibilityFeatureSerializer(many=True, read_only=True)
-    reviews = ReviewSerializer(many=True, read_only=True)
+    review_stats = serializers.SerializerMethodField()
     image_url = serializers.SerializerMethodField()
+    thumbnails = ThumbnailsField()
     propositions = PropositionSerializer(many=True, read_only=True)
 
 
     class Meta:
         model = Location
         fields = '__all__'
+        read_only_fields = ('rating',)
+
+    def get_review_stats(self, obj):
+        # Missing one-to-one rows raise an AttributeError subclass.
+        return stats_data(getattr(obj, 'review_stats', None))
 
     def get_image_url(self, obj):
         if obj.image_url:
@@ -49,4 +64,38 @@ class LocationSerializer(serializers.ModelSerializer):
             if not url.startswith('http'):
                 return "https://res.cloudinary.com/dh6sayhat/" + url
             return url
-        return None
+        return obj.thumbnails.get(ORIGINAL)
+
+
+class LocationListSerializer(serializers.ModelSerializer):
+    categories = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    accessibility_features = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    level = serializers.SerializerMethodField()
+    level_color = serializers.SerializerMethodField()
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
+    review_average = serializers.SerializerMethodField()
+    thumbnails = ThumbnailsField()
+
+    class Meta:
+        model = Location
+        fields = (
+            'id', 'name', 'latitude', 'longitude', 'level', 'level_color',
+            'categories', 'accessibility_features', 'review_count', 'review_average', 'thumbnails',
+        )
+
+    def _level(self, obj):
+        levels = obj.accessibility_levels.all()
+        return levels[0] if levels else None
+
+    def get_review_average(self, obj):
+        if not obj.rating_count:
+            return None
+        return obj.rating_sum / obj.rating_count
+
+    def get_level(self, obj):
+        level = self._level(obj)
+        return level.name if level else None
+
+    def get_level_color(self, obj):
+        level = self._level(obj)
+        return level.color if level else None
@@ -0,0 +1,193 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import facets, nearest
+from .cache import LOCATION_COORDINATES, bump_version
+from .levels import clear_level_cache, location_levels_changed
+from .models import AccessibilityFeature, AccessibilityLevel, Category, Location, Proposition, Review
+from .ratings import apply_rating_delta, rebuild_ratings
+from .review_stats import apply_stats_delta, rebuild_review_stats
+from .sync import record_deletion, touch_locations
+from .tasks import RECOMPUTE_LEVELS_JOB, REINDEX_JOB, enqueue_for_locations
+
+# Location fields that feed the search index.
+SEARCH_FIELDS = {'name', 'address', 'description'}
+
+
+def _stored_rating(review):
+    # Read through __dict__ so deferred fields don't trigger a query per instance.
+    return review.__dict__.get('location_id'), review.__dict__.get('rating')
+
+
+def _deleting_location(origin):
+    # Reviews and propositions removed by a location's cascade need no upkeep
+    # for it; recreating its search terms or stats would outlive the location.
+    return isinstance(origin, Location) or getattr(origin, 'model', None) is Location
+
+
+def _rebuild(*location_ids):
+    locations = Location.objects.filter(pk__in=[pk for pk in location_ids if pk is not None])
+    rebuild_ratings(locations)
+    rebuild_review_stats(locations)
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._stored_rating = _stored_rating(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, created, **kwargs):
+    current = (instance.location_id, instance.rating)
+    previous = instance._stored_rating
+    if created:
+        apply_rating_delta(current[0], current[1], 1)
+        apply_stats_delta(current[0], {current[1]: 1})
+    elif previous is None or None in previous:
+        _rebuild(current[0], previous and previous[0])
+    elif previous != current:
+        apply_rating_delta(previous[0], -previous[1], -1)
+        apply_rating_delta(current[0], current[1], 1)
+        if previous[0] == current[0]:
+            apply_stats_delta(current[0], {previous[1]: -1, current[1]: 1})
+        else:
+            apply_stats_delta(previous[0], {previous[1]: -1})
+            apply_stats_delta(current[0], {current[1]: 1})
+    instance._stored_rating = current
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, origin=None, **kwargs):
+    if _deleting_location(origin):
+        return
+    previous = instance._stored_rating or _stored_rating(instance)
+    if None in previous:
+        _rebuild(previous[0])
+    else:
+        apply_rating_delta(previous[0], -previous[1], -1)
+        apply_stats_delta(previous[0], {previous[1]: -1})
+
+
+@receiver(m2m_changed, sender=Location.accessibility_features.through)
+@receiver(m2m_changed, sender=Location.categories.through)
+def recompute_level_on_links_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # ``instance`` is a feature/category; the affected locations are in pk_set,
+        # except for clear() where they have to be captured beforehand.
+        if action == 'pre_clear':
+            instance._cleared_location_ids = list(instance.locations.values_list('pk', flat=True))
+        elif action == 'post_clear':
+            enqueue_for_locations(RECOMPUTE_LEVELS_JOB, getattr(instance, '_cleared_location_ids', []))
+        elif action in ('post_add', 'post_remove'):
+            enqueue_for_locations(RECOMPUTE_LEVELS_JOB, pk_set or ())
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        enqueue_for_locations(RECOMPUTE_LEVELS_JOB, [instance.pk])
+
+
+@receiver(pre_delete, sender=AccessibilityFeature)
+@receiver(pre_delete, sender=Category)
+def remember_linked_locations(sender, instance, **kwargs):
+    instance._linked_location_ids = list(instance.locations.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=AccessibilityFeature)
+@receiver(post_delete, sender=Category)
+def recompute_level_on_delete(sender, instance, **kwargs):
+    location_ids = getattr(instance, '_linked_location_ids', [])
+    enqueue_for_locations(RECOMPUTE_LEVELS_JOB, location_ids)
+    touch_locations(location_ids)
+
+
+@receiver(post_save, sender=AccessibilityLevel)
+@receiver(post_delete, sender=AccessibilityLevel)
+def reset_level_cache(sender, **kwargs):
+    clear_level_cache()
+
+
+@receiver(post_save, sender=Location)
+def reindex_location(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    enqueue_for_locations(REINDEX_JOB, [instance.pk])
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Proposition)
+@receiver(post_delete, sender=Proposition)
+def reindex_commented_location(sender, instance, origin=None, **kwargs):
+    if _deleting_location(origin):
+        return
+    enqueue_for_locations(REINDEX_JOB, [instance.location_id])
+
+
+@receiver(m2m_changed, sender=Location.accessibility_features.through)
+@receiver(m2m_changed, sender=Location.categories.through)
+@receiver(m2m_changed, sender=Location.accessibility_levels.through)
+def touch_linked_locations(sender, instance, action, reverse, pk_set, **kwargs):
+    # Links have no timestamps of their own; sync clients get the whole location again.
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        touch_locations([instance.pk])
+    elif action == 'post_clear':
+        touch_locations(getattr(instance, '_cleared_location_ids', []))
+    else:
+        touch_locations(pk_set or ())
+
+
+@receiver(location_levels_changed)
+def touch_relevelled_locations(sender, changes, **kwargs):
+    touch_locations([location_id for location_id, _, _ in changes])
+
+
+@receiver(post_delete, sender=Location)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=Proposition)
+def leave_tombstone(sender, instance, **kwargs):
+    record_deletion(instance)
+
+
+VERSIONED_MODELS = (Location, Review, Proposition, Category, AccessibilityFeature, AccessibilityLevel)
+LOCATION_LINKS = (
+    Location.accessibility_features.through,
+    Location.categories.through,
+    Location.accessibility_levels.through,
+)
+
+
+def bump_model_version(sender, **kwargs):
+    bump_version(sender)
+
+
+def bump_location_version(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(Location)
+
+
+def bump_coordinates_version(sender, instance, update_fields=None, **kwargs):
+    if nearest.coordinates_changed(instance, update_fields):
+        bump_version(LOCATION_COORDINATES)
+
+
+# The facet and nearest indexes pair each in-process delta with the version
+# bump that follows it, so their receivers have to be connected before the bump ones.
+post_save.connect(facets.track_location_save, sender=Location, dispatch_uid='facets_location_save')
+post_delete.connect(facets.track_location_delete, sender=Location, dispatch_uid='facets_location_delete')
+for model in (Category, AccessibilityFeature, AccessibilityLevel):
+    post_save.connect(facets.track_facet_save, sender=model, dispatch_uid=f'facets_save_{model.__name__}')
+    post_delete.connect(facets.track_facet_delete, sender=model, dispatch_uid=f'facets_delete_{model.__name__}')
+for link in LOCATION_LINKS:
+    m2m_changed.connect(facets.track_links, sender=link, dispatch_uid=f'facets_m2m_{link.__name__}')
+post_save.connect(nearest.track_location_save, sender=Location, dispatch_uid='nearest_location_save')
+post_delete.connect(nearest.track_location_delete, sender=Location, dispatch_uid='nearest_location_delete')
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_model_version, sender=model, dispatch_uid=f'bump_version_save_{model.__name__}')
+    post_delete.connect(bump_model_version, sender=model, dispatch_uid=f'bump_version_delete_{model.__name__}')
+
+for link in LOCATION_LINKS:
+    m2m_changed.connect(bump_location_version, sender=link, dispatch_uid=f'bump_version_m2m_{link.__name__}')
+
+post_save.connect(bump_coordinates_version, sender=Location, dispatch_uid='bump_version_save_coordinates')
+post_delete.connect(bump_coordinates_version, sender=Location, dispatch_uid='bump_version_delete_coordinates')
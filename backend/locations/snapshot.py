@@ -0,0 +1,83 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .cache import get_versions
+from .levels import LevelLink
+from .models import ACCESSIBILITY_LEVEL_COLORS, AccessibilityLevel, Location
+
+LEVEL_NAMES = tuple(ACCESSIBILITY_LEVEL_COLORS)
+NO_LEVEL = -1
+
+
+def level_positions():
+    """AccessibilityLevel pk -> index into ``LEVEL_NAMES``."""
+    return {
+        pk: LEVEL_NAMES.index(name)
+        for pk, name in AccessibilityLevel.objects.filter(name__in=LEVEL_NAMES).values_list('pk', 'name')
+    }
+
+
+class LocationSnapshot:
+    """Columnar copy of every location's coordinates and level, sorted by longitude.
+
+    Sorting by longitude turns a bounding box into a contiguous slice found
+    with two bisects, so only that slice has to be scanned for latitude.
+    """
+
+    def __init__(self, version, ids, latitudes, longitudes, levels):
+        self.version = version
+        self.ids = ids
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.levels = levels
+        self.memo = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, version):
+        level_index = level_positions()
+        location_levels = {
+            location_id: level_index.get(level_id, NO_LEVEL)
+            for location_id, level_id in LevelLink.objects.values_list('location_id', 'accessibilitylevel_id').iterator()
+        }
+        rows = sorted(
+            Location.objects.values_list('longitude', 'latitude', 'pk').iterator(chunk_size=5000)
+        )
+        return cls(
+            version,
+            array('q', [row[2] for row in rows]),
+            array('d', [row[1] for row in rows]),
+            array('d', [row[0] for row in rows]),
+            array('b', [location_levels.get(row[2], NO_LEVEL) for row in rows]),
+        )
+
+    def slice_for(self, west, east):
+        return bisect_left(self.longitudes, west), bisect_right(self.longitudes, east)
+
+    def in_bbox(self, south, west, north, east):
+        """Yield positions (indexes into the arrays) of the points inside the box."""
+        start, stop = self.slice_for(west, east)
+        latitudes = self.latitudes
+        for position in range(start, stop):
+            if south <= latitudes[position] <= north:
+                yield position
+
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def get_snapshot():
+    """Current snapshot, rebuilt whenever the Location version has moved."""
+    global _snapshot
+    version = get_versions((Location,))[0]
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = LocationSnapshot.build(version)
+        return _snapshot
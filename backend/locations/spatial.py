@@ -0,0 +1,115 @@
+import math
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_M = 6371008.8
+
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Upper bound on how many geohash cells a single viewport query may touch.
+MAX_COVERING_CELLS = 32
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def covering_prefixes(south, west, north, east, max_cells=MAX_COVERING_CELLS):
+    """Smallest set of geohash prefixes whose cells cover the bounding box."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_height, cell_width = geohash_cell_size(precision)
+        rows = math.floor(north / cell_height) - math.floor(south / cell_height) + 1
+        cols = math.floor(east / cell_width) - math.floor(west / cell_width) + 1
+        if rows * cols <= max_cells:
+            break
+    else:
+        return set()
+
+    prefixes = set()
+    lat = south
+    while True:
+        lng = west
+        while True:
+            prefixes.add(encode_geohash(lat, lng, precision))
+            if lng >= east:
+                break
+            lng = min(lng + cell_width, east)
+        if lat >= north:
+            break
+        lat = min(lat + cell_height, north)
+    return prefixes
+
+
+def radius_bboxes(latitude, longitude, radius_m):
+    """Bounding boxes of the circle, split in two where it crosses the antimeridian.
+
+    Longitudes are never clamped at ±180: the part past it wraps round to
+    the other side as its own box.
+    """
+    angle = radius_m / EARTH_RADIUS_M
+    dlat = math.degrees(angle)
+    south = max(-90.0, latitude - dlat)
+    north = min(90.0, latitude + dlat)
+    cos_lat = math.cos(math.radians(latitude))
+    if math.sin(angle) >= cos_lat:
+        # The circle contains a pole, so it reaches every longitude.
+        return [(south, -180.0, north, 180.0)]
+    # Widest longitude offset on the circle, which is not at the centre's latitude.
+    dlng = math.degrees(math.asin(math.sin(angle) / cos_lat))
+    west, east = longitude - dlng, longitude + dlng
+    if west < -180.0:
+        return [(south, west + 360.0, north, 180.0), (south, -180.0, north, east)]
+    if east > 180.0:
+        return [(south, west, north, 180.0), (south, -180.0, north, east - 360.0)]
+    return [(south, west, north, east)]
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_expression(latitude, longitude, lat_field='latitude', lng_field='longitude'):
+    """ORM expression computing the distance in metres from a fixed point."""
+    phi = math.radians(latitude)
+    dphi = (Radians(F(lat_field)) - Value(phi)) / 2
+    dlmb = (Radians(F(lng_field)) - Value(math.radians(longitude))) / 2
+    a = (
+        Power(Sin(dphi), 2)
+        + Value(math.cos(phi)) * Cos(Radians(F(lat_field))) * Power(Sin(dlmb), 2)
+    )
+    return Value(2 * EARTH_RADIUS_M) * ASin(Sqrt(a), output_field=FloatField())
@@ -0,0 +1,32 @@
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+STREAM_CHUNK_SIZE = 500
+
+
+class NDJSONStreamMixin:
+    """Adds ``?stream=ndjson`` to a list action.
+
+    Rows are pulled through ``QuerySet.iterator`` (a server-side cursor on
+    PostgreSQL) and serialized one at a time, so memory stays flat no matter
+    how large the export is.
+    """
+    stream_chunk_size = STREAM_CHUNK_SIZE
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream') == 'ndjson':
+            queryset = self.filter_queryset(self.get_queryset())
+            return StreamingHttpResponse(
+                self.stream_rows(queryset), content_type='application/x-ndjson',
+            )
+        return super().list(request, *args, **kwargs)
+
+    def stream_rows(self, queryset):
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        encoder = JSONEncoder()
+        for obj in queryset.iterator(chunk_size=self.stream_chunk_size):
+            data = serializer_class(obj, context=context).data
+            yield encoder.encode(data) + '\n'
@@ -0,0 +1,129 @@
+"""Delta sync for offline-capable clients.
+
+A sync token is the server time a sync started, in microseconds. Changed
+rows are found through ``updated_at`` and deleted ones through ``Tombstone``.
+Each delta re-reads a short overlap before the token, because a write can
+get its timestamp before an earlier sync and only commit after it; clients
+simply upsert the rows they already had.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .images import ORIGINAL
+from .levels import CategoryLink, FeatureLink, LevelLink
+from .models import AccessibilityLevel, Location, Proposition, Review, Tombstone
+
+BATCH_SIZE = 1000
+ROW_CHUNK_SIZE = 2000
+SYNCED_MODELS = {'location': Location, 'review': Review, 'proposition': Proposition}
+
+LOCATION_FIELDS = (
+    'id', 'name', 'latitude', 'longitude', 'level', 'categories', 'accessibility_features',
+    'review_count', 'review_average', 'thumbnails', 'updated_at',
+)
+REVIEW_FIELDS = ('id', 'location', 'user', 'rating', 'comment', 'created_at', 'updated_at')
+PROPOSITION_FIELDS = ('id', 'location', 'user', 'text', 'created_at', 'updated_at')
+
+
+def make_token(moment):
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def parse_token(raw):
+    try:
+        return datetime.fromtimestamp(int(raw) / 1_000_000, tz=dt_timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        raise ValidationError({'since': 'Invalid sync token.'})
+
+
+def touch_locations(location_ids):
+    """Mark locations as changed for sync clients, e.g. after their links changed."""
+    location_ids = [pk for pk in set(location_ids) if pk is not None]
+    now = timezone.now()
+    for start in range(0, len(location_ids), BATCH_SIZE):
+        Location.objects.filter(pk__in=location_ids[start:start + BATCH_SIZE]).update(updated_at=now)
+
+
+def record_deletion(instance):
+    Tombstone.objects.create(model=instance._meta.model_name, object_id=instance.pk)
+
+
+def link_map(link, column, location_ids):
+    links = {}
+    for location_id, target in link.objects.filter(location_id__in=location_ids).values_list(
+        'location_id', column
+    ).iterator(chunk_size=ROW_CHUNK_SIZE):
+        links.setdefault(location_id, []).append(target)
+    return links
+
+
+def location_rows(queryset):
+    location_ids = queryset.values('pk')
+    categories = link_map(CategoryLink, 'category_id', location_ids)
+    features = link_map(FeatureLink, 'accessibilityfeature_id', location_ids)
+    levels = link_map(LevelLink, 'accessibilitylevel_id', location_ids)
+    level_names = dict(AccessibilityLevel.objects.values_list('pk', 'name'))
+    rows = []
+    for pk, name, latitude, longitude, rating_sum, rating_count, thumbnails, updated_at in queryset.values_list(
+        'pk', 'name', 'latitude', 'longitude', 'rating_sum', 'rating_count', 'thumbnails', 'updated_at',
+    ).iterator(chunk_size=ROW_CHUNK_SIZE):
+        level_ids = levels.get(pk)
+        rows.append([
+            pk, name, latitude, longitude, level_names.get(level_ids[0]) if level_ids else None,
+            categories.get(pk, []), features.get(pk, []),
+            rating_count, rating_sum / rating_count if rating_count else None,
+            {size: url for size, url in thumbnails.items() if size != ORIGINAL}, updated_at,
+        ])
+    return rows
+
+
+def changes_since(since=None):
+    """Rows changed since the ``since`` token, or everything when it is missing or too old.
+
+    Tables come back as ``{"fields": [...], "rows": [[...], ...]}``. Clients
+    should drop the ``deleted`` ids first and then upsert the rows, so an id
+    reused after a delete ends up present.
+    """
+    started = timezone.now()
+    full = since is None
+    if not full:
+        moment = parse_token(since)
+        # Older tombstones may have been pruned; only a full sync is safe then.
+        full = moment < started - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    locations, reviews, propositions = Location.objects.all(), Review.objects.all(), Proposition.objects.all()
+    deleted = {name: [] for name in SYNCED_MODELS}
+    if not full:
+        window = moment - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+        locations = locations.filter(updated_at__gte=window)
+        reviews = reviews.filter(updated_at__gte=window)
+        propositions = propositions.filter(updated_at__gte=window)
+        for model, object_id in Tombstone.objects.filter(deleted_at__gte=window).values_list('model', 'object_id'):
+            if model in deleted:
+                deleted[model].append(object_id)
+
+    return {
+        'token': make_token(started),
+        'full': full,
+        'locations': {'fields': LOCATION_FIELDS, 'rows': location_rows(locations.order_by('pk'))},
+        'reviews': {
+            'fields': REVIEW_FIELDS,
+            'rows': [list(row) for row in reviews.order_by('pk').values_list(
+                'pk', 'location_id', 'user__username', 'rating', 'comment', 'created_at', 'updated_at',
+            ).iterator(chunk_size=ROW_CHUNK_SIZE)],
+        },
+        'propositions': {
+            'fields': PROPOSITION_FIELDS,
+            'rows': [list(row) for row in propositions.order_by('pk').values_list(
+                'pk', 'location_id', 'user__username', 'text', 'created_at', 'updated_at',
+            ).iterator(chunk_size=ROW_CHUNK_SIZE)],
+        },
+        'deleted': {f'{name}s': sorted(set(ids)) for name, ids in deleted.items()},
+    }
+
+
+def prune_tombstones():
+    cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    return Tombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
@@ -0,0 +1,46 @@
+"""Background jobs of the locations app; queued through ``locations.jobs.enqueue``."""
+import os
+
+from django.conf import settings
+
+from .cache import SEARCH_INDEX, bump_version
+from .images import IMAGE_JOB, mark_image_failed, store_image
+from .jobs import enqueue, job
+from .levels import recompute_levels
+from .search import reindex_locations
+
+REINDEX_JOB = 'locations.reindex'
+RECOMPUTE_LEVELS_JOB = 'locations.recompute_levels'
+
+
+def enqueue_for_locations(name, location_ids):
+    """Queue a coalescing per-location job; a single location is also deduplicated by its id."""
+    location_ids = list(dict.fromkeys(pk for pk in location_ids if pk is not None))
+    if location_ids:
+        enqueue(name, key=location_ids[0] if len(location_ids) == 1 else '', location_ids=location_ids)
+
+
+@job(REINDEX_JOB, coalesce=True)
+def reindex_job(location_ids):
+    reindex_locations(location_ids)
+    if settings.JOBS_ASYNC:
+        # Inline runs are covered by the version bump of the write that queued them.
+        bump_version(SEARCH_INDEX)
+
+
+@job(RECOMPUTE_LEVELS_JOB, coalesce=True)
+def recompute_levels_job(location_ids):
+    recompute_levels(location_ids)
+
+
+def discard_image(location_id, path):
+    mark_image_failed(location_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+@job(IMAGE_JOB, on_failure=discard_image)
+def process_image_job(location_id, path):
+    # The staged file is kept between attempts; discard_image removes it after the last.
+    store_image(location_id, path)
+    os.remove(path)
@@ -0,0 +1,1548 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest import skipIf
+from unittest.mock import patch
+
+from rest_framework.test import APITestCase
+from users.authentication import user_cache
+
+from .clusters import mercator_x, mercator_y
+from .columnar import ColumnarRenderer, decode_locations
+from .coverage import coverage_index
+from .cache import LOCATION_COORDINATES, bump_version, get_versions
+from .facets import bitmap_to_ids, facet_index
+from .images import STATUS_READY, THUMBNAIL_WIDTHS
+from .jobs import job, run_pending
+from .importers import iter_geojson_features
+from .levels import FeatureLink, bulk_recompute_levels, get_level_ids
+from .profiling import fingerprint, metrics
+from .nearest import nearest_index
+from .models import AccessibilityFeature, Category, Job, Location, LocationReviewStats, Proposition, Review
+
+
+class LocationListQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        self.features = [AccessibilityFeature.objects.create(name=f'Feature {i}') for i in range(3)]
+
+    def create_locations(self, count):
+        for i in range(count):
+            location = Location.objects.create(
+                name=f'Place {i}', address='Street', latitude=49.84 + i * 0.001, longitude=24.03,
+            )
+            location.categories.set(self.categories[:2])
+            location.accessibility_features.set(self.features)
+            Review.objects.create(location=location, user=self.user, rating=4, comment='Nice')
+            Review.objects.create(location=location, user=self.user, rating=2, comment='Meh')
+            Proposition.objects.create(location=location, user=self.user, text='Add a ramp')
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/locations/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_list_query_count_is_constant(self):
+        self.create_locations(3)
+        small_count, _ = self.count_list_queries()
+        self.create_locations(20)
+        large_count, data = self.count_list_queries()
+        self.assertEqual(len(data), 23)
+        self.assertEqual(small_count, large_count)
+
+    def test_list_item_is_compact(self):
+        self.create_locations(1)
+        _, data = self.count_list_queries()
+        item = data[0]
+        self.assertNotIn('reviews', item)
+        self.assertNotIn('propositions', item)
+        self.assertEqual(item['review_count'], 2)
+        self.assertEqual(item['review_average'], 3.0)
+        self.assertEqual(sorted(item['categories']), sorted(c.id for c in self.categories[:2]))
+
+    def test_list_counts_are_not_inflated_by_filters(self):
+        self.create_locations(1)
+        response = self.client.get('/api/locations/', {
+            'categories': [c.name for c in self.categories],
+            'accessibility_features': [f.name for f in self.features],
+        })
+        self.assertEqual(response.json()[0]['review_count'], 2)
+
+    def test_retrieve_keeps_nested_representation(self):
+        self.create_locations(1)
+        location = Location.objects.get()
+        data = self.client.get(f'/api/locations/{location.id}/').json()
+        self.assertEqual(data['review_stats']['count'], 2)
+        self.assertEqual(len(data['propositions']), 1)
+
+
+class SpatialQueryTests(APITestCase):
+    def locate(self, name, latitude, longitude):
+        return Location.objects.create(name=name, address='Street', latitude=latitude, longitude=longitude)
+
+    def names(self, **params):
+        response = self.client.get('/api/locations/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [item['name'] for item in response.json()]
+
+    def test_bbox_includes_its_edges(self):
+        for name, latitude, longitude in [
+            ('south', 49.0, 24.5), ('north', 50.0, 24.5), ('west', 49.5, 24.0), ('east', 49.5, 25.0),
+            ('south-west', 49.0, 24.0), ('north-east', 50.0, 25.0),
+        ]:
+            self.locate(name, latitude, longitude)
+        for name, latitude, longitude in [
+            ('below', 48.9999, 24.5), ('above', 50.0001, 24.5), ('left', 49.5, 23.9999), ('right', 49.5, 25.0001),
+        ]:
+            self.locate(name, latitude, longitude)
+        self.assertEqual(
+            sorted(self.names(bbox='24,49,25,50')),
+            ['east', 'north', 'north-east', 'south', 'south-west', 'west'],
+        )
+
+    def test_near_keeps_points_within_radius_nearest_first(self):
+        import math
+
+        from .spatial import EARTH_RADIUS_M, haversine_m
+
+        def north_of_center(meters):
+            return 49.8 + math.degrees(meters / EARTH_RADIUS_M)
+
+        for name, meters in [('far', 1001), ('edge', 999), ('mid', 500), ('center', 0)]:
+            self.locate(name, north_of_center(meters), 24.0)
+        self.assertAlmostEqual(haversine_m(49.8, 24.0, north_of_center(999), 24.0), 999, places=3)
+        self.assertEqual(self.names(near='49.8,24.0', radius_m=1000), ['center', 'mid', 'edge'])
+        self.assertEqual(self.names(near='49.8,24.0', radius_m=600), ['center', 'mid'])
+        # A bbox is ordered by distance from its centre.
+        self.assertEqual(self.names(bbox='23.99,49.79,24.01,49.81')[:2], ['center', 'mid'])
+
+    def test_invalid_spatial_params(self):
+        for field, params in [
+            ('bbox', {'bbox': '24,49,25'}), ('bbox', {'bbox': 'a,b,c,d'}), ('bbox', {'bbox': '24,50,25,49'}),
+            ('bbox', {'bbox': '24,-91,25,49'}), ('bbox', {'bbox': '-181,49,25,50'}),
+            ('near', {'near': '49.8'}), ('near', {'near': '91,24'}), ('near', {'near': 'x,y'}),
+            ('radius_m', {'near': '49.8,24', 'radius_m': 'far'}), ('radius_m', {'near': '49.8,24', 'radius_m': 0}),
+            ('radius_m', {'near': '49.8,24', 'radius_m': 50001}),
+        ]:
+            response = self.client.get('/api/locations/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(field, response.json())
+
+    def test_near_wraps_around_the_antimeridian(self):
+        # About 22 km either side of the line, 1 km south of the centre.
+        self.locate('east of the line', -17.99, -179.8)
+        self.locate('west of the line', -17.99, 179.8)
+        self.locate('too far', -17.99, 179.3)
+        self.assertEqual(self.names(near='-18,179.9', radius_m=40000), ['west of the line', 'east of the line'])
+        self.assertEqual(self.names(near='-18,-179.9', radius_m=40000), ['east of the line', 'west of the line'])
+
+    def test_near_a_pole_reaches_every_longitude(self):
+        self.locate('across the pole', 89.8, -150.0)
+        self.assertEqual(self.names(near='89.8,30', radius_m=50000), ['across the pole'])
+
+    def test_antimeridian_bbox_is_rejected(self):
+        response = self.client.get('/api/locations/', {'bbox': '170,-10,-170,10'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('antimeridian', response.json()['bbox'])
+
+
+class PaginationAndStreamingTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.locations = [
+            Location.objects.create(name=f'Place {i}', address='Street', latitude=49.8, longitude=24.0)
+            for i in range(5)
+        ]
+        for location in self.locations:
+            Review.objects.create(location=location, user=self.user, rating=5)
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get('/api/locations/')
+        self.assertIsInstance(response.json(), list)
+
+    def test_cursor_pagination_walks_all_rows(self):
+        seen = []
+        url = '/api/reviews/?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(item['id'] for item in data['results'])
+            url = data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_ndjson_stream(self):
+        response = self.client.get('/api/locations/', {'stream': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['review_count'], 1)
+
+
+class RatingCounterTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.location = Location.objects.create(name='Place', address='Street', latitude=49.8, longitude=24.0)
+        self.other = Location.objects.create(name='Other', address='Street', latitude=49.8, longitude=24.0)
+
+    def assertRating(self, location, rating_sum, rating_count, rating):
+        location.refresh_from_db()
+        self.assertEqual((location.rating_sum, location.rating_count), (rating_sum, rating_count))
+        self.assertEqual(float(location.rating), rating)
+
+    def test_counters_follow_review_lifecycle(self):
+        first = Review.objects.create(location=self.location, user=self.user, rating=5)
+        Review.objects.create(location=self.location, user=self.user, rating=2)
+        self.assertRating(self.location, 7, 2, 3.5)
+
+        first = Review.objects.get(pk=first.pk)
+        first.rating = 3
+        first.save()
+        self.assertRating(self.location, 5, 2, 2.5)
+
+        first.location = self.other
+        first.save()
+        self.assertRating(self.location, 2, 1, 2.0)
+        self.assertRating(self.other, 3, 1, 3.0)
+
+        Review.objects.filter(location=self.location).delete()
+        self.assertRating(self.location, 0, 0, 0.0)
+
+    def test_review_created_through_api_updates_rating(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/reviews/', {'location': self.location.id, 'rating': 4})
+        self.assertEqual(response.status_code, 201)
+        self.assertRating(self.location, 4, 1, 4.0)
+        self.assertEqual(len(self.client.get('/api/locations/', {'min_rating': 3.5}).json()), 1)
+
+    def test_rating_out_of_range_is_rejected(self):
+        self.client.force_authenticate(self.user)
+        for rating in (-3, 0, 6, 1000):
+            response = self.client.post('/api/reviews/', {'location': self.location.id, 'rating': rating})
+            self.assertEqual(response.status_code, 400, rating)
+            self.assertIn('rating', response.json())
+        self.assertFalse(Review.objects.exists())
+        self.assertRating(self.location, 0, 0, 0.0)
+
+    def test_review_is_not_saved_when_counters_fail(self):
+        with patch('locations.signals.apply_stats_delta', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                Review.objects.create(location=self.location, user=self.user, rating=4)
+        self.assertFalse(Review.objects.exists())
+        self.assertRating(self.location, 0, 0, 0.0)
+
+    def test_rebuild_ratings_command(self):
+        Review.objects.create(location=self.location, user=self.user, rating=4)
+        Location.objects.update(rating_sum=0, rating_count=0, rating=0)
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertRating(self.location, 4, 1, 4.0)
+        self.assertRating(self.other, 0, 0, 0.0)
+
+
+
+class ReviewStatsTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.location = Location.objects.create(name='Place', address='Street', latitude=49.8, longitude=24.0)
+        self.other = Location.objects.create(name='Other', address='Street', latitude=49.8, longitude=24.0)
+
+    def stats(self, location):
+        return self.client.get(f'/api/locations/{location.id}/').json()['review_stats']
+
+    def test_stats_follow_review_lifecycle(self):
+        self.assertEqual(self.stats(self.location)['count'], 0)
+        reviews = [Review.objects.create(location=self.location, user=self.user, rating=rating) for rating in (5, 4, 4)]
+        stats = self.stats(self.location)
+        self.assertEqual(stats['count'], 3)
+        self.assertAlmostEqual(stats['average'], 4.33)
+        self.assertEqual(stats['histogram'], {'1': 0, '2': 0, '3': 0, '4': 2, '5': 1})
+        self.assertEqual(stats['latest_review_ids'], [review.id for review in reversed(reviews)])
+
+        review = Review.objects.get(pk=reviews[0].pk)
+        review.rating = 1
+        review.save()
+        self.assertEqual(self.stats(self.location)['histogram'], {'1': 1, '2': 0, '3': 0, '4': 2, '5': 0})
+
+        review.location = self.other
+        review.save()
+        reviews[1].delete()
+        self.assertEqual(self.stats(self.location)['latest_review_ids'], [reviews[2].id])
+        self.assertEqual(self.stats(self.other)['histogram']['1'], 1)
+
+        LocationReviewStats.objects.all().delete()
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertEqual(self.stats(self.location)['histogram'], {'1': 0, '2': 0, '3': 0, '4': 1, '5': 0})
+        self.assertEqual(self.stats(self.other)['latest_review_ids'], [review.id])
+
+    def test_reviews_sub_resource_is_paginated(self):
+        Review.objects.bulk_create([
+            Review(location=self.location, user=self.user, rating=3, comment=str(i)) for i in range(25)
+        ])
+        page = self.client.get(f'/api/locations/{self.location.id}/reviews/').json()
+        self.assertEqual(len(page['results']), 20)
+        self.assertEqual(page['results'][0]['user'], 'tester')
+        rest = self.client.get(page['next']).json()
+        self.assertEqual(len(rest['results']), 5)
+        self.assertIsNone(rest['next'])
+        self.assertEqual(self.client.get('/api/locations/0/reviews/').status_code, 404)
+
+
+class AccessibilityLevelTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.features = [AccessibilityFeature.objects.create(name=f'Feature {i}') for i in range(6)]
+
+    def level_of(self, location):
+        return list(location.accessibility_levels.values_list('name', flat=True))
+
+    def test_new_location_starts_with_lowest_level(self):
+        location = Location.objects.create(name='Place', address='Street', latitude=49.8, longitude=24.0)
+        self.assertEqual(self.level_of(location), ['limited_accessibility'])
+
+    def test_feature_endpoints_recompute_level(self):
+        location = Location.objects.create(name='Place', address='Street', latitude=49.8, longitude=24.0)
+        location.accessibility_features.set(self.features[:4])
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/locations/{location.id}/add-feature/{self.features[4].id}/')
+        self.assertEqual(self.level_of(location), ['partially_accessible'])
+        self.client.delete(f'/api/locations/{location.id}/remove-feature/{self.features[4].id}/')
+        self.assertEqual(self.level_of(location), ['limited_accessibility'])
+
+    def test_reverse_changes_recompute_level(self):
+        location = Location.objects.create(name='Place', address='Street', latitude=49.8, longitude=24.0)
+        location.accessibility_features.set(self.features[:4])
+        self.features[5].locations.add(location)
+        self.assertEqual(self.level_of(location), ['partially_accessible'])
+        self.features[5].locations.clear()
+        self.assertEqual(self.level_of(location), ['limited_accessibility'])
+        self.features[5].locations.add(location)
+        self.features[5].delete()
+        self.assertEqual(self.level_of(location), ['limited_accessibility'])
+
+    def test_bulk_recompute_uses_fixed_number_of_queries(self):
+        def make(count):
+            locations = Location.objects.bulk_create([
+                Location(name=f'Place {i}', address='Street', latitude=49.8, longitude=24.0)
+                for i in range(count)
+            ])
+            FeatureLink.objects.bulk_create([
+                FeatureLink(location_id=location.id, accessibilityfeature_id=feature.id)
+                for location in locations for feature in self.features
+            ])
+            return Location.objects.filter(pk__in=[location.id for location in locations])
+
+        small, large = make(5), make(200)
+        get_level_ids()
+        with CaptureQueriesContext(connection) as small_ctx:
+            self.assertEqual(bulk_recompute_levels(small), 5)
+        with CaptureQueriesContext(connection) as large_ctx:
+            self.assertEqual(bulk_recompute_levels(large), 200)
+        self.assertEqual(len(small_ctx.captured_queries), len(large_ctx.captured_queries))
+        self.assertEqual(self.level_of(large.first()), ['partially_accessible'])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(bulk_recompute_levels(large), 0)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+
+class ImportLocationsTests(APITestCase):
+    def setUp(self):
+        self.ramp = AccessibilityFeature.objects.create(name='Ramp')
+        self.cafe = Category.objects.create(name='Cafe')
+
+    def write(self, suffix, content):
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        with handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def test_import_csv(self):
+        path = self.write('.csv', (
+            'name,latitude,longitude,address,categories,accessibility_features\n'
+            'Library,49.84,24.03,Main st,Cafe,Ramp;Unknown\n'
+            'Broken,north,24.03,,,\n'
+            'Museum,49.85,24.02,,,\n'
+        ))
+        out = StringIO()
+        call_command('import_locations', path, batch_size=1, stdout=out, stderr=StringIO())
+        self.assertIn('Imported 2 locations', out.getvalue())
+        library = Location.objects.get(name='Library')
+        self.assertEqual(list(library.accessibility_features.all()), [self.ramp])
+        self.assertEqual(list(library.categories.all()), [self.cafe])
+        self.assertEqual(library.geohash[:5], 'u8c5d')
+        self.assertEqual(library.accessibility_levels.get().name, 'limited_accessibility')
+
+    def test_import_geojson_streams_feature_collection(self):
+        features = [
+            {
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [24.0 + i / 1000, 49.8]},
+                'properties': {'name': f'Place {i}', 'categories': ['Cafe'], 'accessibility_features': 'Ramp'},
+            }
+            for i in range(30)
+        ]
+        path = self.write('.geojson', json.dumps({'type': 'FeatureCollection', 'features': features}))
+        with open(path, encoding='utf-8') as fp:
+            self.assertEqual(len(list(iter_geojson_features(fp))), 30)
+        call_command('import_locations', path, dry_run=True, stdout=StringIO())
+        self.assertFalse(Location.objects.exists())
+        call_command('import_locations', path, batch_size=7, stdout=StringIO())
+        self.assertEqual(Location.objects.filter(categories=self.cafe, accessibility_features=self.ramp).count(), 30)
+
+    def test_stream_reader_handles_small_chunks(self):
+        fp = StringIO('{"features": [{"type": "Feature", "id": 12345}, {"type": "Feature", "id": 7}], "type": "FeatureCollection"}')
+        reader_features = list(iter_geojson_features(fp, chunk_size=3))
+        self.assertEqual([feature['id'] for feature in reader_features], [12345, 7])
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.location = Location.objects.create(name='Place', address='Street', latitude=49.8, longitude=24.0)
+        caches['default'].clear()
+
+    def test_repeated_request_is_served_from_cache(self):
+        first = self.client.get('/api/locations/', {'min_rating': 0})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/api/locations/', {'min_rating': 0})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(first.json(), second.json())
+
+    def test_writes_invalidate_cached_responses(self):
+        self.client.get(f'/api/locations/{self.location.id}/')
+        Review.objects.create(location=self.location, user=self.user, rating=5)
+        response = self.client.get(f'/api/locations/{self.location.id}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['review_stats']['count'], 1)
+
+        self.client.get('/api/categories/')
+        category = Category.objects.create(name='Cafe')
+        self.assertEqual(self.client.get('/api/categories/').json(), [{'id': category.id, 'name': 'Cafe'}])
+
+        self.client.get('/api/locations/')
+        self.location.categories.add(category)
+        self.assertEqual(self.client.get('/api/locations/').json()[0]['categories'], [category.id])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/api/features/')['ETag']
+        response = self.client.get('/api/features/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        AccessibilityFeature.objects.create(name='Ramp')
+        self.assertEqual(self.client.get('/api/features/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class FacetIndexTests(APITestCase):
+    def setUp(self):
+        self.cafe = Category.objects.create(name='Cafe')
+        self.park = Category.objects.create(name='Park')
+        self.ramp = AccessibilityFeature.objects.create(name='Ramp')
+        self.lift = AccessibilityFeature.objects.create(name='Lift')
+        self.both = self.make('Both', [self.ramp, self.lift], [self.cafe])
+        self.ramp_only = self.make('Ramp only', [self.ramp], [self.park])
+        self.plain = self.make('Plain', [], [])
+
+    def make(self, name, features, categories):
+        location = Location.objects.create(name=name, address='Street', latitude=49.8, longitude=24.0)
+        location.accessibility_features.set(features)
+        location.categories.set(categories)
+        return location
+
+    def names(self, **params):
+        return sorted(item['name'] for item in self.client.get('/api/locations/', params).json())
+
+    def test_any_and_all_semantics(self):
+        self.assertEqual(self.names(accessibility_features=['Ramp', 'Lift']), ['Both', 'Ramp only'])
+        self.assertEqual(self.names(accessibility_features=['Ramp', 'Lift'], match='all'), ['Both'])
+        self.assertEqual(self.names(accessibility_features=['Ramp'], categories=['Park']), ['Ramp only'])
+        self.assertEqual(self.names(accessibility_levels=['limited_accessibility']), ['Both', 'Plain', 'Ramp only'])
+
+    def test_counts_for_current_selection(self):
+        data = self.client.get('/api/locations/facets/', {'categories': ['Cafe']}).json()
+        self.assertEqual(data['count'], 1)
+        features = {item['name']: item['count'] for item in data['facets']['accessibility_features']}
+        self.assertEqual(features, {'Ramp': 1, 'Lift': 1})
+        categories = {item['name']: item['count'] for item in data['facets']['categories']}
+        self.assertEqual(categories, {'Cafe': 1, 'Park': 1})
+
+    def test_signals_update_index_without_rebuild(self):
+        facet_index.current()
+        self.plain.accessibility_features.add(self.lift)
+        self.lift.locations.remove(self.both)
+        new = self.make('New', [self.lift], [])
+        with CaptureQueriesContext(connection) as ctx:
+            index = facet_index.current()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        lift = index.facet_bitmap('accessibility_features', ['Lift'])
+        self.assertEqual(sorted(bitmap_to_ids(lift)), sorted([self.plain.id, new.id]))
+
+    def test_untracked_writes_force_rebuild(self):
+        facet_index.current()
+        FeatureLink.objects.create(location_id=self.plain.id, accessibilityfeature_id=self.lift.id)
+        bump_version(Location)
+        self.assertEqual(self.names(accessibility_features=['Lift']), ['Both', 'Plain'])
+
+
+class ClusterTests(APITestCase):
+    def setUp(self):
+        for i in range(10):
+            Location.objects.create(name=f'Center {i}', address='Street', latitude=49.84 + i * 1e-4, longitude=24.03)
+        self.far = Location.objects.create(name='Far', address='Street', latitude=49.70, longitude=24.50)
+
+    def test_low_zoom_groups_nearby_points(self):
+        data = self.client.get('/api/locations/clusters/', {'bbox': '23,49,25,50.5', 'zoom': 8}).json()
+        clusters = sorted(data['clusters'], key=lambda cluster: cluster['count'])
+        self.assertEqual([cluster['count'] for cluster in clusters], [1, 10])
+        self.assertEqual(clusters[0]['location_id'], self.far.id)
+        self.assertEqual(clusters[1]['color'], '#FF0000')
+        self.assertAlmostEqual(clusters[1]['latitude'], 49.84045, places=4)
+
+    def test_memoized_until_locations_change(self):
+        params = {'bbox': '23,49,25,50.5', 'zoom': 8}
+        self.client.get('/api/locations/clusters/', params)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/locations/clusters/', params)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        Location.objects.create(name='New', address='Street', latitude=49.70, longitude=24.50)
+        counts = [c['count'] for c in self.client.get('/api/locations/clusters/', params).json()['clusters']]
+        self.assertEqual(sorted(counts), [2, 10])
+
+    def test_requires_valid_params(self):
+        self.assertEqual(self.client.get('/api/locations/clusters/', {'bbox': '23,49,25,50.5'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/locations/clusters/', {'bbox': '-180,-80,180,80', 'zoom': 12}).status_code, 400)
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.library = Location.objects.create(
+            name='City Library', address='Shevchenka Avenue 5', latitude=49.8, longitude=24.0,
+            description='Quiet reading rooms',
+        )
+        self.cafe = Location.objects.create(
+            name='Library Cafe', address='Market Square 1', latitude=49.8, longitude=24.0,
+        )
+        self.museum = Location.objects.create(name='Museum', address='Library street 2', latitude=49.8, longitude=24.0)
+
+    def names(self, query):
+        return [item['name'] for item in self.client.get('/api/locations/', {'q': query}).json()]
+
+    def test_ranked_by_field_weight(self):
+        self.assertEqual(self.names('library '), ['City Library', 'Library Cafe', 'Museum'])
+        self.assertEqual(self.names('library cafe '), ['Library Cafe'])
+
+    def test_prefix_matches_last_word(self):
+        self.assertEqual(self.names('libr'), ['City Library', 'Library Cafe', 'Museum'])
+        self.assertEqual(self.names('market sq'), ['Library Cafe'])
+        self.assertEqual(self.names('sq '), [])
+
+    def test_reviews_and_propositions_are_indexed_incrementally(self):
+        review = Review.objects.create(location=self.museum, user=self.user, rating=5, comment='Wheelchair friendly')
+        Proposition.objects.create(location=self.cafe, user=self.user, text='Needs a wheelchair ramp')
+        self.assertEqual(self.names('wheelchair'), ['Library Cafe', 'Museum'])
+        review.delete()
+        self.assertEqual(self.names('wheelchair'), ['Library Cafe'])
+        self.cafe.name = 'Bistro'
+        self.cafe.save()
+        self.assertEqual(self.names('bistro'), ['Bistro'])
+
+    def test_results_are_paged_by_rank(self):
+        from .pagination import LocationCursorPagination
+
+        first = self.client.get('/api/locations/', {'q': 'library', 'page_size': 2}).json()
+        self.assertEqual([item['name'] for item in first['results']], ['City Library', 'Library Cafe'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([item['name'] for item in second['results']], ['Museum'])
+        self.assertIsNone(second['next'])
+        # Unpaged searches return only the best matches.
+        with patch.object(LocationCursorPagination, 'max_page_size', 2):
+            self.assertEqual(self.names('libr'), ['City Library', 'Library Cafe'])
+
+    def test_suggest(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/locations/suggest/', {'q': 'Lib'}).json()
+        self.assertEqual([item['name'] for item in data], ['City Library', 'Library Cafe', 'Museum'])
+        self.assertLessEqual(len(ctx.captured_queries), 2)
+
+
+class BenchmarkBudgetTests(APITestCase):
+    def test_query_budgets(self):
+        from benchmarks.__main__ import BUDGETS
+        from benchmarks.runner import check_budgets, run
+        from benchmarks.seed import seed
+
+        users = seed(200, reviews_per_location=2)
+        with tempfile.TemporaryDirectory() as tiles, override_settings(TILE_CACHE_DIR=tiles):
+            results = run(200, users[0], iterations=1)
+        self.assertEqual(check_budgets(results, json.loads(BUDGETS.read_text()), 200, check_latency=False), [])
+
+
+class ProfilingMiddlewareTests(APITestCase):
+    def setUp(self):
+        metrics.reset()
+        self.user = get_user_model().objects.create_user(username='admin', password='pass', is_staff=True)
+        for i in range(3):
+            Location.objects.create(name=f'Place {i}', address='Street', latitude=49.8, longitude=24.0)
+
+    def profiled(self, **overrides):
+        return override_settings(
+            MIDDLEWARE=['locations.profiling.ProfilingMiddleware', *settings.MIDDLEWARE], **overrides,
+        )
+
+    def test_fingerprint_collapses_literals(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s,%s) AND name = \'x\' LIMIT 21'),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?',
+        )
+
+    def test_server_timing_and_metrics(self):
+        with self.profiled():
+            response = self.client.get('/api/locations/')
+            self.assertRegex(response['Server-Timing'], r'app;dur=[\d.]+, db;dur=[\d.]+, queries;desc="\d+"')
+            self.assertEqual(self.client.get('/api/_metrics/').status_code, 401)
+            self.client.force_authenticate(self.user)
+            response = self.client.get('/api/_metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('byteme_request_duration_seconds_count{view="location-list",method="GET"} 1', body)
+        self.assertIn('byteme_db_queries_total{view="location-list",method="GET"}', body)
+
+    def test_slow_requests_are_profiled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.profiled(PROFILING_SAMPLE_RATE=1, PROFILING_SLOW_MS=0, PROFILING_DIR=directory):
+                self.client.get('/api/locations/')
+            dumps = os.listdir(directory)
+        self.assertEqual(len(dumps), 1)
+        self.assertTrue(dumps[0].endswith('.prof'))
+        self.assertIn('location-list', dumps[0])
+
+
+class ImagePipelineTests(APITestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        overrides = override_settings(
+            MEDIA_ROOT=self.media.name, IMAGE_STORAGE='local',
+            # The worker thread has its own connection and can't see this test's transaction.
+            IMAGE_WORKER_ASYNC=False,
+            IMAGE_STAGING_DIR=os.path.join(self.media.name, 'staging'),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = get_user_model().objects.create_user(username='u', password='pass')
+        self.location = Location.objects.create(name='Place', address='Street', latitude=49.8, longitude=24.0)
+
+    def upload(self, name='photo.png', content_type='image/png'):
+        from io import BytesIO
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type=content_type)
+
+    def test_upload_is_processed_after_commit(self):
+        from PIL import Image
+
+        url = f'/api/locations/{self.location.pk}/image/'
+        self.assertEqual(self.client.post(url, {'image': self.upload()}).status_code, 401)
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'image': self.upload()})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['image_status'], 'pending')
+
+        self.location.refresh_from_db()
+        self.assertEqual(self.location.image_status, STATUS_READY)
+        for width in THUMBNAIL_WIDTHS:
+            name = self.location.thumbnails[f'{width}w'].removeprefix(settings.MEDIA_URL)
+            with Image.open(os.path.join(self.media.name, name)) as thumbnail:
+                self.assertEqual(thumbnail.width, width)
+        self.assertEqual(os.listdir(os.path.join(self.media.name, 'staging')), [])
+
+        item = self.client.get('/api/locations/').json()[0]
+        self.assertEqual(set(item['thumbnails']), {f'{width}w' for width in THUMBNAIL_WIDTHS})
+        detail = self.client.get(f'/api/locations/{self.location.pk}/').json()
+        self.assertEqual(detail['image_url'], self.location.thumbnails['original'])
+
+    def test_rejects_non_images(self):
+        self.client.force_authenticate(self.user)
+        upload = SimpleUploadedFile('notes.txt', b'hello', content_type='text/plain')
+        response = self.client.post(f'/api/locations/{self.location.pk}/image/', {'image': upload})
+        self.assertEqual(response.status_code, 400)
+        upload = SimpleUploadedFile('page.png', b'<script>alert(1)</script>', content_type='image/png')
+        response = self.client.post(f'/api/locations/{self.location.pk}/image/', {'image': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(os.path.exists(os.path.join(self.media.name, 'staging')))
+
+    def test_original_extension_follows_the_content(self):
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/locations/{self.location.pk}/image/',
+                {'image': self.upload(name='page.html', content_type='image/jpeg')},
+            )
+        self.assertEqual(response.status_code, 202)
+        self.location.refresh_from_db()
+        self.assertTrue(self.location.thumbnails['original'].endswith('.png'))
+
+    def test_broken_images_are_not_stored(self):
+        from .images import LocalImageStorage
+
+        path = os.path.join(self.media.name, 'broken.png')
+        with open(path, 'wb') as broken:
+            broken.write(self.upload().read()[:200])
+        with self.assertRaises(OSError):
+            LocalImageStorage().store(self.location.pk, path)
+        self.assertFalse(os.path.exists(os.path.join(self.media.name, 'locations')))
+
+    def test_local_storage_requires_pillow(self):
+        from django.core.exceptions import ImproperlyConfigured
+        from .images import LocalImageStorage, check_image_storage
+
+        with patch('locations.images.PILLOW_INSTALLED', False):
+            self.assertEqual([error.id for error in check_image_storage(None)], ['locations.E001'])
+            with self.assertRaises(ImproperlyConfigured):
+                LocalImageStorage().store(self.location.pk, __file__)
+        self.assertEqual(check_image_storage(None), [])
+
+
+class AsyncReadTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='u', password='pass')
+        self.cafe = Category.objects.create(name='Cafe')
+        ramp = AccessibilityFeature.objects.create(name='Ramp')
+        self.locations = []
+        for i in range(3):
+            location = Location.objects.create(name=f'Place {i}', address='Street', latitude=49.8 + i / 100, longitude=24.0)
+            location.categories.add(self.cafe)
+            location.accessibility_features.add(ramp)
+            self.locations.append(location)
+        for rating in (3, 5):
+            Review.objects.create(location=self.locations[0], user=self.user, rating=rating, comment='ok')
+        Proposition.objects.create(location=self.locations[0], user=self.user, text='More ramps')
+
+    async def test_matches_sync_endpoints(self):
+        for sync_path, async_path in [
+            ('/api/locations/', '/api/async/locations/'),
+            ('/api/locations/?bbox=23.9,49.79,24.1,49.815&categories=Cafe', '/api/async/locations/?bbox=23.9,49.79,24.1,49.815&categories=Cafe'),
+            (f'/api/locations/{self.locations[0].pk}/', f'/api/async/locations/{self.locations[0].pk}/'),
+            ('/api/categories/', '/api/async/categories/'),
+        ]:
+            expected = (await self.async_client.get(sync_path)).json()
+            response = await self.async_client.get(async_path)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected, async_path)
+
+    async def test_location_reviews(self):
+        response = await self.async_client.get(f'/api/async/locations/{self.locations[0].pk}/reviews/?limit=1')
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([review['rating'] for review in data['results']], [5])
+        self.assertEqual((await self.async_client.get('/api/async/locations/999/reviews/')).status_code, 404)
+        self.assertEqual((await self.async_client.get('/api/async/locations/999/')).status_code, 404)
+
+    async def test_invalid_filters(self):
+        response = await self.async_client.get('/api/async/locations/?bbox=1,2')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bbox', response.json())
+
+    async def test_radius_queries_are_capped(self):
+        from .pagination import LocationCursorPagination
+
+        path = '/api/locations/?near=49.8,24.0&radius_m=5000'
+        with patch.object(LocationCursorPagination, 'max_page_size', 2):
+            expected = (await self.async_client.get(path)).json()
+            data = (await self.async_client.get(path.replace('/api/', '/api/async/'))).json()
+        self.assertEqual([item['name'] for item in data], ['Place 0', 'Place 1'])
+        self.assertEqual(data, expected)
+
+    def test_middleware_chain_stays_async(self):
+        from django.core.handlers.asgi import ASGIHandler
+
+        # With DEBUG on, Django logs every sync-only middleware it has to wrap in a thread.
+        with self.profiled(), override_settings(DEBUG=True), self.assertNoLogs('django.request', level='DEBUG'):
+            ASGIHandler()
+
+    async def test_profiling_counts_async_queries(self):
+        with self.profiled():
+            response = await self.async_client.get(f'/api/async/locations/{self.locations[0].pk}/')
+        self.assertEqual(response.status_code, 200)
+        queries = int(re.search(r'queries;desc="(\d+)"', response['Server-Timing']).group(1))
+        self.assertGreater(queries, 0)
+
+    def profiled(self):
+        return override_settings(MIDDLEWARE=['locations.profiling.ProfilingMiddleware', *settings.MIDDLEWARE])
+
+
+class IndexUsageTests(APITestCase):
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise be read sequentially whatever the indexes.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, plan)
+
+    def test_reviews_of_a_location_by_date(self):
+        self.assertUsesIndex(Review.objects.filter(location_id=1).order_by('-created_at', '-id'), 'review_location_idx')
+        self.assertUsesIndex(
+            Proposition.objects.filter(location_id=1).order_by('-created_at', '-id'), 'proposition_location_idx',
+        )
+
+    def test_recent_reviews(self):
+        self.assertUsesIndex(Review.objects.order_by('-created_at', '-id')[:100], 'review_created_id_idx')
+
+    def test_coordinate_ranges(self):
+        queryset = Location.objects.filter(
+            latitude__gte=49.7, latitude__lte=49.9, longitude__gte=23.9, longitude__lte=24.1,
+        )
+        self.assertUsesIndex(queryset, 'location_lat_lng_idx')
+
+    def test_rating_filter(self):
+        # Location.rating has db_index=True, so its index carries a generated name.
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Location._meta.db_table)
+        index, = [
+            name for name, constraint in constraints.items()
+            if constraint['index'] and constraint['columns'] == ['rating']
+        ]
+        self.assertUsesIndex(Location.objects.filter(rating__gte=4), index)
+
+
+class NearestTests(APITestCase):
+    def setUp(self):
+        import random
+
+        nearest_index.reset()
+        self.ramp = AccessibilityFeature.objects.create(name='Ramp')
+        self.toilet = AccessibilityFeature.objects.create(name='Toilet')
+        rng = random.Random(7)
+        for i in range(300):
+            location = Location.objects.create(
+                name=f'Place {i}', address='Street',
+                latitude=49.8 + rng.uniform(-0.05, 0.05), longitude=24.0 + rng.uniform(-0.05, 0.05),
+            )
+            if i % 3 == 0:
+                location.accessibility_features.add(self.ramp)
+            if i % 5 == 0:
+                location.accessibility_features.add(self.toilet)
+
+    def brute_force(self, lat, lng, k, features=()):
+        from .spatial import haversine_m
+
+        queryset = Location.objects.all()
+        for feature in features:
+            queryset = queryset.filter(accessibility_features=feature)
+        distances = sorted((haversine_m(lat, lng, l.latitude, l.longitude), l.pk) for l in queryset)
+        return [pk for _, pk in distances[:k]]
+
+    def nearest(self, **params):
+        response = self.client.get('/api/locations/nearest/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_matches_brute_force(self):
+        for lat, lng in [(49.8, 24.0), (49.76, 23.96), (49.9, 24.1)]:
+            data = self.nearest(lat=lat, lng=lng, k=7)
+            self.assertEqual([item['id'] for item in data], self.brute_force(lat, lng, 7))
+            self.assertEqual([item['distance_m'] for item in data], sorted(item['distance_m'] for item in data))
+            data = self.nearest(lat=lat, lng=lng, k=4, features=f'{self.ramp.pk},{self.toilet.pk}')
+            self.assertEqual([item['id'] for item in data], self.brute_force(lat, lng, 4, [self.ramp, self.toilet]))
+
+    def test_incremental_updates(self):
+        self.nearest(lat=49.8, lng=24.0)
+        tree = nearest_index.tree
+        moved = Location.objects.get(name='Place 10')
+        moved.latitude, moved.longitude = 49.95, 24.2
+        moved.save()
+        added = Location.objects.create(name='New', address='Street', latitude=49.9501, longitude=24.2001)
+        self.assertEqual([item['id'] for item in self.nearest(lat=49.95, lng=24.2, k=2)], [moved.pk, added.pk])
+        moved.delete()
+        self.assertEqual([item['id'] for item in self.nearest(lat=49.95, lng=24.2, k=1)], [added.pk])
+        # Every change was applied in place rather than by reloading from the database.
+        self.assertIs(nearest_index.tree, tree)
+        version = nearest_index.version
+        added.rating_count = 1
+        added.save(update_fields=['rating_count'])
+        self.assertEqual(get_versions((LOCATION_COORDINATES,)), (version,))
+
+    def test_validation(self):
+        self.assertEqual(self.client.get('/api/locations/nearest/', {'lat': 1}).status_code, 400)
+        self.assertEqual(self.client.get('/api/locations/nearest/', {'lat': 1, 'lng': 2, 'k': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/api/locations/nearest/', {'lat': 1, 'lng': 2, 'features': 'x'}).status_code, 400)
+
+
+class BulkWriteTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.features = [AccessibilityFeature.objects.create(name=f'Feature {i}') for i in range(5)]
+        self.locations = [
+            Location.objects.create(name=f'Place {i}', address='Street', latitude=49.8, longitude=24.0)
+            for i in range(3)
+        ]
+        self.client.force_authenticate(self.user)
+
+    def pairs(self, location, features):
+        return [{'location': location.id, 'feature': feature.id} for feature in features]
+
+    def test_feature_links_added_and_removed_in_one_request(self):
+        first, second, _ = self.locations
+        first.accessibility_features.add(self.features[0])
+        facet_index.current()
+        response = self.client.post('/api/locations/features/bulk/', {
+            'add': self.pairs(first, self.features) + [{'location': 0, 'feature': self.features[0].id}],
+            'remove': self.pairs(first, self.features[:1]) + self.pairs(second, self.features[:1]),
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([result['status'] for result in data['results']], [
+            'unchanged', 'added', 'added', 'added', 'added', 'error', 'removed', 'unchanged',
+        ])
+        self.assertEqual((data['succeeded'], data['failed']), (7, 1))
+        linked = set(first.accessibility_features.values_list('pk', flat=True))
+        self.assertEqual(linked, {feature.id for feature in self.features[1:]})
+        self.assertEqual(list(first.accessibility_levels.values_list('name', flat=True)), ['limited_accessibility'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            index = facet_index.current()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(bitmap_to_ids(index.having_all('accessibility_features', [self.features[1].id])), [first.id])
+
+    def test_feature_links_use_fixed_number_of_queries(self):
+        def run(count):
+            add = [pair for location in self.locations[:count] for pair in self.pairs(location, self.features)]
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post('/api/locations/features/bulk/', {'add': add}, format='json')
+            return len(ctx.captured_queries)
+
+        small = run(1)
+        FeatureLink.objects.all().delete()
+        self.assertEqual(run(3), small)
+        self.assertEqual(FeatureLink.objects.count(), 15)
+        self.assertEqual(
+            list(self.locations[2].accessibility_levels.values_list('name', flat=True)), ['partially_accessible'],
+        )
+
+    def test_reviews_created_with_per_item_results(self):
+        first, second, _ = self.locations
+        response = self.client.post('/api/reviews/bulk/', [
+            {'location': first.id, 'rating': 5, 'comment': 'Wide doors'},
+            {'location': first.id, 'rating': 3},
+            {'location': 0, 'rating': 4},
+            {'location': second.id},
+            {'location': second.id, 'rating': 2},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'created', 'error', 'error', 'created'])
+        self.assertIn('rating', results[3]['errors'])
+        self.assertEqual(Review.objects.get(pk=results[0]['id']).user, self.user)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.rating_sum, first.rating_count), (8, 2))
+        self.assertEqual((second.rating_sum, second.rating_count), (2, 1))
+        self.assertEqual(self.client.get('/api/locations/', {'q': 'wide'}).json()[0]['id'], first.id)
+
+    def test_reviews_with_invalid_rating_fail_per_item(self):
+        first = self.locations[0]
+        response = self.client.post('/api/reviews/bulk/', [
+            {'location': first.id, 'rating': -3},
+            {'location': first.id, 'rating': 4},
+            {'location': first.id, 'rating': 6},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['error', 'created', 'error'])
+        self.assertIn('rating', results[0]['errors'])
+        first.refresh_from_db()
+        self.assertEqual((first.rating_sum, first.rating_count), (4, 1))
+
+    def test_propositions_require_authentication(self):
+        self.client.force_authenticate(None)
+        body = [{'location': self.locations[0].id, 'text': 'Add a ramp'}]
+        self.assertEqual(self.client.post('/api/propositions/bulk/', body, format='json').status_code, 401)
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/propositions/bulk/', body, format='json')
+        self.assertEqual(response.json()['succeeded'], 1)
+        self.assertEqual(Proposition.objects.get().text, 'Add a ramp')
+        self.assertEqual(self.client.post('/api/propositions/bulk/', {'text': 'x'}, format='json').status_code, 400)
+
+
+class CachedAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.location = Location.objects.create(name='Place', address='Street', latitude=49.8, longitude=24.0)
+        response = self.client.post('/api/token/', {'username': 'tester', 'password': 'secret'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.json()["access"]}')
+
+    def query_count(self, method='get', path='/api/reviews/', **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(path, **kwargs)
+        self.assertLess(response.status_code, 300)
+        return len(ctx.captured_queries)
+
+    def test_user_is_looked_up_once(self):
+        first = self.query_count()
+        self.assertEqual(self.query_count(), first - 1)
+        response = self.client.post('/api/reviews/', {'location': self.location.id, 'rating': 4})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Review.objects.get().user, self.user)
+        self.assertEqual(self.client.get('/api/users/profile/').json()['username'], 'tester')
+
+    def test_user_changes_take_effect_immediately(self):
+        self.query_count()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/reviews/').status_code, 401)
+
+    def test_password_change_revokes_tokens(self):
+        self.query_count()
+        self.user.set_password('changed')
+        self.user.save()
+        response = self.client.get('/api/reviews/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'password_changed')
+
+    def test_tokens_without_password_hash_need_the_grace_period(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        token = AccessToken.for_user(self.user)
+        del token['hash_password']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/reviews/').status_code, 401)
+        with override_settings(JWT_LEGACY_TOKENS_UNTIL=timezone.now() + timedelta(days=1)):
+            self.assertEqual(self.client.get('/api/reviews/').status_code, 200)
+        with override_settings(JWT_LEGACY_TOKENS_UNTIL=timezone.now() - timedelta(seconds=1)):
+            self.assertEqual(self.client.get('/api/reviews/').status_code, 401)
+
+    def test_changes_from_other_processes_apply_within_the_ttl(self):
+        self.query_count()
+        # A queryset update sends no signal, like a write made by another process.
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/reviews/').status_code, 200)
+        expired = time.monotonic() + user_cache.ttl
+        with patch('users.authentication.time.monotonic', return_value=expired):
+            self.assertEqual(self.client.get('/api/reviews/').status_code, 401)
+
+
+def read_message(data):
+    """Protobuf fields of ``data`` as {number: [values]}; length-delimited values stay bytes."""
+    fields, offset = {}, 0
+
+    def read_varint():
+        nonlocal offset
+        value = shift = 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                return value
+
+    while offset < len(data):
+        key = read_varint()
+        if key & 7 == 0:
+            value = read_varint()
+        elif key & 7 == 1:
+            value, offset = data[offset:offset + 8], offset + 8
+        else:
+            length = read_varint()
+            value, offset = data[offset:offset + length], offset + length
+        fields.setdefault(key >> 3, []).append(value)
+    return fields
+
+
+def _varints(data):
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            yield value
+            value = shift = 0
+
+
+def read_tile(data):
+    """{layer name: [(feature id, (x, y), properties)]} of an MVT tile."""
+    layers = {}
+    for layer_bytes in read_message(data).get(3, []):
+        layer = read_message(layer_bytes)
+        keys = [key.decode() for key in layer.get(3, [])]
+        values = []
+        for value in layer.get(4, []):
+            (number, (raw,)), = read_message(value).items()
+            values.append(raw.decode() if number == 1 else raw)
+        features = []
+        for feature_bytes in layer.get(2, []):
+            feature = read_message(feature_bytes)
+            tags = list(_varints(feature.get(2, [b''])[0]))
+            command, x, y = _varints(feature[4][0])
+            unzig = lambda value: (value >> 1) ^ -(value & 1)
+            features.append((
+                feature.get(1, [None])[0], (unzig(x), unzig(y)),
+                {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)},
+            ))
+        layers[layer[1][0].decode()] = features
+    return layers
+
+
+class VectorTileTests(APITestCase):
+    def setUp(self):
+        self.tile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tile_dir, ignore_errors=True)
+        override = override_settings(TILE_CACHE_DIR=self.tile_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.cafe = Category.objects.create(name='Cafe')
+        self.ramp = AccessibilityFeature.objects.create(name='Ramp')
+        self.location = Location.objects.create(name='Cafe Ramp', address='Street', latitude=49.84, longitude=24.03)
+        self.location.categories.add(self.cafe)
+        self.location.accessibility_features.add(self.ramp)
+        self.zoom = 14
+        self.x, self.y = int(mercator_x(24.03, self.zoom)), int(mercator_y(49.84, self.zoom))
+
+    def tile_url(self, zoom=None, x=None, y=None):
+        return f'/api/tiles/{zoom or self.zoom}/{self.x if x is None else x}/{self.y if y is None else y}.mvt'
+
+    def test_tile_carries_location_attributes(self):
+        response = self.client.get(self.tile_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        (feature_id, (x, y), properties), = read_tile(response.content)['locations']
+        self.assertEqual(feature_id, self.location.id)
+        self.assertTrue(0 <= x <= 4096 and 0 <= y <= 4096)
+        self.assertEqual(properties, {
+            'name': 'Cafe Ramp', 'level': 'limited_accessibility', 'level_color': '#FF0000',
+            'categories': str(self.cafe.id), 'features': str(self.ramp.id),
+        })
+        self.assertEqual(self.client.get(self.tile_url(x=self.x + 1)).content, b'')
+        self.assertEqual(self.client.get(self.tile_url(zoom=2, x=4)).status_code, 404)
+
+    def test_tiles_served_from_disk_until_locations_change(self):
+        etag = self.client.get(self.tile_url())['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.tile_url())
+        # Only the version lookup; the tile itself comes from disk.
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(self.client.get(self.tile_url(), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.location.name = 'Renamed'
+        self.location.save()
+        response = self.client.get(self.tile_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(read_tile(response.content)['locations'][0][2]['name'], 'Renamed')
+        self.assertEqual(len(os.listdir(self.tile_dir)), 1)
+
+    def test_empty_and_deep_tiles_are_not_cached(self):
+        self.assertEqual(self.client.get(self.tile_url(x=self.x + 1)).content, b'')
+        self.assertEqual(os.listdir(self.tile_dir), [])
+        with override_settings(TILE_CACHE_MAX_ZOOM=self.zoom - 1):
+            response = self.client.get(self.tile_url())
+        self.assertEqual(read_tile(response.content)['locations'][0][0], self.location.id)
+        self.assertEqual(os.listdir(self.tile_dir), [])
+
+        self.client.get(self.tile_url())
+        self.assertEqual(len(os.listdir(self.tile_dir)), 1)
+
+    def test_crowded_tiles_are_clustered(self):
+        Location.objects.bulk_create([
+            Location(name=f'Place {i}', address='Street', latitude=49.84, longitude=24.03) for i in range(30)
+        ])
+        bump_version(Location)
+        with patch('locations.tiles.MAX_TILE_POINTS', 10):
+            layers = read_tile(self.client.get(self.tile_url()).content)
+        self.assertEqual(list(layers), ['clusters'])
+        self.assertEqual(sum(properties['count'] for _, _, properties in layers['clusters']), 31)
+
+
+@override_settings(SYNC_OVERLAP_SECONDS=0)
+class DeltaSyncTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.ramp = AccessibilityFeature.objects.create(name='Ramp')
+        self.locations = [
+            Location.objects.create(name=f'Place {i}', address='Street', latitude=49.8, longitude=24.0)
+            for i in range(4)
+        ]
+        self.proposition = Proposition.objects.create(location=self.locations[3], user=self.user, text='Ramp')
+
+    def sync(self, since=None):
+        response = self.client.get('/api/sync/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, table):
+        return [row[0] for row in table['rows']]
+
+    def test_delta_contains_only_changes(self):
+        initial = self.sync()
+        self.assertTrue(initial['full'])
+        self.assertEqual(self.ids(initial['locations']), [location.id for location in self.locations])
+        self.assertEqual(initial['locations']['fields'][:2], ['id', 'name'])
+
+        unchanged = self.sync(initial['token'])
+        self.assertFalse(unchanged['full'])
+        self.assertEqual((unchanged['locations']['rows'], unchanged['propositions']['rows']), ([], []))
+
+        renamed, linked, reviewed, removed = self.locations
+        renamed.name = 'Renamed'
+        renamed.save()
+        linked.accessibility_features.add(self.ramp)
+        review = Review.objects.create(location=reviewed, user=self.user, rating=4)
+        removed_id = removed.id
+        removed.delete()
+
+        delta = self.sync(initial['token'])
+        self.assertEqual(self.ids(delta['locations']), [renamed.id, linked.id, reviewed.id])
+        rows = {row[0]: dict(zip(delta['locations']['fields'], row)) for row in delta['locations']['rows']}
+        self.assertEqual(rows[renamed.id]['name'], 'Renamed')
+        self.assertEqual(rows[linked.id]['accessibility_features'], [self.ramp.id])
+        self.assertEqual(rows[reviewed.id]['review_count'], 1)
+        self.assertEqual(delta['reviews']['rows'][0][:4], [review.id, reviewed.id, 'tester', 4])
+        self.assertEqual(delta['deleted'], {
+            'locations': [removed_id], 'reviews': [], 'propositions': [self.proposition.id],
+        })
+
+        self.ramp.locations.clear()
+        self.assertEqual(self.ids(self.sync(delta['token'])['locations']), [linked.id])
+
+    def test_stale_or_invalid_tokens(self):
+        self.assertTrue(self.sync('1000000')['full'])
+        self.assertEqual(self.client.get('/api/sync/', {'since': 'abc'}).status_code, 400)
+
+
+class ColumnarListTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        self.features = [AccessibilityFeature.objects.create(name=f'Feature {i}') for i in range(6)]
+        self.locations = [
+            Location.objects.create(name=f'Place {i}', address='Street', latitude=49.8 + i / 7, longitude=24.0 - i / 3)
+            for i in range(6)
+        ]
+        for i, location in enumerate(self.locations):
+            location.categories.set(self.categories[i % 3:])
+            location.accessibility_features.set(self.features[:i])
+            for rating in range(1, i % 4 + 1):
+                Review.objects.create(location=location, user=self.user, rating=rating)
+        caches['default'].clear()
+
+    def normalized(self, rows):
+        return sorted(
+            ({**row, 'categories': sorted(row['categories']),
+              'accessibility_features': sorted(row['accessibility_features'])} for row in rows),
+            key=lambda row: row['id'],
+        )
+
+    def test_columnar_decodes_to_json_list(self):
+        expected = self.normalized(self.client.get('/api/locations/').json())
+        by_format = self.client.get('/api/locations/', {'format': 'columnar'})
+        by_accept = self.client.get('/api/locations/', HTTP_ACCEPT=ColumnarRenderer.media_type)
+        for response in (by_format, by_accept):
+            self.assertEqual(response['Content-Type'], ColumnarRenderer.media_type)
+            payload = response.json()
+            self.assertEqual(payload['count'], 6)
+            self.assertEqual(self.normalized(decode_locations(payload)), expected)
+        self.assertEqual(len({level for level, _ in payload['levels']}), len(payload['levels']))
+        self.assertEqual(sorted(payload['category_ids']), sorted(c.id for c in self.categories))
+
+    def test_filters_and_pages(self):
+        expected = self.client.get('/api/locations/', {'min_rating': 2}).json()
+        payload = self.client.get('/api/locations/', {'min_rating': 2, 'format': 'columnar'}).json()
+        self.assertEqual(self.normalized(decode_locations(payload)), self.normalized(expected))
+
+        seen = []
+        url = '/api/locations/?format=columnar&page_size=4'
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(row['id'] for row in decode_locations(data['results']))
+            url = data['next']
+        self.assertEqual(seen, sorted(location.id for location in self.locations))
+
+    def test_list_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/locations/', {'format': 'columnar', 'page_size': 2})
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/api/locations/', {'format': 'columnar', 'page_size': 6})
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_cache_keeps_formats_apart(self):
+        self.client.get('/api/locations/', HTTP_ACCEPT=ColumnarRenderer.media_type)
+        response = self.client.get('/api/locations/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIsInstance(response.json(), list)
+        cached = self.client.get('/api/locations/', HTTP_ACCEPT=ColumnarRenderer.media_type)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.json()['format'], 'columnar')
+        self.assertIn('Accept', cached['Vary'])
+
+
+flaky_calls = []
+
+
+@job('tests.flaky', max_attempts=2, on_failure=lambda **payload: flaky_calls.append(('gave up', payload)))
+def flaky_job(fail):
+    flaky_calls.append(fail)
+    if fail:
+        raise RuntimeError('flaky')
+
+
+@job('tests.flaky_keyed', coalesce=True)
+def flaky_keyed_job(ids):
+    from .jobs import enqueue
+
+    flaky_calls.append(sorted(ids))
+    if len(flaky_calls) == 1:
+        # The same key is queued again while this run is in progress, then the run fails.
+        enqueue('tests.flaky_keyed', key='k', ids=[2])
+        raise RuntimeError('flaky')
+
+
+@override_settings(JOBS_ASYNC=True, JOB_RETRY_DELAY=60)
+class JobQueueTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.locations = [
+            Location.objects.create(name=f'Place {i}', address='Street', latitude=49.8, longitude=24.0)
+            for i in range(2)
+        ]
+        self.ramp = AccessibilityFeature.objects.create(name='Ramp')
+        Job.objects.all().delete()
+        flaky_calls.clear()
+
+    def names(self, query):
+        return [item['name'] for item in self.client.get('/api/locations/', {'q': query}).json()]
+
+    def test_writes_queue_deduplicated_jobs(self):
+        self.client.force_authenticate(self.user)
+        for comment in ('Wheelchair friendly', 'Wide wheelchair door'):
+            response = self.client.post('/api/reviews/', {
+                'location': self.locations[0].id, 'rating': 5, 'comment': comment,
+            })
+            self.assertEqual(response.status_code, 201)
+        Proposition.objects.create(location=self.locations[1], user=self.user, text='Wheelchair ramp please')
+        self.assertEqual(self.names('wheelchair'), [])
+        self.assertEqual(Job.objects.filter(name='locations.reindex').count(), 2)
+        self.assertEqual(Job.objects.get(key=str(self.locations[0].id)).payload, {'location_ids': [self.locations[0].id]})
+
+        # Both reindex jobs coalesce into one run.
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(self.names('wheelchair'), ['Place 0', 'Place 1'])
+        done = Job.objects.filter(status='done')
+        self.assertEqual(done.count(), 2)
+        self.assertTrue(all(finished.duration_ms is not None for finished in done))
+
+    def test_level_recompute_runs_in_worker(self):
+        features = [AccessibilityFeature.objects.create(name=f'Feature {i}') for i in range(5)]
+        self.locations[0].accessibility_features.set(features)
+        levels = self.locations[0].accessibility_levels
+        self.assertEqual(list(levels.values_list('name', flat=True)), ['limited_accessibility'])
+        call_command('run_worker', '--burst', stdout=StringIO())
+        self.assertEqual(list(levels.values_list('name', flat=True)), ['partially_accessible'])
+
+    def test_failed_jobs_retry_with_backoff_then_give_up(self):
+        from .jobs import enqueue
+
+        queued = enqueue('tests.flaky', fail=True)
+        self.assertEqual(run_pending(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('queued', 1))
+        self.assertIn('RuntimeError: flaky', queued.last_error)
+        self.assertGreaterEqual((queued.run_after - queued.created_at).total_seconds(), 59)
+        # Not due yet.
+        self.assertEqual(run_pending(), 0)
+
+        Job.objects.filter(pk=queued.pk).update(run_after=queued.created_at)
+        self.assertEqual(run_pending(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertEqual(flaky_calls, [True, True, ('gave up', {'fail': True})])
+
+    @override_settings(JOB_TIMEOUT=0)
+    def test_jobs_of_lost_workers_are_requeued(self):
+        from .jobs import enqueue
+
+        queued = enqueue('tests.flaky', fail=False)
+        Job.objects.filter(pk=queued.pk).update(status='running', claimed_by='gone', locked_at=queued.created_at)
+        self.assertEqual(run_pending(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('done', 1))
+        self.assertEqual(flaky_calls, [False])
+
+    def test_retry_merges_into_job_queued_meanwhile(self):
+        from .jobs import enqueue
+
+        enqueue('tests.flaky_keyed', key='k', ids=[1])
+        self.assertEqual(run_pending(limit=1), 1)
+        self.assertFalse(Job.objects.filter(status='running').exists())
+        queued = Job.objects.get(status='queued')
+        self.assertEqual((queued.key, sorted(queued.payload['ids'])), ('k', [1, 2]))
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(flaky_calls, [[1], [1, 2]])
+
+    @override_settings(JOB_TIMEOUT=0)
+    def test_stale_job_merges_into_job_queued_meanwhile(self):
+        from .jobs import enqueue, requeue_stale
+
+        stale = enqueue('tests.flaky_keyed', key='k', ids=[1])
+        Job.objects.filter(pk=stale.pk).update(status='running', claimed_by='gone', locked_at=stale.created_at)
+        queued = enqueue('tests.flaky_keyed', key='k', ids=[3])
+        self.assertEqual(requeue_stale(), 1)
+        self.assertFalse(Job.objects.filter(pk=stale.pk).exists())
+        queued.refresh_from_db()
+        self.assertEqual(sorted(queued.payload['ids']), [1, 3])
+
+
+class CoverageAnalyticsTests(APITestCase):
+    params = {'bbox': '23,49,25,51', 'resolution': 0.5}
+
+    def setUp(self):
+        coverage_index.reset()
+        self.user = get_user_model().objects.create_user(username='tester', password='secret')
+        self.ramp = AccessibilityFeature.objects.create(name='Ramp')
+        self.toilet = AccessibilityFeature.objects.create(name='Toilet')
+        self.locations = [
+            Location.objects.create(
+                name=f'Place {i}', address='Street', latitude=49.1 + (i % 4) * 0.4, longitude=23.2 + (i % 3) * 0.6,
+            )
+            for i in range(12)
+        ]
+        for location in self.locations[::2]:
+            location.accessibility_features.add(self.ramp)
+        self.locations[0].accessibility_features.add(self.toilet)
+        Review.objects.create(location=self.locations[0], user=self.user, rating=5)
+        Review.objects.create(location=self.locations[3], user=self.user, rating=2)
+
+    def coverage(self):
+        response = self.client.get('/api/analytics/coverage/', self.params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def expected(self):
+        import math
+
+        cells = {}
+        for location in Location.objects.prefetch_related('accessibility_features', 'accessibility_levels'):
+            key = (math.floor(location.latitude / 0.5), math.floor(location.longitude / 0.5))
+            cell = cells.setdefault(key, {'count': 0, 'levels': {}, 'features': {}, 'reviews': 0, 'sum': 0})
+            cell['count'] += 1
+            for level in location.accessibility_levels.all():
+                cell['levels'][level.name] = cell['levels'].get(level.name, 0) + 1
+            for feature in location.accessibility_features.all():
+                cell['features'][str(feature.pk)] = cell['features'].get(str(feature.pk), 0) + 1
+            cell['reviews'] += location.rating_count
+            cell['sum'] += location.rating_sum
+        return {
+            key: (
+                cell['count'], cell['levels'],
+                {pk: count / cell['count'] for pk, count in cell['features'].items()},
+                cell['reviews'], cell['sum'] / cell['reviews'] if cell['reviews'] else None,
+            )
+            for key, cell in cells.items()
+        }
+
+    def assertMatchesDatabase(self, data):
+        actual = {
+            (cell['row'], cell['col']): (
+                cell['count'], {name: count for name, count in cell['levels'].items() if count},
+                cell['features'], cell['review_count'], cell['rating_average'],
+            )
+            for cell in data['cells']
+        }
+        self.assertEqual(actual, self.expected())
+
+    def test_cells_match_database(self):
+        data = self.coverage()
+        self.assertMatchesDatabase(data)
+        self.assertEqual(data['features'], {str(self.ramp.pk): 'Ramp', str(self.toilet.pk): 'Toilet'})
+        first = next(cell for cell in data['cells'] if (cell['row'], cell['col']) == (98, 46))
+        self.assertEqual(first['bounds'], [23.0, 49.0, 23.5, 49.5])
+        self.assertEqual(first['rating_average'], 5)
+
+    def test_refreshed_incrementally(self):
+        self.coverage()
+        ids = coverage_index.ids
+        moved, linked, reviewed, removed = self.locations[:4]
+        moved.latitude, moved.longitude = 50.9, 24.9
+        moved.save()
+        linked.accessibility_features.add(self.toilet)
+        Review.objects.create(location=reviewed, user=self.user, rating=4)
+        removed.delete()
+        Location.objects.create(name='New', address='Street', latitude=50.6, longitude=23.1)
+        self.assertMatchesDatabase(self.coverage())
+        # Every change was patched into the loaded columns.
+        self.assertIs(coverage_index.ids, ids)
+
+    def test_not_modified_until_locations_change(self):
+        response = self.client.get('/api/analytics/coverage/', self.params)
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get('/api/analytics/coverage/', self.params, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        Review.objects.create(location=self.locations[1], user=self.user, rating=3)
+        self.assertEqual(
+            self.client.get('/api/analytics/coverage/', self.params, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            200,
+        )
+
+    def test_validation(self):
+        url = '/api/analytics/coverage/'
+        self.assertEqual(self.client.get(url, {'resolution': 1}).status_code, 400)
+        for resolution in (0, -1, 1e-320, 'nan', 'inf', 181):
+            self.assertEqual(self.client.get(url, {'bbox': '23,49,25,51', 'resolution': resolution}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'bbox': '-180,-90,180,90', 'resolution': 0.1}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'bbox': '-180,-90,180,90', 'resolution': 10}).status_code, 200)
+
+
+class StartupTests(APITestCase):
+    @skipIf(not apps.is_installed('drf_spectacular'), 'Docs are not mounted in byteme.settings_api')
+    def test_docs_load_on_first_request(self):
+        response = self.client.get('/api/schema/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/api/locations/', response.json()['paths'])
+
+    def test_import_tree_is_attributed_to_apps(self):
+        from .management.commands.import_times import attribute, parse_import_tree
+
+        lines = [
+            'import time: self [us] | cumulative | imported package',
+            'import time:        50 |         50 |     yaml',
+            'import time:        30 |         80 |   drf_spectacular.views',
+            'import time:        20 |        100 | drf_spectacular',
+            'import time:        40 |         40 |   yaml.nodes',
+            'import time:        10 |         50 | locations.models',
+        ]
+        totals = attribute(parse_import_tree(lines), ['drf_spectacular', 'locations'], 'python')
+        self.assertEqual(totals, {'drf_spectacular': 100, 'locations': 50})
+
+    def test_import_times_command(self):
+        out = StringIO()
+        call_command('import_times', '--profile', 'byteme.settings_api', '--repeat', '1', stdout=out)
+        report = out.getvalue()
+        self.assertIn('byteme.settings_api:', report)
+        self.assertIn('locations', report)
+        self.assertNotIn('drf_spectacular', report)
@@ -0,0 +1,59 @@
+import re
+import unicodedata
+from collections import Counter
+
+MAX_TERM_LENGTH = 64
+MIN_TERM_LENGTH = 2
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has in is it of on or the to with'.split()
+)
+
+# How much one occurrence of a term counts towards a location's relevance.
+FIELD_WEIGHTS = {
+    'name': 10,
+    'address': 4,
+    'description': 2,
+    'review': 1,
+    'proposition': 1,
+}
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text):
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall(normalize(text))
+        if len(token) >= MIN_TERM_LENGTH and token not in STOPWORDS
+    ]
+
+
+def term_weights(fields):
+    """Sum of field weights per term for an iterable of (field, text) pairs."""
+    weights = Counter()
+    for field, text in fields:
+        weight = FIELD_WEIGHTS[field]
+        for token in tokenize(text):
+            weights[token] += weight
+    return weights
+
+
+def parse_query(query):
+    """Split a search box query into (exact terms, prefix term).
+
+    The last word is treated as a prefix while the user is still typing it,
+    i.e. unless the query ends with whitespace.
+    """
+    words = TOKEN_RE.findall(normalize(query))
+    prefix = None
+    if words and not query[-1:].isspace():
+        prefix = words.pop()[:MAX_TERM_LENGTH]
+    exact = [
+        word[:MAX_TERM_LENGTH] for word in words
+        if len(word) >= MIN_TERM_LENGTH and word not in STOPWORDS
+    ]
+    return list(dict.fromkeys(exact)), prefix
@@ -0,0 +1,144 @@
+import logging
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+
+from .clusters import mercator_x, mercator_y, tile_bounds, tile_clusters
+from .levels import CategoryLink, FeatureLink
+from .models import ACCESSIBILITY_LEVEL_COLORS, Location
+from .mvt import EXTENT, PointLayer, encode_tile
+from .snapshot import LEVEL_NAMES, get_snapshot
+
+logger = logging.getLogger(__name__)
+
+MAX_TILE_ZOOM = 20
+# Tiles with more locations than this get one point per cluster instead.
+MAX_TILE_POINTS = 2000
+CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+
+
+def tile_positions(snapshot, zoom, x, y):
+    """Snapshot positions of the locations in a tile; points on a shared edge go to one tile only."""
+    positions = []
+    latitudes, longitudes = snapshot.latitudes, snapshot.longitudes
+    for position in snapshot.in_bbox(*tile_bounds(zoom, x, y)):
+        if int(mercator_x(longitudes[position], zoom)) == x and int(mercator_y(latitudes[position], zoom)) == y:
+            positions.append(position)
+    return positions
+
+
+def to_tile(latitude, longitude, zoom, x, y):
+    return (
+        round((mercator_x(longitude, zoom) - x) * EXTENT),
+        round((mercator_y(latitude, zoom) - y) * EXTENT),
+    )
+
+
+def joined_ids(ids):
+    # MVT values are scalars; lists travel as comma-separated ids.
+    return ','.join(str(pk) for pk in sorted(ids)) if ids else None
+
+
+def location_layer(snapshot, positions, zoom, x, y):
+    ids = [snapshot.ids[position] for position in positions]
+    names = dict(Location.objects.filter(pk__in=ids).values_list('pk', 'name'))
+    categories, features = {}, {}
+    for location_id, category_id in CategoryLink.objects.filter(location_id__in=ids).values_list(
+        'location_id', 'category_id'
+    ):
+        categories.setdefault(location_id, []).append(category_id)
+    for location_id, feature_id in FeatureLink.objects.filter(location_id__in=ids).values_list(
+        'location_id', 'accessibilityfeature_id'
+    ):
+        features.setdefault(location_id, []).append(feature_id)
+
+    layer = PointLayer('locations')
+    for position, pk in zip(positions, ids):
+        if pk not in names:
+            # Deleted since the snapshot was taken.
+            continue
+        level = LEVEL_NAMES[snapshot.levels[position]] if snapshot.levels[position] >= 0 else None
+        layer.add(*to_tile(snapshot.latitudes[position], snapshot.longitudes[position], zoom, x, y), {
+            'name': names[pk],
+            'level': level,
+            'level_color': ACCESSIBILITY_LEVEL_COLORS.get(level),
+            'categories': joined_ids(categories.get(pk)),
+            'features': joined_ids(features.get(pk)),
+        }, feature_id=pk)
+    return layer
+
+
+def cluster_layer(snapshot, zoom, x, y):
+    layer = PointLayer('clusters')
+    for cluster in tile_clusters(snapshot, zoom, x, y):
+        layer.add(*to_tile(cluster['latitude'], cluster['longitude'], zoom, x, y), {
+            'count': cluster['count'],
+            'level': cluster['level'],
+            'level_color': cluster['color'],
+            'location_id': cluster['location_id'],
+        })
+    return layer
+
+
+def render_tile(snapshot, zoom, x, y):
+    positions = tile_positions(snapshot, zoom, x, y)
+    if len(positions) > MAX_TILE_POINTS:
+        return encode_tile([cluster_layer(snapshot, zoom, x, y)])
+    return encode_tile([location_layer(snapshot, positions, zoom, x, y)])
+
+
+def tile_path(version, zoom, x, y):
+    return os.path.join(settings.TILE_CACHE_DIR, str(version), str(zoom), str(x), f'{y}.mvt')
+
+
+def drop_stale_versions(version):
+    try:
+        entries = os.listdir(settings.TILE_CACHE_DIR)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry != str(version):
+            shutil.rmtree(os.path.join(settings.TILE_CACHE_DIR, entry), ignore_errors=True)
+
+
+def cache_tile(version, zoom, x, y, data):
+    path = tile_path(version, zoom, x, y)
+    version_dir = os.path.join(settings.TILE_CACHE_DIR, str(version))
+    if not os.path.isdir(version_dir):
+        drop_stale_versions(version)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so concurrent readers never see half a tile.
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(handle, 'wb') as temp:
+            temp.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        logger.warning('Could not cache tile %s/%s/%s', zoom, x, y, exc_info=True)
+
+
+def get_tile(version, zoom, x, y):
+    """(Location version, tile bytes), read from the disk cache or rendered into it.
+
+    Cached tiles live under a directory per Location version, so any change
+    to a location or its links moves readers to a fresh directory; the first
+    write for a new version removes the old ones. A cache hit costs no queries.
+    Only tiles with locations in them, up to ``TILE_CACHE_MAX_ZOOM``, are
+    written, so a version holds at most one file per location and cached
+    zoom however many empty tiles clients ask for.
+    """
+    cacheable = zoom <= settings.TILE_CACHE_MAX_ZOOM
+    if cacheable:
+        try:
+            with open(tile_path(version, zoom, x, y), 'rb') as cached:
+                return version, cached.read()
+        except FileNotFoundError:
+            pass
+
+    snapshot = get_snapshot()
+    data = render_tile(snapshot, zoom, x, y)
+    if cacheable and data:
+        cache_tile(snapshot.version, zoom, x, y, data)
+    return snapshot.version, data
@@ -1,5 +1,7 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import LocationViewSet, AccessibilityFeatureViewSet, ReviewViewSet, CategoryViewSet, AccessibilityLevelViewSet, PropositionViewSet
+from . import async_views
+from .views import coverage_view, location_tile, metrics_view, sync_view, LocationViewSet, AccessibilityFeatureViewSet, ReviewViewSet, CategoryViewSet, AccessibilityLevelViewSet, PropositionViewSet
 
 router = DefaultRouter()
 router.register('locations', LocationViewSet)
@@ -12,4 +14,13 @@ router.register('propositions', PropositionViewSet)
 
 
 
-urlpatterns = router.urls
+urlpatterns = [
+    path('_metrics/', metrics_view, name='metrics'),
+    path('async/locations/', async_views.location_list, name='async-location-list'),
+    path('async/locations/<int:pk>/', async_views.location_detail, name='async-location-detail'),
+    path('async/locations/<int:pk>/reviews/', async_views.location_reviews, name='async-location-reviews'),
+    path('async/categories/', async_views.category_list, name='async-category-list'),
+    path('sync/', sync_view, name='sync'),
+    path('analytics/coverage/', coverage_view, name='analytics-coverage'),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', location_tile, name='location-tile'),
+] + router.urls
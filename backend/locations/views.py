@@ -3,35 +3,173 @@ from rest_framework import permissions
 from rest_framework import viewsets
 from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly
 from .models import Location, AccessibilityFeature, Review, Category, AccessibilityLevel, Proposition
-from .serializers import LocationSerializer, AccessibilityFeatureSerializer, ReviewSerializer, CategorySerializer, AccessibilityLevelSerializer, PropositionSerializer
+from .serializers import LocationSerializer, LocationListSerializer, AccessibilityFeatureSerializer, ReviewSerializer, CategorySerializer, AccessibilityLevelSerializer, PropositionSerializer
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from .models import Location, AccessibilityFeature
+from .filters import facet_selection, filter_locations, parse_bbox, parse_floats
+from .pagination import CreatedAtCursorPagination, LocationCursorPagination, LocationReviewPagination, cap_ranked
+from .streaming import NDJSONStreamMixin
+from .columnar import ColumnarListMixin, ColumnarRenderer
+from .cache import SEARCH_INDEX, CachedResponseMixin, get_versions, if_none_match
+from .clusters import MAX_TILES, MAX_ZOOM, clusters_for_bbox, tile_count
+from .snapshot import get_snapshot
+from .coverage import (
+    DEFAULT_RESOLUTION, DEPENDENCIES as COVERAGE_DEPENDENCIES, MAX_CELLS, MAX_RESOLUTION, MIN_RESOLUTION, cell_count,
+    coverage_index,
+)
+from .search import suggest
+from .facets import bitmap_contains, facet_index
+from .nearest import nearest_index
+from .sync import changes_since
+from .tiles import CONTENT_TYPE as TILE_CONTENT_TYPE, MAX_TILE_ZOOM, get_tile
+from .profiling import metrics
+from .images import IMAGE_EXTENSIONS, PILLOW_INSTALLED, enqueue_image, image_format
+from .bulk import apply_feature_links, create_propositions, create_reviews
+from django.conf import settings
+from rest_framework.parsers import MultiPartParser
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified
+from django.shortcuts import get_object_or_404
+from rest_framework.permissions import IsAdminUser
+from rest_framework.settings import api_settings
 
 
-class LocationViewSet(viewsets.ModelViewSet):
+DEFAULT_NEAREST = 5
+MAX_NEAREST = 100
+
+
+class LocationViewSet(CachedResponseMixin, NDJSONStreamMixin, ColumnarListMixin, viewsets.ModelViewSet):
     queryset = Location.objects.all()
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarRenderer]
     serializer_class = LocationSerializer
+    pagination_class = LocationCursorPagination
+    cache_dependencies = (Location, Review, Proposition, Category, AccessibilityFeature, AccessibilityLevel, SEARCH_INDEX)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list' and not self.paginator.page_requested(self.request):
+            # Unpaged searches and radius queries keep returning a bare list,
+            # but only of the best ranked or nearest matches.
+            queryset = cap_ranked(queryset, self.request.query_params, self.paginator.max_page_size)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return LocationListSerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
         queryset = super().get_queryset()
 
-        category_names = self.request.query_params.getlist('categories')
-        if category_names:
-            queryset = queryset.filter(categories__name__in=category_names).distinct()
+        if self.action == 'list':
+            queryset = queryset.prefetch_related(
+                'categories', 'accessibility_features', 'accessibility_levels',
+            )
+        else:
+            queryset = queryset.select_related('review_stats').prefetch_related(
+                'categories', 'accessibility_features', 'accessibility_levels', 'propositions__user',
+            )
 
-        feature_names = self.request.query_params.getlist('accessibility_features')
-        if feature_names:
-            queryset = queryset.filter(accessibility_features__name__in=feature_names).distinct()
+        return filter_locations(queryset, self.request.query_params)
 
-        min_rating = self.request.query_params.get('min_rating')
-        if min_rating is not None:
-            queryset = queryset.filter(rating__gte=min_rating)
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        selection, match = facet_selection(request.query_params)
+        count, facets = facet_index.current().counts(selection, match)
+        return Response({'match': match, 'count': count, 'facets': facets})
 
-        return queryset
+    @action(detail=True, methods=['get'])
+    def reviews(self, request, pk=None):
+        return self.cached_response(self.review_page, request, pk=pk)
+
+    def review_page(self, request, pk=None):
+        location = get_object_or_404(Location.objects.only('pk'), pk=pk)
+        paginator = LocationReviewPagination()
+        page = paginator.paginate_queryset(
+            Review.objects.filter(location=location).select_related('user'), request, view=self,
+        )
+        return paginator.get_paginated_response(ReviewSerializer(page, many=True).data)
+
+    @action(detail=True, methods=['post'], parser_classes=[MultiPartParser], permission_classes=[IsAuthenticated])
+    def image(self, request, pk=None):
+        upload = request.FILES.get('image')
+        if upload is None:
+            raise ValidationError({'image': 'No file was submitted.'})
+        if not (upload.content_type or '').startswith('image/'):
+            raise ValidationError({'image': 'Expected an image.'})
+        if upload.size > settings.IMAGE_MAX_BYTES:
+            raise ValidationError({'image': f'Larger than {settings.IMAGE_MAX_BYTES} bytes.'})
+        # The declared type is the client's word; check what the bytes decode as.
+        if PILLOW_INSTALLED and image_format(upload) is None:
+            raise ValidationError({'image': f'Expected a {", ".join(IMAGE_EXTENSIONS)} image.'})
+        location = self.get_object()
+        enqueue_image(location, upload)
+        return Response({'id': location.pk, 'image_status': location.image_status}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'], url_path='features/bulk', permission_classes=[IsAuthenticated])
+    def bulk_features(self, request):
+        data = request.data if isinstance(request.data, dict) else {}
+        add, remove = data.get('add', []), data.get('remove', [])
+        if not data or not isinstance(add, list) or not isinstance(remove, list):
+            raise ValidationError('Expected "add" and "remove" lists.')
+        return bulk_response(apply_feature_links(add, remove))
+
+    @action(detail=False, methods=['get'])
+    def nearest(self, request):
+        params = request.query_params
+        if 'lat' not in params or 'lng' not in params:
+            raise ValidationError('Both lat and lng are required.')
+        lat, = parse_floats(params['lat'], 1, 'lat')
+        lng, = parse_floats(params['lng'], 1, 'lng')
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValidationError({'lat': 'Coordinates out of range.'})
+        try:
+            k = int(params.get('k', DEFAULT_NEAREST))
+            features = [int(pk) for pk in params.get('features', '').split(',') if pk.strip()]
+        except ValueError:
+            raise ValidationError('k and features must be integers.')
+        if not 1 <= k <= MAX_NEAREST:
+            raise ValidationError({'k': f'Must be between 1 and {MAX_NEAREST}.'})
+
+        accept = None
+        if features:
+            accept = bitmap_contains(facet_index.current().having_all('accessibility_features', features))
+        found = nearest_index.current().nearest(lat, lng, k, accept)
+
+        locations = Location.objects.filter(pk__in=[pk for pk, _, _, _ in found]).prefetch_related(
+            'categories', 'accessibility_features', 'accessibility_levels',
+        ).in_bulk()
+        # A location deleted since the index was read has no row left; skip it.
+        found = [(locations[pk], distance_m) for pk, _, _, distance_m in found if pk in locations]
+        data = LocationListSerializer([location for location, _ in found], many=True).data
+        for item, (_, distance_m) in zip(data, found):
+            item['distance_m'] = round(distance_m, 1)
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        return Response(suggest(request.query_params.get('q', '')))
+
+    @action(detail=False, methods=['get'])
+    def clusters(self, request):
+        params = request.query_params
+        if 'bbox' not in params or 'zoom' not in params:
+            raise ValidationError('Both bbox and zoom are required.')
+        south, west, north, east = parse_bbox(params['bbox'])
+        try:
+            zoom = int(params['zoom'])
+        except ValueError:
+            raise ValidationError({'zoom': 'Expected an integer.'})
+        if not 0 <= zoom <= MAX_ZOOM:
+            raise ValidationError({'zoom': f'Must be between 0 and {MAX_ZOOM}.'})
+        if tile_count(south, west, north, east, zoom) > MAX_TILES:
+            raise ValidationError({'bbox': 'Too large for this zoom level.'})
+        clusters = clusters_for_bbox(get_snapshot(), south, west, north, east, zoom)
+        return Response({'zoom': zoom, 'clusters': clusters})
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -59,30 +197,92 @@ def remove_feature_from_location(request, location_id, feature_id):
     except AccessibilityFeature.DoesNotExist:
         return Response({"error": "Feature not found"}, status=status.HTTP_404_NOT_FOUND)
 
-class AccessibilityFeatureViewSet(viewsets.ModelViewSet): 
+class AccessibilityFeatureViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = AccessibilityFeature.objects.all()
     serializer_class = AccessibilityFeatureSerializer
+    cache_dependencies = (AccessibilityFeature,)
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_dependencies = (Category,)
 
-class AccessibilityLevelViewSet(viewsets.ReadOnlyModelViewSet):
+class AccessibilityLevelViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = AccessibilityLevel.objects.all()
     serializer_class = AccessibilityLevelSerializer
+    cache_dependencies = (AccessibilityLevel,)
 
-class ReviewViewSet(viewsets.ModelViewSet):
-    queryset = Review.objects.all()
+class ReviewViewSet(NDJSONStreamMixin, viewsets.ModelViewSet):
+    queryset = Review.objects.select_related('user')
     serializer_class = ReviewSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class PropositionViewSet(viewsets.ModelViewSet):
-    queryset = Proposition.objects.all()
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        return bulk_response(create_reviews(request.user, request.data))
+
+class PropositionViewSet(NDJSONStreamMixin, viewsets.ModelViewSet):
+    queryset = Proposition.objects.select_related('user')
     serializer_class = PropositionSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
\ No newline at end of file
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        return bulk_response(create_propositions(request.user, request.data))
+
+def bulk_response(results):
+    failed = sum(result['status'] == 'error' for result in results)
+    return Response({'succeeded': len(results) - failed, 'failed': failed, 'results': results})
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@api_view(["GET"])
+def sync_view(request):
+    return Response(changes_since(request.query_params.get('since')))
+
+def location_tile(request, z, x, y):
+    """Mapbox Vector Tile of the locations in one slippy-map tile."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    if not (0 <= z <= MAX_TILE_ZOOM and x < 1 << z and y < 1 << z):
+        raise Http404
+    version = get_versions((Location,))[0]
+    headers = {'ETag': f'"tile-{version}-{z}-{x}-{y}"', 'Cache-Control': 'no-cache'}
+    if if_none_match(request, headers['ETag']):
+        return HttpResponseNotModified(headers=headers)
+    version, data = get_tile(version, z, x, y)
+    headers['ETag'] = f'"tile-{version}-{z}-{x}-{y}"'
+    return HttpResponse(data, content_type=TILE_CONTENT_TYPE, headers=headers)
+
+@api_view(["GET"])
+def coverage_view(request):
+    """Per-cell counts by accessibility level, feature presence rates and average rating inside a bbox."""
+    params = request.query_params
+    if 'bbox' not in params:
+        raise ValidationError('bbox is required.')
+    south, west, north, east = parse_bbox(params['bbox'])
+    resolution, = parse_floats(params.get('resolution', str(DEFAULT_RESOLUTION)), 1, 'resolution')
+    # Also rules out nan and inf, and keeps bbox / resolution finite.
+    if not MIN_RESOLUTION <= resolution <= MAX_RESOLUTION:
+        raise ValidationError({'resolution': f'Must be between {MIN_RESOLUTION} and {MAX_RESOLUTION} degrees.'})
+    if cell_count(south, west, north, east, resolution) > MAX_CELLS:
+        raise ValidationError({'resolution': f'Too fine for this bbox; at most {MAX_CELLS} cells are allowed.'})
+    # No commas: If-None-Match lists are comma-separated.
+    query = f'{west}:{south}:{east}:{north}:{resolution}'
+    versions = get_versions(COVERAGE_DEPENDENCIES)
+    headers = {'ETag': f'"coverage-{"-".join(map(str, versions))}-{query}"', 'Cache-Control': 'no-cache'}
+    if if_none_match(request, headers['ETag']):
+        return HttpResponseNotModified(headers=headers)
+    report = coverage_index.coverage(south, west, north, east, resolution, versions)
+    return Response({'bbox': [west, south, east, north], 'resolution': resolution, **report}, headers=headers)
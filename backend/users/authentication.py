@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import CustomUser
+
+# Enough to authenticate and authorize a request; anything else is loaded on first access.
+# Listed in model order, which is what Model.from_db expects for a partial row.
+USER_FIELDS = tuple(
+    field.attname for field in CustomUser._meta.concrete_fields
+    if field.attname in ('id', 'username', 'is_special_user', 'is_active', 'is_staff', 'is_superuser')
+)
+
+
+class UserCache:
+    """Small LRU of user rows keyed by id, each entry trusted for ``ttl`` seconds.
+
+    Saves and deletes in this process evict the user straight away; changes
+    made by other processes (deactivation, staff flags, a new password) show
+    up once the entry expires, so they are stale for at most ``ttl``.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, row):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, row)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def evict(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+
+
+def load_user_row(user_id):
+    """(field values, password digest or None) for the user, or None if there is no such user."""
+    fields = USER_FIELDS + ('password',) if api_settings.CHECK_REVOKE_TOKEN else USER_FIELDS
+    values = CustomUser.objects.filter(pk=user_id).values_list(*fields).first()
+    if values is None:
+        return None
+    if api_settings.CHECK_REVOKE_TOKEN:
+        return values[:-1], get_md5_hash_password(values[-1])
+    return values, None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that serves users from ``user_cache`` instead of a query per request.
+
+    ``request.user`` is a real ``CustomUser`` with only ``USER_FIELDS`` loaded,
+    so it can still be assigned to foreign keys; other fields are deferred.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        row = user_cache.get(user_id)
+        if row is None:
+            row = load_user_row(user_id)
+            if row is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            user_cache.set(user_id, row)
+        values, password_digest = row
+
+        # A fresh instance per request; cached rows are never handed out to be mutated.
+        user = CustomUser.from_db(CustomUser.objects.db, USER_FIELDS, values)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and is_revoked(validated_token, password_digest):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+
+def is_revoked(validated_token, password_digest):
+    claim = validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+    if claim is None:
+        # Issued before revocation was turned on; see JWT_LEGACY_TOKENS_UNTIL.
+        until = settings.JWT_LEGACY_TOKENS_UNTIL
+        return until is None or timezone.now() >= until
+    return claim != password_digest
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def evict_cached_user(sender, instance, **kwargs):
+    user_cache.evict(instance.pk)
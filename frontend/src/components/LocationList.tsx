@@ -2,13 +2,15 @@ import React, { useEffect, useState } from 'react';
 import Spinner from './ui/spinner';
 import { useApp } from '../context/AppContext';
 import { Button } from './ui/button';
-import { MapPin, Star } from 'lucide-react';
+import { Star } from 'lucide-react';
 import { Link } from 'react-router-dom';
 import { fetchLocations } from '../lib/api';
+import { filterLocations, thumbnailSrcSet } from '../lib/locationFilters';
+import { LocationListItem } from '../types';
 
 const LocationList = () => {
-  const { filters, accessibilityLevels, setSelectedLocation } = useApp();
-  const [apiLocations, setApiLocations] = useState<any[]>([]);
+  const { filters, accessibilityLevels } = useApp();
+  const [apiLocations, setApiLocations] = useState<LocationListItem[]>([]);
   const [isLoading, setIsLoading] = useState(true);
 
   useEffect(() => {
@@ -20,56 +22,10 @@ const LocationList = () => {
       .finally(() => setIsLoading(false));
   }, []);
 
-  const filteredLocations = React.useMemo(() => {
-    let filtered = [...apiLocations];
-
-    if (filters.categories.length > 0) {
-      filtered = filtered.filter(location =>
-        Array.isArray(location.categories) &&
-        location.categories.some((category: any) =>
-          filters.categories.includes(category.id)
-        )
-      );
-    }
-
-    if (filters.accessibilityFeatures.length > 0) {
-      filtered = filtered.filter(location =>
-        Array.isArray(location.accessibility_features) &&
-        filters.accessibilityFeatures.every((featureId) =>
-          location.accessibility_features.some((f: any) => f.id === featureId)
-        )
-      );
-    }
-
-    if (filters.accessibilityLevels.length > 0) {
-      filtered = filtered.filter(location =>
-        Array.isArray(location.accessibility_levels) &&
-        location.accessibility_levels.some((level: any) =>
-          filters.accessibilityLevels.includes(level.id)
-        )
-      );
-    }
-
-    if (filters.minRating > 0) {
-      filtered = filtered.filter(location => Number(location.rating) >= filters.minRating);
-    }
-
-    return filtered;
-  }, [apiLocations, filters]);
-
-  const handleSelectLocation = (location: any) => {
-    setSelectedLocation(location);
-  };
-
-  const getAccessibilityColor = (levels: any[]) => {
-    if (!Array.isArray(levels) || levels.length === 0) return "#888888";
-    return levels[0]?.color || "#888888";
-  };
-
-  const getAccessibilityName = (levels: any[]) => {
-    if (!Array.isArray(levels) || levels.length === 0) return "Unknown";
-    return levels[0]?.name || "Unknown";
-  };
+  const filteredLocations = React.useMemo(
+    () => filterLocations(apiLocations, filters, accessibilityLevels),
+    [apiLocations, filters, accessibilityLevels]
+  );
 
   const renderStars = (rating: number) => (
     <div className="flex items-center">
@@ -102,7 +58,9 @@ const LocationList = () => {
               <li key={location.id} className="p-4 hover:bg-gray-50">
                 <div className="flex gap-4">
                   <img
-                    src={location.image_url || '/placeholder.jpg'}
+                    src={location.thumbnails['320w'] || '/placeholder.jpg'}
+                    srcSet={thumbnailSrcSet(location.thumbnails) || undefined}
+                    sizes="128px"
                     alt={location.name}
                     className="w-32 h-20 object-cover rounded-md border"
                   />
@@ -110,17 +68,16 @@ const LocationList = () => {
                     <div className="flex items-center gap-2 mb-1">
                       <div
                         className="w-3 h-3 rounded-full"
-                        style={{ backgroundColor: getAccessibilityColor(location.accessibility_levels) }}
-                        title={getAccessibilityName(location.accessibility_levels)}
+                        style={{ backgroundColor: location.level_color || '#888888' }}
+                        title={location.level || 'Unknown'}
                       />
                       <h3 className="text-base font-semibold">{location.name}</h3>
                     </div>
-                    <div className="flex items-center text-sm text-muted-foreground">
-                      <MapPin className="h-4 w-4 mr-1" />
-                      {location.address}
-                    </div>
-                    <div className="mt-2">
-                      {renderStars(location.rating)}
+                    <div className="mt-2 flex items-center gap-2">
+                      {renderStars(location.review_average ?? 0)}
+                      <span className="text-sm text-muted-foreground">
+                        ({location.review_count})
+                      </span>
                     </div>
                   </div>
                   <div className="flex items-center">
@@ -2,7 +2,7 @@ import React, { useState, useEffect, useRef } from "react";
 
 import { useApp } from "../context/AppContext";
 
-import { Location } from "../types";
+import { LocationListItem } from "../types";
 
 import { Button } from "./ui/button";
 
@@ -20,18 +20,22 @@ import {
 
 import { LatLngExpression } from "leaflet";
 
-import { fetchLocations } from "../lib/api";
+import { fetchLocationById, fetchLocations } from "../lib/api";
+
+import { filterLocations } from "../lib/locationFilters";
 
 import L from "leaflet";
 
 import "leaflet-routing-machine";
 
 const MapView = () => {
-  const { filters, setSelectedLocation } = useApp();
+  const { filters, accessibilityLevels, setSelectedLocation } = useApp();
 
-  const [allLocations, setAllLocations] = useState<Location[]>([]);
+  const [allLocations, setAllLocations] = useState<LocationListItem[]>([]);
 
-  const [filteredLocations, setFilteredLocations] = useState<Location[]>([]);
+  const [filteredLocations, setFilteredLocations] = useState<
+    LocationListItem[]
+  >([]);
 
   const [userLocation, setUserLocation] = useState<any>(null);
 
@@ -43,54 +47,16 @@ const MapView = () => {
 
   useEffect(() => {
     fetchLocations()
-      .then((locations) => {
+      .then((locations: LocationListItem[]) => {
         setAllLocations(locations);
 
-        let filtered = [...locations];
-
-        if (filters.categories.length > 0) {
-          filtered = filtered.filter(
-            (location) =>
-              Array.isArray(location.categories) &&
-              location.categories.some((category: any) =>
-                filters.categories.includes(category.id)
-              )
-          );
-        }
-
-        if (filters.accessibilityFeatures.length > 0) {
-          filtered = filtered.filter(
-            (location) =>
-              Array.isArray(location.accessibility_features) &&
-              filters.accessibilityFeatures.every((featureId) =>
-                location.accessibility_features.some(
-                  (f: any) => f.id === featureId
-                )
-              )
-          );
-        }
-
-        if (filters.accessibilityLevels.length > 0) {
-          filtered = filtered.filter(
-            (location) =>
-              Array.isArray(location.accessibility_levels) &&
-              location.accessibility_levels.some((level: any) =>
-                filters.accessibilityLevels.includes(level.id)
-              )
-          );
-        }
-
-        if (filters.minRating > 0) {
-          filtered = filtered.filter(
-            (location) => Number(location.rating) >= filters.minRating
-          );
-        }
-
-        setFilteredLocations(filtered);
+        setFilteredLocations(
+          filterLocations(locations, filters, accessibilityLevels)
+        );
       })
 
       .catch((err) => console.error("Failed to fetch locations:", err));
-  }, [filters]);
+  }, [filters, accessibilityLevels]);
 
   useEffect(() => {
     if (navigator.geolocation) {
@@ -117,10 +83,11 @@ const MapView = () => {
     }
   }, [mapInstance]);
 
-  // Handle location selection
-
-  const handleSelectLocation = (location: Location) => {
-    setSelectedLocation(location);
+  // Markers carry the slim list item; the details panel needs the full record.
+  const handleSelectLocation = (location: LocationListItem) => {
+    fetchLocationById(String(location.id))
+      .then(setSelectedLocation)
+      .catch((err) => console.error("Failed to fetch location:", err));
   };
 
   const handlePlanRoute = () => {
@@ -191,7 +158,10 @@ const MapView = () => {
             <Popup>
               <strong>{location.name}</strong>
               <br />
-              Rating: {location.rating}
+              Rating:{" "}
+              {location.review_average !== null
+                ? location.review_average.toFixed(1)
+                : "no reviews yet"}
             </Popup>
           </Marker>
         ) : null
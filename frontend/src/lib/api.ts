@@ -17,6 +17,12 @@ export async function fetchLocationById(id: string) {
   return response.json();
 }
 
+export async function fetchLocationReviews(id: string) {
+  const response = await fetch(`${BASE_URL}/locations/${id}/reviews/`);
+  if (!response.ok) throw new Error("Error fetching reviews");
+  return response.json();
+}
+
 export async function fetchMyReviews(token: string) {
   const res = await fetch(`${BASE_URL}/users/me/reviews/`, {
     headers: {
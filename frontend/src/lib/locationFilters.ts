@@ -0,0 +1,34 @@
+import { AccessibilityLevel, Filter, LocationListItem } from "../types";
+
+// The list carries category and feature ids and the level by name.
+export function filterLocations(
+  locations: LocationListItem[],
+  filters: Filter,
+  accessibilityLevels: AccessibilityLevel[]
+): LocationListItem[] {
+  const categories = filters.categories.map(String);
+  const features = filters.accessibilityFeatures.map(String);
+  const selectedLevels = filters.accessibilityLevels.map(String);
+  const levelNames = accessibilityLevels
+    .filter((level) => selectedLevels.includes(String(level.id)))
+    .map((level) => level.name);
+
+  return locations.filter(
+    (location) =>
+      (categories.length === 0 ||
+        location.categories.some((id) => categories.includes(String(id)))) &&
+      features.every((featureId) =>
+        location.accessibility_features.some((id) => String(id) === featureId)
+      ) &&
+      (selectedLevels.length === 0 ||
+        (location.level !== null && levelNames.includes(location.level))) &&
+      (filters.minRating <= 0 ||
+        (location.review_average ?? 0) >= filters.minRating)
+  );
+}
+
+export function thumbnailSrcSet(thumbnails: Record<string, string>): string {
+  return Object.entries(thumbnails)
+    .map(([width, url]) => `${url} ${width}`)
+    .join(", ");
+}
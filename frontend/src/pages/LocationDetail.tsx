@@ -29,6 +29,7 @@ import {
   addFeatureToLocation,
   fetchAccessibilityFeatures,
   fetchLocationById,
+  fetchLocationReviews,
   fetchLocations,
   postProposition,
   removeFeatureFromLocation,
@@ -106,11 +107,11 @@ const LocationDetail = () => {
   useEffect(() => {
     if (id) {
       setIsLoading(true);
-      fetchLocationById(id)
-        .then((loc) => {
+      Promise.all([fetchLocationById(id), fetchLocationReviews(id)])
+        .then(([loc, reviewPage]) => {
           setLocation({
             ...loc,
-            reviews: Array.isArray(loc.reviews) ? loc.reviews : [],
+            reviews: Array.isArray(reviewPage.results) ? reviewPage.results : [],
             accessibilityFeatures: Array.isArray(loc.accessibility_features)
               ? loc.accessibility_features
               : [],
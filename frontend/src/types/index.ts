@@ -37,6 +37,20 @@ export interface Location {
   images?: string[];
 }
 
+// One item of GET /api/locations/; GET /api/locations/:id/ returns the full record.
+export interface LocationListItem {
+  id: number;
+  name: string;
+  latitude: number;
+  longitude: number;
+  level: string | null;
+  level_color: string | null;
+  categories: number[];
+  accessibility_features: number[];
+  review_count: number;
+  review_average: number | null;
+  thumbnails: Record<string, string>;
+}
 
 export interface Review {
   id: string;